@@ -1,6 +1,7 @@
-from math import atan2, pi, sqrt, copysign
+from math import atan2, pi, sqrt, copysign, sin, cos
 
 from avoid_state import AvoidState
+from clusters import get_tangent_turn
 from ..constants import STARTING_ALT, FAR_WP_DIST
 from ..types import Distance
 
@@ -28,10 +29,13 @@ def monitor(plane):
     right_turn_circle = plane.loc.get_location(Distance.from_magnitude(
         plane.turning_radius, plane.heading + pi / 2))
 
-    if plane.mode == 'GUIDED' and plane.avoid_sys.monitor_count < 5 and \
-            (left_turn_circle.get_distance(plane.avoid_sys.avoid_obs)
+    obs = plane.avoid_sys.avoid_obs
+
+    if plane.mode == 'GUIDED' and obs and \
+            plane.avoid_sys.monitor_count < 5 and \
+            (left_turn_circle.get_distance(obs.loc)
             .get_magnitude_xy() >= plane.turning_radius or
-            (right_turn_circle.get_distance(plane.avoid_sys.avoid_obs)
+            (right_turn_circle.get_distance(obs.loc)
             .get_magnitude_xy() >= plane.turning_radius)):
 
         plane.avoid_sys.monitor_count += 1
@@ -41,34 +45,66 @@ def monitor(plane):
 
 
 def avoid(plane):
-    obs = plane.avoid_sys.avoid_obs
+    avoid_sys = plane.avoid_sys
+    obs = avoid_sys.avoid_obs
     obs_dist = plane.loc.get_distance(obs.loc, plane.heading)
 
-    wp_obs_dist = obs.loc.get_distance(plane.next_wp.loc, plane.heading)
+    wp_obs_dist = obs.loc.get_distance(plane.next_wp, plane.heading)
 
     R = obs.get_avoid_radius(plane.loc.alt)
     r = plane.turning_radius
 
+    pos = avoid_sys.frame.to_local(plane.loc, avoid_sys.scratch[1])
+
     if obs_dist.y > 0:
 
         if (obs_dist.x >= 0 and wp_obs_dist.x >= 0) or (obs_dist.x <= 0 and
                 wp_obs_dist.x <= 0):
 
-            d = sqrt(obs_dist.y ** 2 + (r + abs(obs_dist.x)) ** 2 - (R + r) **
-                2)
+            turn = None
+            hull = avoid_sys.avoid_hull
 
-            turn_angle = -1 * copysign(pi / 2 - atan2(R + r, d) - atan2(
-                abs(obs_dist.y), r + abs(obs_dist.x)), obs_dist.x)
+            if hull is not None:
+                # Steer to the tangent of the hull of the obstacle's
+                # cluster on the side away from the obstacle, so that the
+                # plane does not turn into the obstacles next to it.
+                x = hull[0] - pos.x
+                y = hull[1] - pos.y
 
-        else:
+                heading = plane.heading
+
+                turn = get_tangent_turn(copysign(1, obs_dist.x) * (x *
+                    cos(heading) - y * sin(heading)), x * sin(heading) + y *
+                    cos(heading), r)
 
-            d = sqrt(obs_dist.y ** 2 + (r - abs(obs_dist.x)) ** 2 - (R + r) **
-                2)
+            if turn is None:
+                # The turning circle is not clear of the circle to avoid
+                # when the plane is too close to it to turn onto a
+                # tangent, and the plane turns away from it as dodge()
+                # does then.
+                d = sqrt(max(obs_dist.y ** 2 + (r + abs(obs_dist.x)) ** 2 -
+                    (R + r) ** 2, 0))
 
+                turn = pi / 2 - atan2(R + r, d) - atan2(abs(obs_dist.y),
+                    r + abs(obs_dist.x))
+
+            turn_angle = -1 * copysign(turn, obs_dist.x)
+
+        else:
             turn_angle = None
-            # FIXME get turning angle for cross
 
-        plane.turn(turn_angle)
+        if turn_angle is not None:
+            plane.turn(turn_angle)
+            return
+
+        # The waypoint is on the other side of the obstacle, so follow a
+        # detour planned around all of the obstacles once there is one.
+        detour = avoid_sys.get_detour(plane, pos)
+
+        if detour is None:
+            plane.go_auto()
+        else:
+            plane.goto(detour)
 
     else:
         plane.go_auto()
@@ -101,6 +137,7 @@ actions = {
     AvoidState.STANDBY:   standby,
     AvoidState.UNSAFE:    unsafe,
     AvoidState.MONITOR:   monitor,
+    AvoidState.AVOID:     avoid,
     AvoidState.DODGE:     dodge,
     AvoidState.LOITER:    loiter,
     AvoidState.IMMINENT:  imminent,
@@ -6,7 +6,14 @@ that it can make the correct action given the avoidance state.
 
 from math import sqrt
 
-from ..constants import SAFE_ALT_LOWER, SAFE_ALT_UPPER, MOV_LOITER_DIST
+import numpy as np
+
+from conflict_cache import are_in_arc, get_leg_fraction
+from cpa import get_plane_velocity
+from trajectory import Trajectory
+from ..types import TurnSolution
+from ..constants import SAFE_ALT_LOWER, SAFE_ALT_UPPER, MOV_LOITER_DIST, \
+    CPA_HORIZON, CHECK_LOOKAHEAD, SWEEP_HORIZON
 
 
 class AvoidState(object):
@@ -71,6 +78,26 @@ def determine_state(plane):
     return a constant as defined in AvoidState.
     """
 
+    return _determine_state(plane, False)
+
+
+def determine_state_incremental(plane):
+    """Determine the state of the obstacle avoidance system of plane as
+    determine_state() does, but skip the static obstacles that the plane
+    has not moved close enough to since their clearance margins were
+    last measured by the MarginTracker of the obstacle avoidance system.
+
+    The state is always the same as the state from determine_state().
+    """
+
+    return _determine_state(plane, True)
+
+
+def _determine_state(plane, incremental):
+    """Determine the state of the obstacle avoidance system of plane,
+    skipping the obstacles that cannot be found if incremental is True.
+    """
+
     avoid_sys = plane.avoid_sys
 
     # Return AvoidState.CLOSED if the plane is closed or will close
@@ -99,47 +126,218 @@ def determine_state(plane):
     if plane.loc.alt < SAFE_ALT_LOWER or plane.loc.alt > SAFE_ALT_UPPER:
         return AvoidState.UNSAFE
 
-    all_obs = avoid_sys.static_obs + avoid_sys.moving_obs
+    obs_set, obs_version = avoid_sys.versioned_obs
+
+    # Return AvoidState.MONITOR if there are no obstacles to avoid.
+    if not len(obs_set):
+        return AvoidState.MONITOR
+
+    scratch = avoid_sys.scratch
+
+    # Move the moving obstacles to where they are predicted to be now.
+    avoid_sys.predict_moving_obstacles(obs_set)
+
+    # Find the obstacles near enough to the plane to be checked, which
+    # are avoided somewhere between the altitudes of the plane, the next
+    # waypoint, and the start of the leg to it.
+    pos = obs_set.frame.to_local(plane.loc, scratch[0])
+    alts = _get_leg_altitudes(plane)
+
+    candidates = avoid_sys.get_candidates(obs_set, pos,
+        plane.turning_radius + CHECK_LOOKAHEAD, min(alts), max(alts))
+
+    needed = avoid_sys.margins.get_needed(plane, obs_set, obs_version, pos) \
+        if incremental else None
+
+    if needed is not None:
+        candidates = candidates[needed[candidates]]
+
+    # Find the distances of the nearby obstacles relative to the plane
+    # and the radii of the obstacles at the plane's altitude at once.
+    obs_x, obs_y, _ = obs_set.get_local_distances(pos, plane.loc.alt,
+        plane.heading, candidates)
+    obs_dist_xy = np.hypot(obs_x, obs_y)
+
+    cross_radii = obs_set.get_cross_sectional_radii(plane.loc.alt, candidates)
+    avoid_radii = obs_set.get_avoid_radii(plane.loc.alt, candidates)
+
+    # Determine if the plane is inside of an obstacle or inside the
+    # avoidance radius of an obstacle with the obstacle in front of the
+    # plane. The first such obstacle determines the state.
+    inside = cross_radii > obs_dist_xy
+    in_avoid_radius = (avoid_radii > obs_dist_xy) & (obs_y > 0)
+
+    hits = np.flatnonzero(inside | in_avoid_radius)
+
+    if len(hits):
+        i = hits[0]
 
-    for obs in all_obs:
-        
         # Return AvoidState.COLLISION if the plane is inside of an
-        # obstacle. 
-        if obs.is_loc_inside(plane.loc):
+        # obstacle.
+        if inside[i]:
             return AvoidState.COLLISION
 
-        obs_dist = plane.loc.get_distance(obs.loc, plane.heading)
+        # Return AvoidState.IMMINENT if the plane cannot dodge the
+        # obstacle in direction away from the obstacle.
+        if cross_radii[i] > sqrt((plane.turning_radius + abs(obs_x[i])) ** 2
+                + obs_y[i] ** 2) - plane.turning_radius:
+            return AvoidState.IMMINENT
+
+        # Return AvoidState.DODGE otherwise.
+        _set_avoid_obs(plane, obs_set.obstacles[candidates[i]], pos,
+            False)
+        return AvoidState.DODGE
+
+    # Find the closest points of approach of the moving obstacles.
+    cpa = avoid_sys.cpa
+
+    if cpa.obs_set is obs_set and len(obs_set) > obs_set.n_static:
+        cpa.compute(pos, plane.loc.alt, get_plane_velocity(plane,
+            scratch[4]))
+
+        conflicts = cpa.get_conflicts(CPA_HORIZON)
+
+        # Return AvoidState.AVOID if the plane will enter the avoidance
+        # radius of a moving obstacle soon.
+        if not plane.mode == 'LOITER' and len(conflicts):
+            _set_avoid_obs(plane, obs_set.obstacles[conflicts[0]], pos,
+                True)
+            return AvoidState.AVOID
+
+    # Return AvoidState.AVOID if an obstacle is in the way of the next
+    # waypoint.
+    if not plane.mode == 'LOITER':
+        i = _get_in_way(plane, obs_set, obs_version, pos, candidates, obs_x,
+            obs_y)
+
+        if i is not None:
+            _set_avoid_obs(plane, obs_set.obstacles[i], pos, True)
+            return AvoidState.AVOID
+
+        # Return AvoidState.AVOID if the predicted trajectory of the
+        # plane enters the avoidance radius of an obstacle soon.
+        track = avoid_sys.track
+        trajectory = Trajectory.from_plane(plane, pos)
 
-        # Determine if the plane is inside the avoidance radius of an
-        # obstacle and the obstacle is in front of the plane.
-        if obs.is_loc_in_avoid_radius(plane.loc) and obs_dist > 0:
+        sweep_candidates = avoid_sys.get_candidates(obs_set, pos,
+            plane.airspeed * SWEEP_HORIZON, trajectory.alt.min(),
+            trajectory.alt.max(), SWEEP_HORIZON)
 
-            # Return AvoidState.IMMINENT if the plane cannot dodge the
-            # obstacle in direction away from the obstacle.
-            if obs.get_cross_sectional_radius(plane.loc.alt) > sqrt(
-                    (plane.turning_radius + abs(obs_dist.x)) ** 2 + obs_dist.y
-                    ** 2) - plane.turning_radius:
-                return AvoidState.IMMINENT
+        if needed is not None:
+            sweep_candidates = sweep_candidates[needed[sweep_candidates]]
 
-            # Return AvoidState.DODGE otherwise.
-            avoid_sys.avoid_obs = obs
-            return AvoidState.DODGE
+        conflict_time, i = trajectory.get_first_conflict(obs_set,
+            sweep_candidates, track.pred_vel if track.obs_set is obs_set else
+            None)
 
-    for obs in all_obs:
+        avoid_sys.sweep_conflict = (conflict_time, i)
 
-        # Return AvoidState.AVOID if obs is in the way of the next
-        # waypoint.
-        if not plane.mode == 'LOITER' and obs.is_in_way(plane):
+        if i is not None:
+            _set_avoid_obs(plane, obs_set.obstacles[i], pos, True)
             return AvoidState.AVOID
 
-    for obs in avoid_sys.moving_obs:
+    # Return AvoidState.LOITER if a moving obstacle is over the next
+    # waypoint and the plane is close to the moving obstacle.
+    loiter = obs_set.is_moving[candidates] & obs_set.are_in_wp(plane,
+        plane.next_wp, candidates) & (obs_dist_xy < MOV_LOITER_DIST)
+
+    hits = np.flatnonzero(loiter)
 
-        # Return AvoidState.LOITER if obs is over the next waypoint.
-        if obs.is_in_next_wp(plane) and obs_dist.get_magnitude_xy() < \
-                MOV_LOITER_DIST:
-            avoid_sys.avoid_obs = obs
-            return AvoidState.LOITER
+    if len(hits):
+        _set_avoid_obs(plane, obs_set.obstacles[candidates[hits[0]]], pos,
+            False)
+        return AvoidState.LOITER
 
     # Return AvoidState.MONITOR if the plane is found to not be in any
     # other avoidance states.
     return AvoidState.MONITOR
+
+
+def _set_avoid_obs(plane, obs, pos, in_cluster):
+    """Set obs as the obstacle for the obstacle avoidance system of plane
+    at the position pos in the frame to avoid, and if in_cluster is True
+    the hull of the cluster of obs to steer to a tangent of, as found by
+    the ObstacleClusters of the system.
+    """
+
+    avoid_sys = plane.avoid_sys
+    avoid_sys.avoid_obs = obs
+    avoid_sys.avoid_hull = avoid_sys.clusters.get_avoid_hull(obs, pos,
+        plane.loc.alt) if in_cluster else None
+
+
+def _get_leg_altitudes(plane):
+    """Return a tuple of the altitudes of the plane, of the next
+    waypoint, and of the waypoint at the start of the leg to it if the
+    mission is known.
+    """
+
+    avoid_sys = plane.avoid_sys
+    mission = avoid_sys.mission
+    wp_number = plane.next_wp_number
+
+    if mission is None or not 2 <= wp_number <= len(mission):
+        return plane.loc.alt, plane.next_wp.alt
+
+    return plane.loc.alt, plane.next_wp.alt, mission[wp_number - 2][2] + \
+        avoid_sys.frame.anchor.alt
+
+
+def _get_in_way(plane, obs_set, obs_version, pos, candidates, obs_x, obs_y):
+    """Return the index of the first obstacle of obs_set, with the
+    version obs_version, in candidates that is in the way of the plane's
+    path to the next waypoint or None.
+
+    The static obstacles in the way of the straight leg of the mission
+    come from the cached leg conflicts, and the turn of the plane and
+    the moving obstacles are checked every time. If the plane is not on
+    a leg of the mission every candidate is checked by is_in_way().
+    """
+
+    avoid_sys = plane.avoid_sys
+    mission, mission_version = avoid_sys.versioned_mission
+    wp_number = plane.next_wp_number
+
+    if mission is None or not len(mission) == len(plane.commands) or \
+            wp_number < 2:
+        for i in candidates:
+            if obs_set.obstacles[i].is_in_way(plane):
+                return i
+
+        return None
+
+    turn = TurnSolution.solve(plane)
+
+    # The turn stays within twice the turning radius of the plane, so the
+    # static obstacles are left out of the turn if none of their
+    # avoidance radii come that close between the plane's altitude and
+    # the next waypoint's altitude.
+    if avoid_sys.clearance.get_clearance(pos.x, pos.y, plane.loc.alt,
+            plane.next_wp.alt) >= 2 * plane.turning_radius:
+        checked = np.flatnonzero(obs_set.is_moving[candidates])
+    else:
+        checked = np.arange(len(candidates))
+
+    in_arc = np.zeros(len(candidates), dtype=bool)
+    in_arc[checked] = are_in_arc(obs_set, candidates[checked],
+        obs_x[checked], obs_y[checked], plane.loc.alt, turn,
+        plane.turning_radius)
+
+    # The static obstacles in the way of the rest of the leg.
+    start = mission[wp_number - 2]
+    end = mission[wp_number - 1]
+
+    conflicts, fractions = avoid_sys.leg_conflicts.get(obs_set, obs_version,
+        mission, mission_version, wp_number)
+    conflicts = conflicts[fractions >= get_leg_fraction(start, end, pos)]
+
+    in_leg = np.in1d(candidates, conflicts)
+
+    for n, i in enumerate(candidates):
+        if in_arc[n] or in_leg[n]:
+            return i
+
+        if obs_set.is_moving[i] and obs_set.obstacles[i].is_in_way(plane):
+            return i
+
+    return None
@@ -6,11 +6,30 @@ the module avoid_state. The module avoid_action carries out the action
 for the obstacle avoidance system based on the current avoidance state.
 """
 
-from threading import Thread
-from time import sleep
+from multiprocessing import Pool
+from threading import Event, Lock, Thread
+from time import time
 from traceback import print_exc
+
+import numpy as np
+
 from avoid_action import do_action
-from avoid_state import AvoidState, determine_state
+from avoid_state import AvoidState, determine_state_incremental
+from clearance import ClearanceRaster
+from clusters import ObstacleClusters
+from conflict_cache import LegConflictCache
+from control_loop import ControlLoop
+from cpa import CPAEngine
+from margins import MarginTracker
+from planner import DetourPlanner, make_problem
+from profiler import TickProfiler
+from recorder import FlightRecorder
+from track import TrackStore
+from visibility import RouteMap
+from ..constants import PLAN_MAX_AGE, CLEARANCE_PATH, CONTROL_RATE, \
+    INSTRUMENT_ENABLED, TICK_PRINT_ENABLED, RECORDER_PATH, WORKER_PROCESSES
+from ..types import Distance, LocalFrame, ObstacleSet, ScratchBuffer
+from ..util import deg_to_rad, monotonic, Instruments
 
 
 class AvoidanceSystem(object):
@@ -21,11 +40,21 @@ class AvoidanceSystem(object):
     stop(), respectively, and can be closed by close().
     """
 
-    def __init__(self, plane):
+    def __init__(self, plane, monitor=True, rate=CONTROL_RATE,
+            record_path=RECORDER_PATH, clock=None, time_scale=1):
         """Instantiate an AvoidanceSystem object for a plane.
         
         The obstacle avoidance system cannot start until start() has
-        been called.
+        been called. If monitor is False the monitoring thread is not
+        started so that the obstacle avoidance system can be driven by
+        another loop. Otherwise the monitoring thread ticks rate times
+        per second, and every tick is recorded to a file at record_path,
+        formatted with the time if it has a %d, unless it is None.
+
+        If clock is given, such as the simulated clock of a FakeVehicle
+        running time_scale times as fast as real time, or as fast as
+        possible if time_scale is None, it is used for every time of the
+        system instead of the clocks of the computer.
         """
 
         self.plane = plane
@@ -33,48 +62,200 @@ class AvoidanceSystem(object):
         self.active = False
         self.closed = False
 
+        # Set once the obstacle avoidance system is started or closed.
+        self._started = Event()
+
+        # The timings of the ticks of the monitoring thread, its steps,
+        # and the calls to dronekit.
+        self.instruments = Instruments(INSTRUMENT_ENABLED)
+        self.control_loop = ControlLoop(rate, clock or monotonic,
+            self.instruments, time_scale)
+        self._monitoring = monitor
+
+        # Captures profiles of the ticks when requested.
+        self.profiler = TickProfiler()
+
+        # Records every tick of the monitoring thread to a file.
+        self.recorder = None
+
+        if monitor and record_path:
+            self.recorder = FlightRecorder(record_path % int(time()) if
+                '%d' in record_path else record_path, clock=clock or
+                monotonic)
+
         self.monitor_count = 0
         self.standby_count = 0
 
+        # The obstacles and the mission are each published with their
+        # version as one tuple, which changes whenever either is set, so
+        # that a reader never pairs one with the version of another.
+        self.versioned_obs = (ObstacleSet(), 0)
+        self.versioned_mission = (None, 0)
+
         self.static_obs = []
         self.moving_obs = []
+        self.track = TrackStore(self.obs_set)
+        self.cpa = CPAEngine(self.obs_set, self.track)
+        self.clusters = ObstacleClusters(self.obs_set)
+        self.clearance = ClearanceRaster(self.obs_set)
+
+        # The clock used for the times of the moving obstacle updates, for
+        # predicting the moving obstacles, and for the ages of the plans.
+        self.clock = clock or time
+
+        self.frame = None
+        self._commands = None
 
+        # The legs in the way, cached by the versions of the obstacles
+        # and the mission.
+        self.leg_conflicts = LegConflictCache()
+        self.margins = MarginTracker()
+
+        # The routes around the static obstacles to the waypoints, which
+        # are found again whenever the obstacles or the mission are set.
+        # With the monitoring thread they are found by the routing thread
+        # in the pool of worker processes shared with the planner, and
+        # otherwise at once.
+        self.routes = None
+        self._pool = None
+        self._routes_wanted = Event()
+        self._routes_lock = Lock()
+
+        # The obstacle to avoid and the x and y of the points of the hull
+        # of its cluster to steer to a tangent of, if it has one.
         self.avoid_obs = None
+        self.avoid_hull = None
+
+        # The time in seconds from now and the index in obs_set of the
+        # first obstacle found in the way of the predicted trajectory.
+        self.sweep_conflict = (None, None)
+
+        # The detour planner, which plans in a worker process, and the
+        # number of the waypoint of the latest plan being flown to.
+        self.planner = DetourPlanner(lambda: self.clock(),
+            instruments=self.instruments)
+        self._detour = (None, 0)
+
+        # Temporary Distances reused by the monitoring thread.
+        self.scratch = ScratchBuffer(6)
 
         state_strings = ['CLOSED', 'INACTIVE', 'STANDBY', 'UNSAFE', 'MONITOR',
             'AVOID', 'DODGE', 'LOITER', 'IMMINENT', 'COLLISION']
+        action_spans = ['action_' + string.lower() for string in
+            state_strings]
+
+        instruments = self.instruments
+        profiler = self.profiler
+
+        def monitoring_tick():
+            """Run a tick, under the profiler if a capture is active."""
+            if profiler.active:
+                profiler.run(tick)
+            else:
+                tick()
+
+        def tick():
+            """Determine the avoidance state and carry out its action."""
+            recorder = self.recorder
+            plane_static = None
+            state = None
+            error = False
+
+            with instruments.span('tick'):
+                try:
+                    if recorder:
+                        recorder.begin()
+
+                    with instruments.span('snapshot'):
+                        plane_static = plane.to_static()
+
+                    if recorder:
+                        recorder.mark(0)
+
+                    with instruments.span('state'):
+                        state = determine_state_incremental(plane_static)
+                        self.state = state
+
+                    if recorder:
+                        recorder.mark(1)
+
+                    if self.state == AvoidState.CLOSED:
+                        self.control_loop.stop()
+
+                        return
+
+                    # Printing every tick at the control rate is only for
+                    # debugging, as the summaries of the instruments are
+                    # sent to the ground station.
+                    if TICK_PRINT_ENABLED:
+                        print 'Current waypoint number: %.0f' % \
+                            self.plane.next_wp_number
+                        print 'AvoidState = ' + state_strings[self.state]
+                        print 'Obstacles checked = %d, skipped = %d' % \
+                            (self.margins.checked, self.margins.skipped)
+
+                        stats = self.control_loop.stats
+                        print 'Tick overruns = %d, latency = %.1f ms' % \
+                            (stats['overruns'], stats['latency_last'] * 1000)
+
+                    with instruments.span(action_spans[self.state]):
+                        do_action(self.state, plane_static)
+
+                    if recorder:
+                        recorder.mark(2)
+
+                except:
+                    error = True
+                    instruments.count('tick_errors')
+                    print_exc()
+
+                finally:
+                    # Every tick is recorded, including the ticks that
+                    # raised and the tick that closes the system.
+                    if recorder:
+                        recorder.end(plane_static, state, self.track, error)
 
         def monitoring_thread():
             """Thread for monitoring the plane to avoid obstacles."""
-            while not self.active and not self.closed:
-                sleep(0.1)
+            self._started.wait()
 
             print 'Starting Obstacle Avoidance....'
 
             if not self.closed:
-                plane_static = plane.to_static()
-                self.state = determine_state(plane_static)
-            else:
-                self.state = AvoidState.CLOSED
-
-            while not self.state == AvoidState.CLOSED:
-                try:
-                    print 'Current waypoint number: %.0f' % \
-                        self.plane.next_wp_number
-                    print 'AvoidState = ' + state_strings[self.state]
+                self.control_loop.run(monitoring_tick)
 
-                    do_action(self.state, plane_static)
+            self.state = AvoidState.CLOSED
+            self.control_loop.close()
 
-                    sleep(0.1)
+        def routing_thread():
+            """Thread for finding the routes whenever they are wanted."""
+            while True:
+                self._routes_wanted.wait()
+                self._routes_wanted.clear()
 
-                    plane_static = plane.to_static()
-                    self.state = determine_state(plane_static)
+                if self.closed:
+                    break
 
+                try:
+                    self._find_routes()
                 except:
                     print_exc()
 
-        _monitoring_thread = Thread(target=monitoring_thread)
-        _monitoring_thread.start()
+        if monitor:
+            # The planner and the routing thread share one pool of worker
+            # processes, so that they are all forked at once before any
+            # threads are started, including the pool's own.
+            self._pool = Pool(WORKER_PROCESSES)
+            self.planner.start(self._pool)
+
+            _monitoring_thread = Thread(target=monitoring_thread)
+            _monitoring_thread.start()
+
+            # The pool may be terminated while the routes are being found,
+            # so the routing thread does not keep the program running.
+            _routing_thread = Thread(target=routing_thread)
+            _routing_thread.daemon = True
+            _routing_thread.start()
 
     def start(self):
         """Start the obstacle avoidance system.
@@ -83,6 +264,7 @@ class AvoidanceSystem(object):
         """
 
         self.active = True
+        self._started.set()
 
     def stop(self):
         """Stop the obstacle avoidance system.
@@ -95,3 +277,229 @@ class AvoidanceSystem(object):
     def close(self):
         """Close the obstacle avoidance system."""
         self.closed = True
+        self._started.set()
+        self._routes_wanted.set()
+        self.control_loop.stop()
+        self.planner.close()
+
+        # The monitoring thread closes the control loop once it is done
+        # with it.
+        if not self._monitoring:
+            self.control_loop.close()
+
+        if self._pool:
+            self._pool.terminate()
+
+        if self.recorder:
+            self.recorder.close()
+
+    @property
+    def obs_set(self):
+        return self.versioned_obs[0]
+
+    @property
+    def obs_version(self):
+        return self.versioned_obs[1]
+
+    @property
+    def mission(self):
+        return self.versioned_mission[0]
+
+    @property
+    def mission_version(self):
+        return self.versioned_mission[1]
+
+    def get_frame(self):
+        """Return the LocalFrame used by the obstacle avoidance system,
+        anchoring it at the plane's home location the first time.
+        """
+
+        if not self.frame:
+            self.frame = LocalFrame(self.plane.home_loc)
+
+            if self._commands:
+                self.set_mission(self._commands)
+
+        return self.frame
+
+    def set_obstacles(self, static_obs, moving_obs):
+        """Set the static and moving obstacles to be avoided."""
+        self.static_obs = static_obs
+        self.moving_obs = moving_obs
+
+        obs_set = ObstacleSet(static_obs, moving_obs, self.get_frame())
+
+        self.track = TrackStore(obs_set)
+        self.cpa = CPAEngine(obs_set, self.track)
+        self.clusters = ObstacleClusters(obs_set)
+        self.clearance = ClearanceRaster(obs_set, path=CLEARANCE_PATH)
+        self.versioned_obs = (obs_set, self.obs_version + 1)
+
+        self.build_routes()
+
+    def set_mission(self, commands):
+        """Set the mission from dronekit commands and convert the
+        waypoints to positions in the frame as an array of x, y, and z
+        rows once the frame has been anchored.
+        """
+
+        self._commands = commands
+
+        if not self.frame:
+            return
+
+        lat = [deg_to_rad(command.x) for command in commands]
+        lon = [deg_to_rad(command.y) for command in commands]
+        alt = [command.z for command in commands]
+
+        mission = np.column_stack(self.frame.to_local_arrays(lat, lon, alt))
+
+        if self.mission is None or not np.array_equal(mission, self.mission):
+            self.versioned_mission = (mission, self.mission_version + 1)
+
+            self.build_routes()
+
+    def build_routes(self):
+        """Forget the routes around the static obstacles to the waypoints
+        of the mission and find them again for the current obstacles and
+        mission, in the routing thread if there is one and otherwise at
+        once.
+        """
+
+        with self._routes_lock:
+            self.routes = None
+
+        if self._pool:
+            self._routes_wanted.set()
+        else:
+            self._find_routes()
+
+    def _find_routes(self):
+        """Find the routes for the current obstacles and mission once
+        both have been set and keep them unless either has been set again
+        meanwhile.
+        """
+
+        versioned_obs = self.versioned_obs
+        versioned_mission = self.versioned_mission
+
+        obs_set = versioned_obs[0]
+        mission = versioned_mission[0]
+
+        if mission is None or not obs_set.n_static:
+            return
+
+        routes = RouteMap(obs_set, mission, self._pool)
+
+        with self._routes_lock:
+            if versioned_obs is not self.versioned_obs or \
+                    versioned_mission is not self.versioned_mission:
+                return
+
+            self.routes = routes
+
+        print 'Found routes around %d obstacles in %.3f s' % \
+            (obs_set.n_static, routes.build_time)
+
+    def update_moving_obstacles(self):
+        """Update the tracks of the moving obstacles after their
+        Locations have changed.
+        """
+
+        self.track.add(self.clock())
+
+    def predict_moving_obstacles(self, obs_set):
+        """Move the moving obstacles of obs_set to their predicted
+        positions now if obs_set is the current ObstacleSet.
+        """
+
+        track = self.track
+
+        if track.obs_set is obs_set:
+            track.predict(self.clock())
+
+    def get_candidates(self, obs_set, pos, radius, alt=None, alt_high=None,
+            horizon=0):
+        """Return a sorted array of the indices of the obstacles of
+        obs_set that may be within radius of the position pos in the
+        frame, allowing for how far the moving obstacles could have
+        moved since their positions in the grid were updated.
+
+        If alt is given only the obstacles avoided somewhere from alt to
+        alt_high are included, allowing for how far the moving obstacles
+        could climb or descend in horizon seconds.
+        """
+
+        track = self.track
+        margin = 0
+
+        if track.obs_set is obs_set:
+            radius += track.get_max_drift(self.clock())
+
+            if horizon and track.pred_vel.shape[1]:
+                margin = np.abs(track.pred_vel[2]).max() * horizon
+
+        return obs_set.get_candidates(pos, radius, alt, alt_high, margin)
+
+    def get_detour(self, plane, pos):
+        """Return the Location of the next waypoint of the latest detour
+        plan for the leg of plane at the position pos in the frame. If
+        there is no plan for the leg yet a plan is requested from the
+        planner and the next point of the route around the static
+        obstacles is returned instead, or None if there is no route.
+
+        A plan is for the next waypoint number and the versions of the
+        obstacles and the mission, and is replanned once it is older than
+        PLAN_MAX_AGE seconds, but is still flown until the new plan
+        arrives.
+        """
+
+        key = (plane.next_wp_number, self.obs_version, self.mission_version)
+        plan = self.planner.get_plan(key)
+
+        # Replan if a static obstacle is now in the way of the plan.
+        if plan:
+            x, y = plan['waypoints'][self._detour[1] if self._detour[0] ==
+                plan['version'] else 0]
+
+            if self.clearance.get_segment_clearance(pos.x, pos.y,
+                    plane.loc.alt, x, y, plane.next_wp.alt) < 0:
+                plan = None
+
+        if not plan or self.clock() - plan['time'] > PLAN_MAX_AGE:
+            wp = self.frame.to_local(plane.next_wp)
+            self.planner.request(make_problem(plane, pos, wp), key)
+
+        if not plan:
+            # Follow the route around the static obstacles until there is
+            # a plan.
+            routes = self.routes
+            route = routes.get_route(pos, plane.next_wp_number) if routes \
+                else None
+
+            if not route:
+                return None
+
+            x, y = route[0]
+
+            return self.frame.from_local(Distance(x, y, plane.next_wp.alt -
+                self.frame.anchor.alt))
+
+        version, number = self._detour
+
+        if version != plan['version']:
+            number = 0
+
+        waypoints = plan['waypoints']
+
+        # Move on from the waypoints of the plan that have been reached.
+        while number < len(waypoints) - 1 and np.hypot(waypoints[number][0] -
+                pos.x, waypoints[number][1] - pos.y) <= plane.wp_radius:
+            number += 1
+
+        self._detour = (plan['version'], number)
+
+        x, y = waypoints[number]
+
+        return self.frame.from_local(Distance(x, y, plane.next_wp.alt -
+            self.frame.anchor.alt))
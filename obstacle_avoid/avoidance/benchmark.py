@@ -0,0 +1,312 @@
+"""Handles micro-benchmarking the obstacle avoidance system without a
+plane connected.
+
+A synthetic field of obstacles is made around a plane so that the cost
+of determine_state() can be measured in time and in the number of
+Distance and Location objects allocated per call, so that the
+resolution of the ClearanceRaster can be traded off against its memory
+and accuracy, and so that determine_state_incremental() can be checked
+against determine_state() over random flights.
+"""
+
+from math import pi, sin, cos
+from random import Random
+from time import time
+
+import numpy as np
+
+from avoid_state import determine_state, determine_state_incremental
+from avoid_sys import AvoidanceSystem
+from clearance import ClearanceRaster
+from ..constants import CLEARANCE_MAX
+from ..types import Distance, Location, LocalFrame, StaticObstacle, \
+    MovingObstacle
+from ..util import deg_to_rad
+
+
+def make_obstacle_field(frame, n_static, n_moving, field_size, clearance,
+        random):
+    """Return lists of n_static static and n_moving moving obstacles
+    randomly placed by random in a square field of side field_size
+    meters centered on the anchor of frame, at least clearance meters
+    from its center.
+    """
+
+    half = field_size / 2.0
+
+    def random_loc(alt):
+        dist = Distance(0, 0, alt)
+
+        while dist.get_magnitude_xy() <= clearance:
+            dist.set(random.uniform(-half, half), random.uniform(-half, half),
+                alt)
+
+        return frame.from_local(dist)
+
+    static_obs = []
+    moving_obs = []
+
+    for _ in xrange(n_static):
+        height = random.uniform(30, 200)
+        static_obs.append(StaticObstacle(random_loc(height / 2),
+            random.uniform(10, 90), height))
+
+    for _ in xrange(n_moving):
+        moving_obs.append(MovingObstacle(random_loc(random.uniform(30, 200)),
+            random.uniform(10, 90)))
+
+    return static_obs, moving_obs
+
+
+class BenchmarkPlane(object):
+
+    """Represents a plane flying straight and level through a synthetic
+    field of obstacles with the attributes used by determine_state().
+
+    The plane is at the center of the field and the obstacles are kept
+    at least 300 meters away from it.
+    """
+
+    def __init__(self, n_static=100, n_moving=10, field_size=2000, seed=0):
+        """Instantiate a BenchmarkPlane object with n_static static and
+        n_moving moving obstacles randomly placed in a square field of
+        side field_size meters.
+        """
+
+        random = Random(seed)
+        half = field_size / 2.0
+
+        self.home_loc = Location(deg_to_rad(38.1446), deg_to_rad(-76.4279), 0)
+        frame = LocalFrame(self.home_loc)
+
+        # Keep the obstacles clear of the plane at the center of the field
+        # so that every obstacle is checked.
+        static_obs, moving_obs = make_obstacle_field(frame, n_static,
+            n_moving, field_size, 300, random)
+
+        self.airspeed = 15
+        self.heading = pi / 4
+        self.pitch = 0
+        self.loc = frame.from_local(Distance(0, 0, 100))
+        self.turning_radius = 40
+        self.mode = 'AUTO'
+        self.wp_radius = 20
+        self.next_wp_number = 1
+        self.next_wp = frame.from_local(Distance(random.uniform(-half, half),
+            random.uniform(-half, half), 100))
+
+        self.avoid_sys = AvoidanceSystem(self, monitor=False)
+        self.avoid_sys.set_obstacles(static_obs, moving_obs)
+        self.avoid_sys.active = True
+        self.avoid_sys.standby_count = 3
+
+
+def count_allocations(func, *args, **kwargs):
+    """Call func with args and kwargs and return the result with the
+    number of Distance and Location objects allocated during the call.
+    """
+
+    counts = {Distance: 0, Location: 0}
+    inits = {}
+
+    def counting_init(cls):
+        init = cls.__init__
+
+        def __init__(self, *args):
+            counts[cls] += 1
+            init(self, *args)
+
+        return init, __init__
+
+    for cls in counts:
+        inits[cls], cls.__init__ = counting_init(cls)
+
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        for cls in counts:
+            cls.__init__ = inits[cls]
+
+    return result, counts[Distance] + counts[Location]
+
+
+def benchmark_determine_state(n_static=100, n_moving=10, calls=100):
+    """Return a dictionary of the mean time in seconds and the mean
+    number of Distance and Location objects allocated per call of
+    determine_state() for a synthetic field of obstacles.
+    """
+
+    plane = BenchmarkPlane(n_static, n_moving)
+
+    def run():
+        for _ in xrange(calls):
+            determine_state(plane)
+
+    _, allocations = count_allocations(run)
+
+    start = time()
+    run()
+    elapsed = time() - start
+
+    return {
+        'obstacles': n_static + n_moving,
+        'calls': calls,
+        'time_per_call': elapsed / calls,
+        'allocations_per_call': allocations / float(calls)
+    }
+
+
+def benchmark_clearance(n_static=100, resolutions=(5, 10, 20), lookups=1000,
+        path=None):
+    """Return a list of dictionaries of the build time in seconds, the
+    memory in bytes, the mean time of a lookup and of a 500 meter
+    segment check, and the largest and mean amount a lookup is under the
+    true clearance at the plane's altitude for a ClearanceRaster of a
+    synthetic field of obstacles at each of resolutions, stored in a file
+    at path if path is not None.
+    """
+
+    plane = BenchmarkPlane(n_static, 0)
+    obs_set = plane.avoid_sys.obs_set
+    alt = plane.loc.alt
+
+    random = np.random.RandomState(0)
+    x = random.uniform(-1000, 1000, lookups)
+    y = random.uniform(-1000, 1000, lookups)
+    angles = random.uniform(0, 2 * pi, lookups)
+
+    # The true clearances, clipped as they are in the raster.
+    static = np.arange(obs_set.n_static)
+    radii = obs_set.get_avoid_radii(alt, static)
+    avoided = static[radii > 0]
+
+    true = (np.hypot(x[:, np.newaxis] - obs_set.x[avoided], y[:, np.newaxis]
+        - obs_set.y[avoided]) - radii[radii > 0]).min(axis=1)
+    true = np.minimum(true, CLEARANCE_MAX)
+
+    results = []
+
+    for resolution in resolutions:
+        raster = ClearanceRaster(obs_set, resolution, path)
+
+        start = time()
+        clearances = np.array([raster.get_clearance(x_i, y_i, alt)
+            for x_i, y_i in zip(x, y)])
+        lookup_time = (time() - start) / lookups
+
+        start = time()
+
+        for x_i, y_i, angle in zip(x, y, angles):
+            raster.get_segment_clearance(x_i, y_i, alt, x_i + 500 *
+                np.sin(angle), y_i + 500 * np.cos(angle), alt)
+
+        segment_time = (time() - start) / lookups
+
+        under = true - clearances
+
+        results.append({
+            'resolution': resolution,
+            'build_time': raster.build_time,
+            'bytes': raster.nbytes,
+            'time_per_lookup': lookup_time,
+            'time_per_segment': segment_time,
+            'max_under': under.max(),
+            'mean_under': under.mean(),
+            'min_under': under.min()
+        })
+
+    return results
+
+
+def compare_incremental(n_static=300, n_moving=10, steps=2000, seed=0,
+        field_size=3000):
+    """Fly a plane along a random trace through a synthetic field of
+    obstacles with moving obstacles on random tracks, determining the
+    state by both determine_state() and determine_state_incremental() at
+    every step, and return a dictionary of the number of steps where the
+    states or the obstacles to avoid differ, the mean numbers of
+    obstacles skipped and of margins measured per step, the number of
+    times every margin was measured, and the mean time per step of each.
+    """
+
+    random = Random(seed)
+    plane = BenchmarkPlane(n_static, n_moving, field_size, seed)
+    avoid_sys = plane.avoid_sys
+    frame = avoid_sys.frame
+
+    now = [0.0]
+    avoid_sys.clock = lambda: now[0]
+
+    half = field_size / 2.0
+    mission = [(random.uniform(-half, half), random.uniform(-half, half),
+        random.uniform(60, 140)) for _ in xrange(8)]
+
+    avoid_sys.versioned_mission = (np.array(mission),
+        avoid_sys.mission_version + 1)
+    plane.commands = mission
+    plane.next_wp_number = 2
+
+    velocities = [(random.uniform(-15, 15), random.uniform(-15, 15),
+        random.uniform(-1, 1)) for _ in avoid_sys.moving_obs]
+
+    pos = Distance(0, 0, plane.loc.alt)
+    dt = 0.1
+
+    mismatches = 0
+    times = [0, 0]
+
+    for _ in xrange(steps):
+        now[0] += dt
+
+        # Move the moving obstacles and update their tracks.
+        for obs, (v_x, v_y, v_z) in zip(avoid_sys.moving_obs, velocities):
+            dist = frame.to_local(obs.loc)
+            obs.loc = frame.from_local(dist.set(dist.x + v_x * dt, dist.y +
+                v_y * dt, dist.z + v_z * dt))
+
+        avoid_sys.update_moving_obstacles()
+
+        # Fly towards the next waypoint with some random wandering.
+        wp = avoid_sys.mission[plane.next_wp_number - 1]
+
+        if np.hypot(wp[0] - pos.x, wp[1] - pos.y) < plane.wp_radius:
+            plane.next_wp_number = plane.next_wp_number % len(mission) + 1
+            wp = avoid_sys.mission[plane.next_wp_number - 1]
+
+        plane.heading += random.uniform(-0.2, 0.2)
+        plane.airspeed = random.uniform(12, 25)
+
+        pos.set(pos.x + plane.airspeed * dt * sin(plane.heading), pos.y +
+            plane.airspeed * dt * cos(plane.heading), pos.z + random.uniform(
+            -1, 1))
+
+        plane.loc = frame.from_local(pos)
+        plane.next_wp = frame.from_local(Distance(*wp))
+
+        avoid_sys.avoid_obs = None
+
+        start = time()
+        state = determine_state(plane)
+        avoid_obs = avoid_sys.avoid_obs
+        times[0] += time() - start
+
+        avoid_sys.avoid_obs = None
+
+        start = time()
+        incremental_state = determine_state_incremental(plane)
+        times[1] += time() - start
+
+        if state != incremental_state or avoid_obs is not avoid_sys.avoid_obs:
+            mismatches += 1
+
+    metrics = avoid_sys.margins.get_metrics()
+
+    return {
+        'steps': steps,
+        'mismatches': mismatches,
+        'skipped_per_step': metrics['skipped_per_tick'],
+        'measured_per_step': metrics['measured_per_tick'],
+        'rebuilds': metrics['rebuilds'],
+        'time_per_step': times[0] / steps,
+        'incremental_time_per_step': times[1] / steps
+    }
@@ -0,0 +1,201 @@
+"""Handles looking up how far a position is from the avoidance radii of
+the static obstacles.
+
+When the obstacles are set, the avoidance radii of the static obstacles
+in each band of CLEARANCE_SLAB meters of altitude that the plane can fly
+at are rasterized into a grid of the signed distance from the center of
+each cell to the nearest avoidance radius, which is negative inside of
+one. The clearance of a position is then a single lookup and the
+clearance of a straight line is a lookup for each cell along it.
+"""
+
+from math import ceil, floor, sqrt
+from time import time
+
+import numpy as np
+
+from ..constants import SAFE_ALT_LOWER, SAFE_ALT_UPPER, AVOID_DIST_STAT, \
+    CLEARANCE_SLAB, CLEARANCE_RESOLUTION, CLEARANCE_MAX
+
+
+class ClearanceRaster(object):
+
+    """Represents the signed distance to the avoidance radii of the static
+    obstacles of an ObstacleSet as an array with a grid of cells for
+    each slab of CLEARANCE_SLAB meters of altitude between
+    SAFE_ALT_LOWER and SAFE_ALT_UPPER.
+
+    The avoidance radius of every obstacle in a slab is the largest in
+    the slab and distances are clipped to CLEARANCE_MAX, so a clearance
+    is never more than the true clearance and a clearance of
+    CLEARANCE_MAX means at least CLEARANCE_MAX. The array is kept in
+    memory or, if a path is given, in a memory mapped file. The time
+    taken to build it is kept in build_time.
+    """
+
+    def __init__(self, obs_set, resolution=CLEARANCE_RESOLUTION, path=None):
+        """Instantiate a ClearanceRaster object for the static obstacles
+        of obs_set with square cells of side resolution meters, stored in
+        a file at path if path is not None.
+        """
+
+        start_time = time()
+
+        self.resolution = float(resolution)
+
+        # Each value is at the center of its cell and the distance
+        # changes by at most the distance moved, so this is taken off of
+        # every lookup to never be more than the true clearance.
+        self._error = self.resolution / sqrt(2)
+
+        static = np.arange(obs_set.n_static)
+        x = obs_set.x[static]
+        y = obs_set.y[static]
+
+        self.min_slab = int(floor(SAFE_ALT_LOWER / CLEARANCE_SLAB))
+        n_slabs = int(floor(SAFE_ALT_UPPER / CLEARANCE_SLAB)) - \
+            self.min_slab + 1
+
+        if len(static):
+            reach = obs_set.radius[static] + AVOID_DIST_STAT + CLEARANCE_MAX
+
+            self.min_x = (x - reach).min()
+            self.min_y = (y - reach).min()
+            max_x = (x + reach).max()
+            max_y = (y + reach).max()
+        else:
+            self.min_x = self.min_y = max_x = max_y = 0
+
+        n_x = int(ceil((max_x - self.min_x) / self.resolution)) + 1
+        n_y = int(ceil((max_y - self.min_y) / self.resolution)) + 1
+        shape = (n_slabs, n_y, n_x)
+
+        if path is None:
+            self.grid = np.empty(shape, dtype=np.float32)
+        else:
+            self.grid = np.memmap(path, dtype=np.float32, mode='w+',
+                shape=shape)
+
+        self.grid[:] = CLEARANCE_MAX
+
+        centers_x = self.min_x + self.resolution * (np.arange(n_x) + 0.5)
+        centers_y = self.min_y + self.resolution * (np.arange(n_y) + 0.5)
+
+        for k in xrange(n_slabs):
+            low = (self.min_slab + k) * CLEARANCE_SLAB
+            high = low + CLEARANCE_SLAB
+
+            # Only the obstacles avoided in the slab are rasterized, and
+            # their avoidance radii are largest at the altitude in the slab
+            # nearest to each obstacle.
+            in_slab = obs_set.alt_index.query(low, high)
+            radii = obs_set.get_avoid_radii(np.clip(obs_set.alt[in_slab], low,
+                high), in_slab)
+
+            slab = self.grid[k]
+
+            for i, radius in zip(in_slab, radii):
+                if radius <= 0:
+                    continue
+
+                # Only the cells within CLEARANCE_MAX of the avoidance
+                # radius can change.
+                reach = radius + CLEARANCE_MAX
+
+                x_0, x_1 = self._get_cells(x[i] - reach, x[i] + reach,
+                    self.min_x, n_x)
+                y_0, y_1 = self._get_cells(y[i] - reach, y[i] + reach,
+                    self.min_y, n_y)
+
+                dists = np.hypot(centers_x[x_0:x_1] - x[i], centers_y[y_0:y_1,
+                    np.newaxis] - y[i]) - radius
+
+                np.minimum(slab[y_0:y_1, x_0:x_1], dists, slab[y_0:y_1,
+                    x_0:x_1])
+
+        self.build_time = time() - start_time
+
+    def _get_cells(self, low, high, start, n):
+        """Return the first and one past the last index of the cells
+        from low to high of an axis of n cells starting at start.
+        """
+
+        first = int(floor((low - start) / self.resolution))
+        last = int(floor((high - start) / self.resolution)) + 1
+
+        return max(first, 0), min(last, n)
+
+    @property
+    def nbytes(self):
+        """Return the number of bytes used by the raster."""
+        return self.grid.nbytes
+
+    def _get_slabs(self, alt_low, alt_high):
+        """Return the first and one past the last index of the slabs from
+        alt_low to alt_high, or None if they are not all in the raster.
+        """
+
+        first = int(floor(alt_low / CLEARANCE_SLAB)) - self.min_slab
+        last = int(floor(alt_high / CLEARANCE_SLAB)) - self.min_slab + 1
+
+        if first < 0 or last > len(self.grid):
+            return None
+
+        return first, last
+
+    def get_clearance(self, x, y, alt, alt_high=None):
+        """Return the distance from x and y in the frame to the nearest
+        avoidance radius of a static obstacle at alt, or anywhere from alt
+        to alt_high if it is given, which is negative inside of one.
+
+        Return -inf if the altitudes are not in the raster.
+        """
+
+        alt_high = alt if alt_high is None else alt_high
+        slabs = self._get_slabs(min(alt, alt_high), max(alt, alt_high))
+
+        if slabs is None:
+            return -np.inf
+
+        c_x = int(floor((x - self.min_x) / self.resolution))
+        c_y = int(floor((y - self.min_y) / self.resolution))
+
+        n_y, n_x = self.grid.shape[1:]
+
+        if not (0 <= c_x < n_x and 0 <= c_y < n_y):
+            return CLEARANCE_MAX
+
+        return self.grid[slabs[0]:slabs[1], c_y, c_x].min() - self._error
+
+    def get_segment_clearance(self, x_1, y_1, alt_1, x_2, y_2, alt_2):
+        """Return the least clearance of the straight line from x_1, y_1,
+        and alt_1 to x_2, y_2, and alt_2 in the frame, looking up the
+        cells along it, or -inf if the altitudes are not in the raster.
+        """
+
+        slabs = self._get_slabs(min(alt_1, alt_2), max(alt_1, alt_2))
+
+        if slabs is None:
+            return -np.inf
+
+        length = np.hypot(x_2 - x_1, y_2 - y_1)
+        fractions = np.linspace(0, 1, int(ceil(length / self.resolution)) +
+            1)
+
+        c_x = np.floor((x_1 + fractions * (x_2 - x_1) - self.min_x) /
+            self.resolution).astype(int)
+        c_y = np.floor((y_1 + fractions * (y_2 - y_1) - self.min_y) /
+            self.resolution).astype(int)
+        slab = (np.floor((alt_1 + fractions * (alt_2 - alt_1)) /
+            CLEARANCE_SLAB) - self.min_slab).astype(int)
+
+        n_y, n_x = self.grid.shape[1:]
+        inside = (c_x >= 0) & (c_x < n_x) & (c_y >= 0) & (c_y < n_y)
+
+        if not inside.any():
+            return CLEARANCE_MAX
+
+        # Every point of the line is within half a cell of a point that
+        # was looked up.
+        return self.grid[slab[inside], c_y[inside], c_x[inside]].min() - \
+            self._error - self.resolution / 2
@@ -0,0 +1,263 @@
+"""Handles merging static obstacles whose avoidance radii overlap into
+clusters that are avoided as a single shape.
+
+When the obstacles are set, the static obstacles that overlap in each
+band of altitudes the plane can fly at are joined into clusters by a
+union-find, checking only the pairs that the SpatialGrid of the
+ObstacleSet finds near each other. Each cluster of more than one
+obstacle has the convex hull of polygons around the avoidance radii of
+its obstacles, and the plane steers to a tangent of the hull instead of
+around a single obstacle while it is outside of the hull.
+"""
+
+from math import cos, floor, pi
+
+import numpy as np
+
+from ..constants import ROUTE_ALT_BAND, SAFE_ALT_LOWER, SAFE_ALT_UPPER, \
+    CLUSTER_HULL_POINTS
+
+
+class UnionFind(object):
+
+    """Represents disjoint sets of the integers from 0 to n - 1."""
+
+    def __init__(self, n):
+        """Instantiate a UnionFind object where every integer is in a set
+        of its own.
+        """
+
+        self.parent = range(n)
+        self.size = [1] * n
+
+    def find(self, i):
+        """Return the integer representing the set i is in."""
+        parent = self.parent
+
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+
+        return i
+
+    def union(self, i, j):
+        """Join the sets i and j are in."""
+        i = self.find(i)
+        j = self.find(j)
+
+        if i == j:
+            return
+
+        if self.size[i] < self.size[j]:
+            i, j = j, i
+
+        self.parent[j] = i
+        self.size[i] += self.size[j]
+
+
+def get_convex_hull(x, y):
+    """Return the arrays of the x and y of the points of the convex hull
+    of the points at the arrays x and y in counterclockwise order.
+    """
+
+    points = sorted(set(zip(x, y)))
+
+    if len(points) < 3:
+        return np.array([p[0] for p in points]), np.array([p[1]
+            for p in points])
+
+    def cross(o, a, b):
+        return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+    lower = []
+    upper = []
+
+    for point in points:
+        while len(lower) >= 2 and cross(lower[-2], lower[-1], point) <= 0:
+            lower.pop()
+
+        lower.append(point)
+
+    for point in reversed(points):
+        while len(upper) >= 2 and cross(upper[-2], upper[-1], point) <= 0:
+            upper.pop()
+
+        upper.append(point)
+
+    hull = lower[:-1] + upper[:-1]
+
+    return np.array([p[0] for p in hull]), np.array([p[1] for p in hull])
+
+
+def get_tangent_turn(x, y, turning_radius):
+    """Return the angle in radians the plane must turn away from the
+    points at the arrays x and y, relative to the plane's heading with x
+    positive on the side it turns away from, for the tangent it leaves
+    its turning circle on to pass every point ahead of it on that side.
+    The angle is negative if the plane can turn toward them instead, and
+    None if no point is ahead.
+
+    A point that the turning circle passes over is passed at the end of
+    the turn, as the plane cannot turn any tighter.
+    """
+
+    ahead = y > 0
+
+    if not ahead.any():
+        return None
+
+    x = x[ahead]
+    y = y[ahead]
+    r = turning_radius
+
+    # The tangent passes a point when it is turning_radius from the
+    # center of the turning circle on the side of the point, which is d
+    # along the tangent from where the plane leaves the turning circle.
+    d = np.sqrt(np.maximum(y ** 2 + (r + x) ** 2 - r ** 2, 0))
+
+    return (np.arctan2(y, r + x) + np.arctan2(r, d) - pi / 2).max()
+
+
+class ObstacleClusters(object):
+
+    """Represents the clusters of overlapping static obstacles of an
+    ObstacleSet in each band of ROUTE_ALT_BAND meters of altitude
+    between SAFE_ALT_LOWER and SAFE_ALT_UPPER.
+
+    For each band, labels holds the cluster of every static obstacle,
+    or -1 for obstacles not avoided in the band, and each cluster has
+    the indices of its obstacles and the arrays of the x and y of the
+    points of its hull in counterclockwise order, or None for a cluster
+    of one obstacle.
+    """
+
+    def __init__(self, obs_set):
+        """Instantiate an ObstacleClusters object for the static
+        obstacles of obs_set.
+        """
+
+        self.obs_set = obs_set
+        self.bands = {}
+
+        self._indices = dict((id(obs), i) for i, obs in enumerate(
+            obs_set.obstacles[:obs_set.n_static]))
+
+        for band in xrange(int(floor(SAFE_ALT_LOWER / ROUTE_ALT_BAND)),
+                int(floor(SAFE_ALT_UPPER / ROUTE_ALT_BAND)) + 1):
+            self.bands[band] = self._get_clusters(band * ROUTE_ALT_BAND,
+                (band + 1) * ROUTE_ALT_BAND)
+
+    def _get_clusters(self, low, high):
+        """Return the labels and the clusters of the static obstacles
+        between the altitudes low and high.
+        """
+
+        obs_set = self.obs_set
+        obstacles = obs_set.obstacles
+        static = np.arange(obs_set.n_static)
+
+        # The avoidance radii are largest at the altitude in the band
+        # nearest to each obstacle.
+        peak_alts = np.clip(obs_set.alt[static], low, high)
+        radii = obs_set.get_avoid_radii(peak_alts, static)
+
+        sets = UnionFind(len(static))
+
+        for i in np.flatnonzero(radii > 0):
+            near = obs_set.grid.query(obs_set.x[i], obs_set.y[i], radii[i] +
+                obs_set.max_avoid_radius)
+
+            for j in near[(near > i) & (near < len(static))]:
+                if not radii[j]:
+                    continue
+
+                alts = set((low, (low + high) / 2.0, high, peak_alts[i],
+                    peak_alts[j]))
+
+                if any(obstacles[i].does_overlap(obstacles[j], alt)
+                        for alt in alts):
+                    sets.union(i, j)
+
+        labels = np.full(len(static), -1, dtype=int)
+        clusters = []
+        roots = {}
+
+        for i in np.flatnonzero(radii > 0):
+            root = sets.find(i)
+
+            if root not in roots:
+                roots[root] = len(clusters)
+                clusters.append([])
+
+            labels[i] = roots[root]
+            clusters[labels[i]].append(i)
+
+        return labels, [self._get_shape(members, radii) for members in
+            clusters]
+
+    def _get_shape(self, members, radii):
+        """Return the cluster of the obstacles with the indices members
+        with the avoidance radii radii as a dictionary of the members and
+        the hull.
+        """
+
+        obs_set = self.obs_set
+        members = np.array(members)
+
+        if len(members) == 1:
+            return {'members': members, 'hull': None}
+
+        # The polygons are around the avoidance radii, so the hull holds
+        # every avoidance radius.
+        step = 2 * pi / CLUSTER_HULL_POINTS
+        thetas = step * np.arange(CLUSTER_HULL_POINTS)
+        r_out = radii[members][:, np.newaxis] / cos(step / 2)
+
+        points_x = obs_set.x[members][:, np.newaxis] + r_out * np.cos(thetas)
+        points_y = obs_set.y[members][:, np.newaxis] + r_out * np.sin(thetas)
+
+        return {
+            'members': members,
+            'hull': get_convex_hull(points_x.ravel(), points_y.ravel())
+        }
+
+    def get_cluster(self, obs, alt):
+        """Return the cluster the static obstacle obs is in at alt, or
+        None if obs is not a static obstacle avoided at alt.
+        """
+
+        i = self._indices.get(id(obs))
+        band = self.bands.get(int(floor(alt / ROUTE_ALT_BAND)))
+
+        if i is None or band is None:
+            return None
+
+        labels, clusters = band
+
+        return clusters[labels[i]] if labels[i] >= 0 else None
+
+    def get_avoid_hull(self, obs, pos, alt):
+        """Return the arrays of the x and y of the points of the hull of
+        the cluster the static obstacle obs is in at alt for a plane at
+        the position pos in the frame to steer to a tangent of, or None
+        if obs is not in a cluster of more than one obstacle at alt or
+        the plane is inside of the hull.
+        """
+
+        cluster = self.get_cluster(obs, alt)
+
+        if cluster is None or cluster['hull'] is None:
+            return None
+
+        x, y = cluster['hull']
+
+        # The plane is inside of the hull if it is on the left of every
+        # edge going counterclockwise.
+        next_x = np.roll(x, -1)
+        next_y = np.roll(y, -1)
+
+        if ((next_x - x) * (pos.y - y) - (next_y - y) * (pos.x - x) >=
+                0).all():
+            return None
+
+        return cluster['hull']
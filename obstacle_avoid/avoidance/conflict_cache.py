@@ -0,0 +1,133 @@
+"""Handles finding the static obstacles in the way of the legs of the
+mission and the obstacles in the way of the plane's turn.
+
+The static obstacles and the mission rarely change, so the static
+obstacles that the straight leg between two waypoints passes through are
+found once and cached until the mission or the obstacles change. Only
+the turn of the plane onto the leg needs to be checked every time.
+"""
+
+import numpy as np
+
+from ..constants import ARC_SAMPLE_ANGLE
+
+
+class LegConflictCache(object):
+
+    """Represents the static obstacles in the way of each leg of a
+    mission.
+
+    The conflicts of every leg are found the first time get() is called
+    for a mission version and obstacle set version and are kept until
+    either version changes.
+    """
+
+    def __init__(self):
+        """Instantiate an empty LegConflictCache object."""
+        self._key = None
+        self._legs = {}
+
+    def get(self, obs_set, obs_version, mission, mission_version,
+            wp_number):
+        """Return the indices of the static obstacles of obs_set in the
+        way of the leg to the waypoint number wp_number and the fractions
+        of the leg at which the leg passes closest to them, where mission
+        is an array of the positions of the waypoints in the frame.
+
+        The first leg, to the waypoint number 1, has no previous
+        waypoint and has no conflicts.
+        """
+
+        key = (obs_version, mission_version)
+
+        if key != self._key:
+            self._legs = {}
+
+            for number in xrange(2, len(mission) + 1):
+                self._legs[number] = get_leg_conflicts(obs_set,
+                    mission[number - 2], mission[number - 1])
+
+            self._key = key
+
+        return self._legs.get(wp_number, (np.zeros(0, dtype=int),
+            np.zeros(0)))
+
+
+def get_leg_conflicts(obs_set, start, end):
+    """Return the indices of the static obstacles of obs_set whose
+    avoidance radius the straight leg from the position start to the
+    position end in the frame passes through and the fractions of the
+    leg at which the leg passes closest to them.
+
+    The altitude of the leg where it passes an obstacle is interpolated
+    between the altitudes of start and end.
+    """
+
+    static = np.arange(obs_set.n_static)
+
+    if not len(static):
+        return static, np.zeros(0)
+
+    d_x, d_y, d_z = end - start
+    length_2 = d_x ** 2 + d_y ** 2
+
+    rel_x = obs_set.x[static] - start[0]
+    rel_y = obs_set.y[static] - start[1]
+
+    if length_2:
+        fractions = np.clip((rel_x * d_x + rel_y * d_y) / length_2, 0, 1)
+    else:
+        fractions = np.zeros(len(static))
+
+    miss_dists = np.hypot(rel_x - fractions * d_x, rel_y - fractions * d_y)
+    pass_alts = start[2] + obs_set.frame.anchor.alt + fractions * d_z
+
+    in_way = obs_set.get_avoid_radii(pass_alts, static) > miss_dists
+
+    return static[in_way], fractions[in_way]
+
+
+def get_leg_fraction(start, end, pos):
+    """Return the fraction of the leg from the position start to the
+    position end in the frame that the position pos has flown.
+    """
+
+    d_x, d_y, _ = end - start
+    length_2 = d_x ** 2 + d_y ** 2
+
+    if not length_2:
+        return 1
+
+    return ((pos.x - start[0]) * d_x + (pos.y - start[1]) * d_y) / length_2
+
+
+def are_in_arc(obs_set, indices, obs_x, obs_y, alt, turn, turning_radius):
+    """Return an array of whether the avoidance radius of each obstacle
+    of obs_set with indices is in the way of the turn of the plane
+    described by the TurnSolution turn.
+
+    obs_x and obs_y are the distances of the obstacles relative to the
+    plane in the frame of its heading and alt is the plane's altitude.
+    The arc is checked at points no more than ARC_SAMPLE_ANGLE apart.
+    """
+
+    angle = abs(turn.angle)
+
+    if not len(indices) or not angle:
+        return np.zeros(len(indices), dtype=bool)
+
+    thetas = np.linspace(0, angle, int(angle / ARC_SAMPLE_ANGLE) + 2)
+    side = 1 if turn.angle > 0 else -1
+
+    # The points of the arc relative to the plane in the frame of its
+    # heading, turning about a center turning_radius to the side.
+    arc_x = side * turning_radius * (1 - np.cos(thetas))
+    arc_y = turning_radius * np.sin(thetas)
+    arc_alts = alt + turn.arc_climb * thetas / angle
+
+    dists = np.hypot(obs_x[:, np.newaxis] - arc_x, obs_y[:, np.newaxis] -
+        arc_y)
+    radii = np.array([obs_set.get_avoid_radii(arc_alt, indices)
+        for arc_alt in arc_alts]).T
+
+    return (radii > dists).any(axis=1)
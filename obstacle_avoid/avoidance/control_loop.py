@@ -0,0 +1,216 @@
+"""Handles running the ticks of the monitoring thread on a schedule.
+
+Ticks are run at deadlines a fixed period apart on the monotonic clock,
+so the rate does not drift with how long each tick takes. A tick that
+runs past the next deadline is an overrun and the deadlines it missed
+are skipped rather than run back to back. Between deadlines the loop
+waits on a pipe, so it can be woken early when a new position of the
+plane arrives, and it measures how late each tick started, how long it
+took, and how long after the latest position its commands were issued.
+"""
+
+import errno
+import fcntl
+import os
+from math import ceil
+from select import select
+from threading import Lock
+
+from ..constants import CONTROL_RATE
+from ..util import monotonic
+
+
+class ControlLoop(object):
+
+    """Represents a loop running ticks at CONTROL_RATE ticks per second,
+    or the rate given, on the monotonic clock.
+
+    run() runs the ticks until stop() is called, wake() runs the next
+    tick at once, and note_update() records the time of a new position
+    of the plane, waking the loop if asked. close() closes the pipe the
+    loop waits on once it is no longer run. The measurements of the
+    ticks are kept in stats and summarized by get_metrics(), and are
+    recorded in the histograms of instruments if it is given.
+    """
+
+    def __init__(self, rate=CONTROL_RATE, clock=monotonic, instruments=None,
+            time_scale=1):
+        """Instantiate a ControlLoop object running rate ticks per second
+        measured by clock, which runs time_scale times as fast as real
+        time, or as fast as possible if time_scale is None.
+        """
+
+        self.period = 1.0 / rate
+        self.clock = clock
+        self.time_scale = time_scale
+        self.instruments = instruments
+
+        self.running = False
+
+        # The time of the latest position of the plane, which is taken
+        # when a tick starts so it is only counted by one tick.
+        self._update_time = None
+
+        # Writes never block, so a loop that is not reading cannot hold
+        # up the thread waking it. The lock keeps a wake from writing to
+        # a descriptor that was closed and possibly reused.
+        self._pipe_lock = Lock()
+        self._read_fd, self._write_fd = os.pipe()
+        fcntl.fcntl(self._write_fd, fcntl.F_SETFL, fcntl.fcntl(self._write_fd,
+            fcntl.F_GETFL) | os.O_NONBLOCK)
+
+        self.stats = dict.fromkeys(('ticks', 'wakes', 'overruns', 'skipped',
+            'jitter', 'jitter_max', 'duration', 'duration_max', 'latencies',
+            'latency', 'latency_max', 'latency_last'), 0)
+
+    def wake(self):
+        """Run the next tick at once."""
+        with self._pipe_lock:
+            if self._write_fd is None:
+                return
+
+            try:
+                os.write(self._write_fd, 'w')
+            except OSError as e:
+                if e.errno != errno.EAGAIN:
+                    raise
+
+    def note_update(self, wake=False):
+        """Record that a new position of the plane arrived now and run
+        the next tick at once if wake is True.
+        """
+
+        self._update_time = self.clock()
+
+        if wake:
+            self.wake()
+
+    def stop(self):
+        """Stop the loop after the tick being run."""
+        self.running = False
+        self.wake()
+
+    def close(self):
+        """Close the pipe of the loop, which should not be run again."""
+        with self._pipe_lock:
+            if self._read_fd is None:
+                return
+
+            os.close(self._read_fd)
+            os.close(self._write_fd)
+
+            self._read_fd = self._write_fd = None
+
+    def _wait(self, deadline):
+        """Wait until deadline or until the loop is woken and return
+        whether it was woken.
+        """
+
+        if self.time_scale:
+            timeout = max(deadline - self.clock(), 0) / self.time_scale
+            readable, _, _ = select([self._read_fd], [], [], timeout)
+        else:
+            # There is no real time to wait for when clock runs as fast as
+            # possible, so the loop polls the pipe, letting the thread
+            # moving the clock run, until clock reaches the deadline.
+            readable = []
+
+            while not readable and self.clock() < deadline:
+                readable, _, _ = select([self._read_fd], [], [], 0)
+
+        if readable:
+            os.read(self._read_fd, 4096)
+
+        return bool(readable)
+
+    def run(self, tick):
+        """Call the function tick at every deadline until stop() is
+        called.
+        """
+
+        stats = self.stats
+        instruments = self.instruments
+        self.running = True
+
+        deadline = self.clock()
+        woken = False
+
+        while self.running:
+            start = self.clock()
+            update_time = self._update_time
+            self._update_time = None
+
+            # Jitter is only measured for the ticks that ran at a deadline.
+            if woken:
+                stats['wakes'] += 1
+                deadline = start
+            else:
+                jitter = start - deadline
+                stats['jitter'] += jitter
+                stats['jitter_max'] = max(stats['jitter_max'], jitter)
+
+                if instruments:
+                    instruments.record('tick_jitter', jitter)
+
+            tick()
+
+            end = self.clock()
+            duration = end - start
+
+            stats['ticks'] += 1
+            stats['duration'] += duration
+            stats['duration_max'] = max(stats['duration_max'], duration)
+
+            if update_time is not None:
+                latency = end - update_time
+
+                stats['latencies'] += 1
+                stats['latency'] += latency
+                stats['latency_max'] = max(stats['latency_max'], latency)
+                stats['latency_last'] = latency
+
+                if instruments:
+                    instruments.record('tick_latency', latency)
+
+            deadline += self.period
+
+            if end > deadline:
+                missed = int(ceil((end - deadline) / self.period))
+
+                stats['overruns'] += 1
+                stats['skipped'] += missed
+                deadline += missed * self.period
+
+                if instruments:
+                    instruments.count('tick_overruns')
+
+            if not self.running:
+                break
+
+            woken = self._wait(deadline)
+
+    def get_metrics(self):
+        """Return a dictionary of the number of ticks, wakes, overruns,
+        and deadlines skipped, and of the mean and largest jitter,
+        duration, and latency from a new position to the end of a tick
+        in seconds.
+        """
+
+        stats = self.stats
+        ticks = max(stats['ticks'], 1)
+        scheduled = max(stats['ticks'] - stats['wakes'], 1)
+        latencies = max(stats['latencies'], 1)
+
+        return {
+            'ticks': stats['ticks'],
+            'wakes': stats['wakes'],
+            'overruns': stats['overruns'],
+            'skipped': stats['skipped'],
+            'jitter_mean': stats['jitter'] / scheduled,
+            'jitter_max': stats['jitter_max'],
+            'duration_mean': stats['duration'] / ticks,
+            'duration_max': stats['duration_max'],
+            'latency_mean': stats['latency'] / latencies,
+            'latency_max': stats['latency_max'],
+            'latency_last': stats['latency_last']
+        }
@@ -0,0 +1,101 @@
+"""Handles finding the closest point of approach between the plane and
+the moving obstacles.
+
+The velocities of the moving obstacles are taken from their tracks, and
+the time until the closest point of approach and the distance between
+the plane and each moving obstacle at that time are found for all of the
+moving obstacles at once assuming that the plane and the obstacles keep
+their velocities.
+"""
+
+from math import sin, cos
+
+import numpy as np
+
+from ..constants import AVOID_DIST_MOV
+
+
+class CPAEngine(object):
+
+    """Represents the closest point of approach calculations for the
+    moving obstacles of an ObstacleSet.
+
+    The velocities of the moving obstacles are the estimates of a
+    TrackStore, and compute() finds the times until the closest point of
+    approach (times) and the miss distances (miss_dists) for the moving
+    obstacles in the order they are in the ObstacleSet.
+    """
+
+    def __init__(self, obs_set, track):
+        """Instantiate a CPAEngine object for the moving obstacles of
+        the ObstacleSet obs_set tracked by the TrackStore track.
+        """
+
+        self.obs_set = obs_set
+        self.track = track
+
+        n_moving = len(obs_set) - obs_set.n_static
+
+        self.times = np.full(n_moving, np.inf)
+        self.miss_dists = np.full(n_moving, np.inf)
+
+    def compute(self, pos, alt, vel):
+        """Find the times in seconds until the closest point of approach
+        and the miss distances in meters for the moving obstacles from a
+        plane at the position pos in the frame at the altitude alt and
+        with the velocity vel, a Distance per second.
+
+        Closest points of approach in the past are taken as now. Return
+        the times and miss distances, which are also kept as times and
+        miss_dists.
+        """
+
+        moving = slice(self.obs_set.n_static, None)
+
+        rel_x = self.obs_set.x[moving] - pos.x
+        rel_y = self.obs_set.y[moving] - pos.y
+        rel_z = self.obs_set.alt[moving] - alt
+
+        obs_vel = self.track.pred_vel
+
+        rel_vx = obs_vel[0] - vel.x
+        rel_vy = obs_vel[1] - vel.y
+        rel_vz = obs_vel[2] - vel.z
+
+        speed_2 = rel_vx ** 2 + rel_vy ** 2 + rel_vz ** 2
+        closing = -(rel_x * rel_vx + rel_y * rel_vy + rel_z * rel_vz)
+
+        times = np.where(speed_2 > 0, closing / np.where(speed_2 > 0, speed_2,
+            1), 0)
+        times = np.maximum(times, 0)
+
+        self.miss_dists = np.sqrt((rel_x + rel_vx * times) ** 2 + (rel_y +
+            rel_vy * times) ** 2 + (rel_z + rel_vz * times) ** 2)
+        self.times = times
+
+        return self.times, self.miss_dists
+
+    def get_conflicts(self, horizon):
+        """Return the indices in the ObstacleSet of the moving obstacles
+        whose avoidance radius the plane will enter within horizon
+        seconds ordered by the time until the closest point of approach.
+        """
+
+        radii = AVOID_DIST_MOV + self.obs_set.radius[self.obs_set.n_static:]
+
+        conflicts = np.flatnonzero((self.miss_dists < radii) & (self.times <=
+            horizon))
+
+        return conflicts[np.argsort(self.times[conflicts])] + \
+            self.obs_set.n_static
+
+
+def get_plane_velocity(plane, out):
+    """Return the velocity of plane as a Distance per second written
+    into the Distance out from its airspeed, heading, and pitch.
+    """
+
+    speed_xy = plane.airspeed * cos(plane.pitch)
+
+    return out.set(speed_xy * sin(plane.heading), speed_xy *
+        cos(plane.heading), plane.airspeed * sin(plane.pitch))
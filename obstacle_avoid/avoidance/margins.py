@@ -0,0 +1,224 @@
+"""Handles skipping the static obstacles that the plane is too far from
+for any of the checks of determine_state_incremental() to find.
+
+The clearance margin of a static obstacle is its horizontal distance
+from the plane less its largest avoidance radius. The plane cannot fly
+faster than PLANE_SPEED_MAX, so once a margin is measured the obstacle
+cannot come within the reach of the checks until its time to breach has
+passed. The obstacles are kept in a heap ordered by that time and are
+only measured again once it has passed, so the obstacles far from the
+plane are measured at rates that decay with their distance while the
+obstacles within reach are checked every tick.
+"""
+
+from heapq import heapify, heappop, heappush
+
+import numpy as np
+
+from ..constants import AVOID_DIST_STAT, SWEEP_HORIZON, PLANE_SPEED_MAX, \
+    REACH_SLACK
+
+
+class MarginTracker(object):
+
+    """Represents the clearance margins of the static obstacles of an
+    ObstacleSet and a heap of the times the obstacles need to be checked
+    again.
+
+    get_needed() returns which obstacles need to be checked, which is
+    every moving obstacle, every static obstacle in the way of the leg
+    of the mission being flown, and every static obstacle whose margin
+    the plane could have closed. Every margin is measured again if the
+    obstacles, the mission, or the next waypoint change, if the reach of
+    the checks grows by more than REACH_SLACK, or if the plane moved
+    faster than PLANE_SPEED_MAX since the last call.
+
+    The numbers of obstacles checked, skipped, and measured by the last
+    call are kept in checked, skipped, and measured, and their totals
+    over every call in totals.
+    """
+
+    def __init__(self):
+        """Instantiate a MarginTracker object with no margins."""
+        self.checked = 0
+        self.skipped = 0
+        self.measured = 0
+
+        self.totals = dict.fromkeys(('ticks', 'checked', 'skipped',
+            'measured', 'rebuilds'), 0)
+
+        self._key = None
+        self._reach = 0
+        self._last = None
+        self._heap = []
+        self._active = np.zeros(0, dtype=int)
+        self._needed = None
+
+    def get_reach(self, plane):
+        """Return how far from the plane in meters the checks of an
+        obstacle can find it, which is the farthest of the plane's turn
+        and its predicted trajectory.
+        """
+
+        return max(2 * plane.turning_radius, max(plane.airspeed, 1) *
+            SWEEP_HORIZON)
+
+    def _get_margins(self, obs_set, pos, indices):
+        """Return the margins of the static obstacles of obs_set with
+        indices from the position pos in the frame.
+        """
+
+        return np.hypot(obs_set.x[indices] - pos.x, obs_set.y[indices] -
+            pos.y) - obs_set.radius[indices] - AVOID_DIST_STAT
+
+    def _schedule(self, indices, margins, now):
+        """Add the obstacles with indices and margins to the heap at the
+        times they could first come within reach after now.
+        """
+
+        due = now + (margins - self._reach) / PLANE_SPEED_MAX
+
+        for time, i in zip(due.tolist(), indices.tolist()):
+            heappush(self._heap, (time, i))
+
+    def _measure(self, plane, obs_set, obs_version, mission, mission_version,
+            pos, now, key):
+        """Measure the margins of every static obstacle of obs_set, with
+        the version obs_version, from the position pos in the frame of
+        plane's obstacle avoidance system at the time now for the mission
+        with the version mission_version.
+        """
+
+        avoid_sys = plane.avoid_sys
+        static = np.arange(obs_set.n_static)
+
+        self._reach = self.get_reach(plane) + REACH_SLACK
+
+        needed = np.ones(len(obs_set), dtype=bool)
+        needed[static] = False
+
+        # The static obstacles in the way of the leg can be found from
+        # anywhere on it, so they are always checked.
+        conflicts, _ = avoid_sys.leg_conflicts.get(obs_set, obs_version,
+            mission, mission_version, plane.next_wp_number)
+
+        needed[conflicts] = True
+
+        others = static[~needed[static]]
+        margins = self._get_margins(obs_set, pos, others)
+        near = margins <= self._reach
+
+        due = now + (margins[~near] - self._reach) / PLANE_SPEED_MAX
+        self._heap = zip(due.tolist(), others[~near].tolist())
+        heapify(self._heap)
+
+        self._active = others[near]
+        needed[self._active] = True
+
+        self._needed = needed
+        self._key = key
+
+        self.measured = len(others)
+        self.totals['rebuilds'] += 1
+
+    def get_needed(self, plane, obs_set, obs_version, pos):
+        """Return an array of whether each obstacle of obs_set, with the
+        version obs_version, needs to be checked for plane at the
+        position pos in the frame, or None if every obstacle needs to be
+        checked.
+
+        Every obstacle is checked if the plane is not on a leg of the
+        mission, where a static obstacle can be found in the way of the
+        next waypoint from anywhere.
+        """
+
+        avoid_sys = plane.avoid_sys
+        mission, mission_version = avoid_sys.versioned_mission
+        wp_number = plane.next_wp_number
+        now = avoid_sys.clock()
+
+        self.totals['ticks'] += 1
+
+        if mission is None or not len(mission) == len(plane.commands) or \
+                wp_number < 2:
+            self._key = None
+            self.checked = len(obs_set)
+            self.skipped = self.measured = 0
+            self.totals['checked'] += self.checked
+
+            return None
+
+        key = (obs_version, mission_version, wp_number)
+        last = self._last
+        self._last = (now, pos.x, pos.y)
+
+        if key != self._key or self.get_reach(plane) > self._reach or \
+                now < last[0] or np.hypot(pos.x - last[1], pos.y - last[2]) > \
+                PLANE_SPEED_MAX * (now - last[0]):
+            self._measure(plane, obs_set, obs_version, mission,
+                mission_version, pos, now, key)
+
+        else:
+            needed = self._needed
+            heap = self._heap
+
+            # The obstacles within reach are measured every tick and go
+            # back on the heap once they are out of reach.
+            active = self._active
+            margins = self._get_margins(obs_set, pos, active)
+            near = margins <= self._reach
+
+            self._schedule(active[~near], margins[~near], now)
+            needed[active[~near]] = False
+
+            # The obstacles whose time to breach has passed are measured.
+            due = []
+
+            while heap and heap[0][0] <= now:
+                due.append(heappop(heap)[1])
+
+            due = np.array(due, dtype=int)
+            due_margins = self._get_margins(obs_set, pos, due)
+            due_near = due_margins <= self._reach
+
+            self._schedule(due[~due_near], due_margins[~due_near], now)
+
+            self._active = np.concatenate((active[near], due[due_near]))
+            needed[self._active] = True
+
+            self.measured = len(active) + len(due)
+
+        self.skipped = len(self._heap)
+        self.checked = len(obs_set) - self.skipped
+
+        for name in ('checked', 'skipped', 'measured'):
+            self.totals[name] += getattr(self, name)
+
+        return self._needed
+
+    def get_time_to_breach(self, now):
+        """Return the least time in seconds from now before a skipped
+        obstacle could need to be checked, or None if no obstacle is
+        skipped.
+        """
+
+        if not self._heap:
+            return None
+
+        return max(self._heap[0][0] - now, 0)
+
+    def get_metrics(self):
+        """Return a dictionary of the mean numbers of obstacles checked,
+        skipped, and measured per tick, and of the number of times every
+        margin was measured again.
+        """
+
+        ticks = max(self.totals['ticks'], 1)
+
+        return {
+            'ticks': self.totals['ticks'],
+            'checked_per_tick': self.totals['checked'] / float(ticks),
+            'skipped_per_tick': self.totals['skipped'] / float(ticks),
+            'measured_per_tick': self.totals['measured'] / float(ticks),
+            'rebuilds': self.totals['rebuilds']
+        }
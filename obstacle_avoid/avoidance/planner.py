@@ -0,0 +1,429 @@
+"""Handles planning detours around obstacles in a worker process.
+
+A detour is planned by a lattice A* search over motion primitives that
+the plane can fly, straight segments and arcs of its turning radius, in
+the local frame. The search is anytime: it is repeated with a smaller
+inflation of the heuristic each time until the time budget runs out, and
+the best plan found is kept. The planning runs in a separate process so
+the monitoring thread is never blocked, and finished plans are handed
+back to the obstacle avoidance system with the version of the request.
+"""
+
+from heapq import heappush, heappop
+from math import sin, cos, pi, hypot
+from multiprocessing import Pool
+from time import time
+
+import numpy as np
+
+from ..constants import PLAN_HEADINGS, PLAN_TIME_BUDGET, PLAN_MAX_EXPANSIONS, \
+    PLAN_EPSILONS, PLAN_MAX_AGE
+
+
+def make_problem(plane, pos, wp):
+    """Return a dictionary describing the detour problem for plane at
+    the position pos to the position wp in the frame of its obstacle
+    avoidance system that can be sent to plan_detour().
+
+    The obstacles are circles of their avoidance radius at the plane's
+    altitude, and the moving obstacles move with the velocities of their
+    tracks.
+    """
+
+    avoid_sys = plane.avoid_sys
+    obs_set = avoid_sys.obs_set
+
+    radii = obs_set.get_avoid_radii(plane.loc.alt)
+    avoided = np.flatnonzero(radii > 0)
+
+    vel = np.zeros((2, len(obs_set)))
+    track = avoid_sys.track
+
+    if track.obs_set is obs_set:
+        vel[:, obs_set.n_static:] = track.pred_vel[:2]
+
+    return {
+        'start': (pos.x, pos.y, plane.heading),
+        'goal': (wp.x, wp.y),
+        'speed': max(plane.airspeed, 1),
+        'turning_radius': plane.turning_radius,
+        'goal_radius': max(plane.wp_radius, plane.turning_radius),
+        'obs_x': obs_set.x[avoided].tolist(),
+        'obs_y': obs_set.y[avoided].tolist(),
+        'obs_vx': vel[0, avoided].tolist(),
+        'obs_vy': vel[1, avoided].tolist(),
+        'obs_radius': radii[avoided].tolist()
+    }
+
+
+def _get_primitives(turning_radius):
+    """Return the motion primitives as a list of the change in heading
+    index and a function giving the end and middle points of the
+    primitive from a point and heading.
+    """
+
+    d_heading = 2 * pi / PLAN_HEADINGS
+    length = turning_radius * d_heading
+
+    def straight(x, y, heading):
+        d_x = length * sin(heading)
+        d_y = length * cos(heading)
+
+        return (x + d_x, y + d_y), (x + d_x / 2, y + d_y / 2)
+
+    def arc(side):
+        def turn(x, y, heading):
+            # The center of the turn is turning_radius to the side.
+            c_x = x + side * turning_radius * cos(heading)
+            c_y = y - side * turning_radius * sin(heading)
+
+            points = []
+
+            for angle in (heading + side * d_heading,
+                    heading + side * d_heading / 2):
+                points.append((c_x - side * turning_radius * cos(angle),
+                    c_y + side * turning_radius * sin(angle)))
+
+            return points
+
+        return turn
+
+    return length, [(0, straight), (1, arc(1)), (-1, arc(-1))]
+
+
+def _search(problem, epsilon, deadline):
+    """Return the path found by a weighted A* search with the heuristic
+    inflated by epsilon as a list of points, its length, and the number
+    of nodes expanded, or None for the path if no path was found before
+    deadline.
+    """
+
+    x_0, y_0, heading_0 = problem['start']
+    goal_x, goal_y = problem['goal']
+    speed = problem['speed']
+    goal_radius = problem['goal_radius']
+
+    obstacles = zip(problem['obs_x'], problem['obs_y'], problem['obs_vx'],
+        problem['obs_vy'], problem['obs_radius'])
+
+    length, primitives = _get_primitives(problem['turning_radius'])
+    cell = length / 2.0
+
+    d_heading = 2 * pi / PLAN_HEADINGS
+    i_heading_0 = int(round(heading_0 / d_heading)) % PLAN_HEADINGS
+
+    def is_free(point, t):
+        for o_x, o_y, o_vx, o_vy, radius in obstacles:
+            if hypot(point[0] - o_x - o_vx * t, point[1] - o_y - o_vy * t) \
+                    < radius:
+                return False
+
+        return True
+
+    def heuristic(x, y):
+        return hypot(goal_x - x, goal_y - y)
+
+    start = (x_0, y_0, i_heading_0)
+    parents = {start: None}
+    costs = {start: 0}
+    closed = set()
+
+    queue = [(epsilon * heuristic(x_0, y_0), 0, start)]
+    expansions = 0
+
+    while queue and expansions < PLAN_MAX_EXPANSIONS:
+        if not expansions % 64 and time() > deadline:
+            break
+
+        _, cost, node = heappop(queue)
+        x, y, i_heading = node
+
+        key = (int(round(x / cell)), int(round(y / cell)), i_heading)
+
+        if key in closed:
+            continue
+
+        closed.add(key)
+        expansions += 1
+
+        if heuristic(x, y) <= goal_radius:
+            path = []
+
+            while node:
+                path.append((node[0], node[1]))
+                node = parents[node]
+
+            path.reverse()
+            path.append((goal_x, goal_y))
+
+            return path, cost + heuristic(x, y), expansions
+
+        for d_i, primitive in primitives:
+            end, middle = primitive(x, y, i_heading * d_heading)
+            t = (cost + length) / speed
+
+            if not is_free(middle, t - length / 2 / speed) or not is_free(end,
+                    t):
+                continue
+
+            child = (end[0], end[1], (i_heading + d_i) % PLAN_HEADINGS)
+            child_cost = cost + length
+
+            if child_cost < costs.get(child, float('inf')):
+                costs[child] = child_cost
+                parents[child] = node
+
+                heappush(queue, (child_cost + epsilon * heuristic(*end),
+                    child_cost, child))
+
+    return None, None, expansions
+
+
+def _simplify(path):
+    """Return the points of path where the direction of the path
+    changes, with the start left out and the end kept.
+    """
+
+    points = []
+
+    for n in xrange(1, len(path) - 1):
+        d_1 = (path[n][0] - path[n - 1][0], path[n][1] - path[n - 1][1])
+        d_2 = (path[n + 1][0] - path[n][0], path[n + 1][1] - path[n][1])
+
+        if abs(d_1[0] * d_2[1] - d_1[1] * d_2[0]) > 1e-6 * (hypot(*d_1) *
+                hypot(*d_2) or 1):
+            points.append(path[n])
+
+    points.append(path[-1])
+
+    return points
+
+
+def plan_detour(problem, time_budget=PLAN_TIME_BUDGET):
+    """Plan a detour for the problem from make_problem() and return a
+    dictionary of the waypoints of the best plan found in time_budget
+    seconds, or None, and how the planning went.
+
+    The quality of a plan is given by its length, the straight line
+    distance to the goal, and the epsilon of the search that found it,
+    which bounds its length to epsilon times the shortest on the
+    lattice.
+    """
+
+    start_time = time()
+    deadline = start_time + time_budget
+
+    best = None
+    expansions = 0
+
+    for epsilon in PLAN_EPSILONS:
+        path, length, n = _search(problem, epsilon, deadline)
+        expansions += n
+
+        if path and (not best or length < best['length']):
+            best = {'path': path, 'length': length, 'epsilon': epsilon}
+
+        if time() > deadline:
+            break
+
+    x_0, y_0, _ = problem['start']
+    goal_x, goal_y = problem['goal']
+
+    return {
+        'waypoints': _simplify(best['path']) if best else None,
+        'length': best['length'] if best else None,
+        'epsilon': best['epsilon'] if best else None,
+        'straight_length': hypot(goal_x - x_0, goal_y - y_0),
+        'expansions': expansions,
+        'planning_time': time() - start_time
+    }
+
+
+def _plan_detour_safely(problem, time_budget):
+    """Plan a detour as plan_detour() does, but return a plan with no
+    waypoints and the error raised instead of raising it, so that the
+    planner always hears back about a request.
+    """
+
+    start_time = time()
+
+    try:
+        return plan_detour(problem, time_budget)
+    except Exception as e:
+        return {
+            'waypoints': None,
+            'length': None,
+            'epsilon': None,
+            'straight_length': None,
+            'expansions': 0,
+            'planning_time': time() - start_time,
+            'error': '%s: %s' % (type(e).__name__, e)
+        }
+
+
+def get_plan_report(plan):
+    """Return a string reporting the planning time and the quality of a
+    plan from plan_detour().
+    """
+
+    if plan.get('error'):
+        return 'Detour plan %d: failed in %.3f s (%s)' % (plan.get('version',
+            0), plan['planning_time'], plan['error'])
+
+    if not plan['waypoints']:
+        return 'Detour plan %d: no plan found in %.3f s (%d expansions)' % \
+            (plan.get('version', 0), plan['planning_time'], plan['expansions'])
+
+    return 'Detour plan %d: %.0f m, %.2f times straight, epsilon %.1f, ' \
+        '%d waypoints in %.3f s (%d expansions)' % (plan.get('version', 0),
+        plan['length'], plan['length'] / max(plan['straight_length'], 1),
+        plan['epsilon'], len(plan['waypoints']), plan['planning_time'],
+        plan['expansions'])
+
+
+class DetourPlanner(object):
+
+    """Represents the planning of detours in a worker process for an
+    obstacle avoidance system.
+
+    A plan is requested by request() with a key describing what it is
+    for, and only one plan is planned at a time. The latest finished
+    plan is kept in plan, a dictionary from plan_detour() with the
+    version and key of its request and the time it finished, unless it
+    has no waypoints and the plan before it is for the same key.
+
+    A key whose latest plan has no waypoints is not planned again until
+    the plan is PLAN_MAX_AGE seconds old, and only the first of the
+    plans in a row with no waypoints for a key is reported. The plans
+    are counted and timed in instruments if it is given.
+    """
+
+    def __init__(self, clock=time, time_budget=PLAN_TIME_BUDGET,
+            synchronous=False, instruments=None):
+        """Instantiate a DetourPlanner object using clock for the times
+        of the plans and planning for up to time_budget seconds. If
+        synchronous is True plans are planned by request() itself
+        instead of in a worker process.
+        """
+
+        self.clock = clock
+        self.time_budget = time_budget
+        self.synchronous = synchronous
+        self.instruments = instruments
+
+        self.version = 0
+        self.plan = None
+        self.busy = False
+        self.closed = False
+
+        # The latest plan with no waypoints, until a plan for its key has
+        # waypoints.
+        self._failed = None
+
+        self._pool = None
+        self._own_pool = False
+
+    def start(self, pool=None):
+        """Start planning in the worker processes of the multiprocessing
+        Pool pool, or in a worker process of its own if pool is None,
+        unless the planner is closed.
+        """
+
+        if not self._pool and not self.closed:
+            self._own_pool = pool is None
+            self._pool = pool or Pool(1)
+
+    def close(self):
+        """Stop planning, stopping the worker process if it is the
+        planner's own. No plans are requested after the planner is
+        closed.
+        """
+
+        self.closed = True
+
+        if self._pool and self._own_pool:
+            self._pool.terminate()
+
+        self._pool = None
+
+    def request(self, problem, key):
+        """Request a plan for the problem from make_problem() with key
+        unless a plan is already being planned, the planner is closed, or
+        the latest plan for key has no waypoints and is not PLAN_MAX_AGE
+        seconds old. Return whether the plan was requested.
+        """
+
+        if self.busy or self.closed:
+            return False
+
+        failed = self._failed
+
+        if failed and failed['key'] == key and self.clock() - \
+                failed['time'] < PLAN_MAX_AGE:
+            return False
+
+        self.version += 1
+        self.busy = True
+
+        version = self.version
+
+        def finished(plan):
+            plan['version'] = version
+            plan['key'] = key
+            plan['time'] = self.clock()
+
+            # A failed replan keeps the plan being flown for the same key.
+            last = self.plan
+
+            if plan['waypoints'] or not last or last['key'] != key:
+                self.plan = plan
+
+            failed = self._failed
+
+            if plan['waypoints']:
+                self._failed = None
+            else:
+                if not failed or failed['key'] != key:
+                    print get_plan_report(plan)
+
+                self._failed = plan
+
+            self.busy = False
+
+            instruments = self.instruments
+
+            if instruments:
+                instruments.count('plans')
+                instruments.record('plan_time', plan['planning_time'])
+
+                if not plan['waypoints']:
+                    instruments.count('plan_failures')
+
+        if self.synchronous:
+            finished(_plan_detour_safely(problem, self.time_budget))
+        else:
+            self.start()
+
+            # The planner may have been closed by another thread meanwhile.
+            pool = self._pool
+
+            if not pool:
+                self.busy = False
+                return False
+
+            pool.apply_async(_plan_detour_safely, (problem,
+                self.time_budget), callback=finished)
+
+        return True
+
+    def get_plan(self, key):
+        """Return the latest plan if it is for key and has waypoints,
+        otherwise None.
+        """
+
+        plan = self.plan
+
+        if plan and plan['key'] == key and plan['waypoints']:
+            return plan
+
+        return None
@@ -0,0 +1,136 @@
+"""Handles profiling the ticks of the monitoring thread on request.
+
+cProfile only profiles the thread that enables it, so a capture is
+requested from any thread and started by the monitoring thread at its
+next tick. Each tick is run under the profiler until the capture is
+stopped or its duration has passed, and the statistics are then written
+to a pstats file and summarized by another thread. No profiler exists
+while nothing is being captured, so the ticks run as they otherwise
+would.
+"""
+
+import cProfile
+import os
+import pstats
+from threading import Lock, Thread
+from time import time
+
+from ..constants import PROFILE_DURATION, PROFILE_TOP, PROFILE_PATH
+from ..util import monotonic
+
+
+def get_profile_summary(stats, top=PROFILE_TOP):
+    """Return a list of the top functions of the pstats Stats stats by
+    cumulative time as tuples of the function as a string, the number of
+    calls, and the cumulative and total time in seconds.
+    """
+
+    stats.sort_stats('cumulative')
+    summary = []
+
+    for func in stats.fcn_list[:top]:
+        _, n_calls, total_time, cum_time, _ = stats.stats[func]
+        filename, line, name = func
+
+        summary.append(('%s:%d(%s)' % (os.path.basename(filename), line,
+            name), n_calls, cum_time, total_time))
+
+    return summary
+
+
+class TickProfiler(object):
+
+    """Represents captures of cProfile profiles of the ticks of the
+    monitoring thread.
+
+    A capture is started by request() and stopped by stop() or after its
+    duration. The monitoring thread runs its ticks through run() while
+    active is True, and a capture requested during a tick goes on past
+    it. When a capture ends, the path of its pstats file,
+    the number of ticks profiled, and the summary from
+    get_profile_summary() are kept in last and passed to report if it is
+    not None.
+    """
+
+    def __init__(self, path=PROFILE_PATH, report=None, clock=monotonic):
+        """Instantiate a TickProfiler object writing the profiles to path
+        formatted with the time each capture ends.
+        """
+
+        self.path = path
+        self.report = report
+        self.clock = clock
+
+        self.active = False
+        self.last = None
+
+        # Held while a request or the start or end of a capture changes
+        # the state of the captures.
+        self._lock = Lock()
+
+        self._duration = None
+        self._stopping = False
+        self._profile = None
+        self._end = None
+        self._ticks = 0
+
+    def request(self, duration=PROFILE_DURATION):
+        """Profile the ticks for duration seconds from the next tick, or
+        from now if a capture is already running.
+        """
+
+        with self._lock:
+            self._stopping = False
+            self._duration = duration
+            self.active = True
+
+    def stop(self):
+        """End the capture running after its next tick."""
+        with self._lock:
+            self._stopping = True
+
+    def run(self, tick):
+        """Call the function tick under the profiler of the capture."""
+        with self._lock:
+            if self._duration is not None:
+                if self._profile is None:
+                    self._profile = cProfile.Profile()
+                    self._ticks = 0
+
+                self._end = self.clock() + self._duration
+                self._duration = None
+
+        self._profile.runcall(tick)
+        self._ticks += 1
+
+        with self._lock:
+            # A capture requested during the tick goes on from the next
+            # tick.
+            if self._duration is not None or not (self._stopping or
+                    self.clock() >= self._end):
+                return
+
+            profile = self._profile
+
+            self._profile = None
+            self.active = False
+
+        _finishing_thread = Thread(target=self._finish, args=(profile,
+            self._ticks))
+        _finishing_thread.start()
+
+    def _finish(self, profile, ticks):
+        """Write the profile of ticks ticks to a file and report its
+        summary.
+        """
+
+        path = self.path % int(time())
+        profile.dump_stats(path)
+
+        summary = get_profile_summary(pstats.Stats(profile))
+        self.last = (path, ticks, summary)
+
+        print 'Profiled %d ticks to %s' % (ticks, path)
+
+        if self.report:
+            self.report(path, ticks, summary)
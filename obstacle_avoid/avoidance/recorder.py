@@ -0,0 +1,260 @@
+"""Handles recording the ticks of the monitoring thread to a file.
+
+Each tick is written as a record of a fixed layout to a ring of records
+in a file that is allocated and memory mapped once, so recording a tick
+only writes to memory and the oldest ticks are overwritten once the ring
+is full. The file starts with a header holding the number of records
+written, so a recording can be read back as a NumPy structured array in
+the order the ticks were run, even while it is being written. A fixed
+path is overwritten by each flight recorded to it, so only the latest
+flight takes up space.
+"""
+
+import numpy as np
+
+from ..constants import RECORDER_CAPACITY, RECORDER_OBSTACLES
+from ..util import monotonic
+
+# The commands that can be sent to the plane by the action of a tick.
+COMMAND_NONE = 0
+COMMAND_GOTO = 1
+COMMAND_TURN = 2
+COMMAND_AUTO = 3
+COMMAND_LOITER = 4
+
+_MAGIC = 0x3330434552414f  # 'OAREC03' in little endian
+_HEADER_SIZE = 64
+
+# The names of the times taken by the steps of a tick.
+TIMING_NAMES = ('snapshot', 'state', 'action')
+
+
+def get_record_dtype(n_obstacles=RECORDER_OBSTACLES):
+    """Return the NumPy structured dtype of a record of a tick with the
+    positions of up to n_obstacles moving obstacles.
+
+    The times are in seconds on the clock of the obstacle avoidance
+    system, and the angles and the latitudes and longitudes are in
+    radians. The positions of the moving obstacles are x, y, and z in
+    the frame as they were received in the latest update before the
+    tick, at update_time, with the number recorded in n_obstacles. A
+    tick that raised has error set, and the values it did not get to
+    are NaN, or -1 for the state.
+
+    The values the tick saw are kept at full precision so that replaying
+    the recording gives the avoidance code exactly the same inputs.
+    """
+
+    return np.dtype([
+        ('tick', np.uint64),
+        ('time', np.float64),
+        ('version', np.uint64),
+        ('lat', np.float64),
+        ('lon', np.float64),
+        ('alt', np.float64),
+        ('heading', np.float64),
+        ('pitch', np.float64),
+        ('airspeed', np.float64),
+        ('mode', 'S8'),
+        ('wp_number', np.int32),
+        ('state', np.int8),
+        ('error', np.bool_),
+        ('command', np.int8),
+        ('turn_angle', np.float64),
+        ('goto_lat', np.float64),
+        ('goto_lon', np.float64),
+        ('goto_alt', np.float64),
+        ('timings', np.float32, (len(TIMING_NAMES),)),
+        ('update_time', np.float64),
+        ('n_obstacles', np.int32),
+        ('obstacles', np.float64, (n_obstacles, 3))
+    ])
+
+
+class FlightRecorder(object):
+
+    """Represents a ring of records of the ticks of the monitoring thread
+    in a memory mapped file at path holding the latest capacity ticks.
+
+    A tick is recorded by begin() when it starts, mark() after each of
+    its steps, the note_*() methods as commands are sent, and end() once
+    it is done, whether or not it raised.
+    """
+
+    def __init__(self, path, capacity=RECORDER_CAPACITY,
+            n_obstacles=RECORDER_OBSTACLES, clock=monotonic):
+        """Instantiate a FlightRecorder object allocating a new file at
+        path for capacity records.
+        """
+
+        self.path = path
+        self.capacity = capacity
+        self.n_obstacles = n_obstacles
+        self.clock = clock
+
+        dtype = get_record_dtype(n_obstacles)
+
+        self.records = np.memmap(path, dtype=dtype, mode='w+',
+            offset=_HEADER_SIZE, shape=(capacity,))
+
+        # The magic number, the layout, and the number of records
+        # written.
+        self._header = np.memmap(path, dtype=np.uint64, mode='r+',
+            shape=(_HEADER_SIZE // 8,))
+        self._header[:4] = (_MAGIC, capacity, n_obstacles, 0)
+
+        # The fields are looked up once so that each tick only assigns
+        # to elements of them.
+        self._fields = dict((name, self.records[name]) for name in
+            dtype.names)
+
+        self.count = 0
+        self._row = 0
+        self._marks = [0.0] * (len(TIMING_NAMES) + 1)
+
+    def begin(self):
+        """Start the record of a tick."""
+        fields = self._fields
+        row = self._row = self.count % self.capacity
+
+        self._marks[0] = start = self.clock()
+
+        fields['tick'][row] = self.count
+        fields['time'][row] = start
+        fields['version'][row] = 0
+        fields['lat'][row] = np.nan
+        fields['lon'][row] = np.nan
+        fields['alt'][row] = np.nan
+        fields['heading'][row] = np.nan
+        fields['pitch'][row] = np.nan
+        fields['airspeed'][row] = np.nan
+        fields['mode'][row] = ''
+        fields['wp_number'][row] = -1
+        fields['state'][row] = -1
+        fields['update_time'][row] = np.nan
+        fields['n_obstacles'][row] = 0
+        fields['command'][row] = COMMAND_NONE
+        fields['turn_angle'][row] = np.nan
+        fields['goto_lat'][row] = np.nan
+        fields['goto_lon'][row] = np.nan
+        fields['goto_alt'][row] = np.nan
+        fields['timings'][row] = np.nan
+
+    def mark(self, step):
+        """Record that the step of the tick with the index step in
+        TIMING_NAMES is done.
+        """
+
+        self._marks[step + 1] = self.clock()
+
+    def note_turn(self, turn_angle):
+        """Record that the plane was turned by turn_angle radians."""
+        fields = self._fields
+
+        fields['command'][self._row] = COMMAND_TURN
+        fields['turn_angle'][self._row] = turn_angle
+
+    def note_goto(self, wp):
+        """Record that the plane was sent to the Location wp."""
+        fields = self._fields
+        row = self._row
+
+        # A turn is sent as a goto, which is kept as the target of the
+        # turn.
+        if fields['command'][row] != COMMAND_TURN:
+            fields['command'][row] = COMMAND_GOTO
+
+        fields['goto_lat'][row] = wp.lat
+        fields['goto_lon'][row] = wp.lon
+        fields['goto_alt'][row] = wp.alt
+
+    def note_mode(self, mode):
+        """Record that the mode of the plane was set to mode."""
+        self._fields['command'][self._row] = COMMAND_LOITER if \
+            mode == 'LOITER' else COMMAND_AUTO
+
+    def end(self, plane, state, track, error=False):
+        """Finish the record of a tick for the PlaneStatic plane in the
+        avoidance state state with the latest update of the moving
+        obstacles of the TrackStore track, which raised if error is True.
+
+        The plane and the state are None if the tick raised before they
+        were found.
+        """
+
+        fields = self._fields
+        row = self._row
+        marks = self._marks
+
+        fields['error'][row] = error
+
+        if plane is not None:
+            snapshot = plane.state
+            loc = snapshot.loc
+
+            fields['version'][row] = snapshot.version
+            fields['lat'][row] = loc.lat
+            fields['lon'][row] = loc.lon
+            fields['alt'][row] = loc.alt
+            fields['heading'][row] = snapshot.heading
+            fields['pitch'][row] = snapshot.pitch
+            fields['airspeed'][row] = snapshot.airspeed
+            fields['mode'][row] = snapshot.mode
+            fields['wp_number'][row] = plane.next_wp_number
+
+        if state is not None:
+            fields['state'][row] = state
+
+        timings = fields['timings']
+
+        for step in xrange(len(TIMING_NAMES)):
+            if marks[step + 1] >= marks[step]:
+                timings[row, step] = marks[step + 1] - marks[step]
+
+        # The update as it was received, not as the moving obstacles were
+        # predicted from it, so that a replay feeds the tracks the same
+        # updates.
+        update_time, positions = track.last_update
+        n = min(positions.shape[1], self.n_obstacles)
+
+        if update_time is not None:
+            fields['update_time'][row] = update_time
+
+        fields['n_obstacles'][row] = n
+        fields['obstacles'][row, :n] = positions[:, :n].T
+
+        # The record is only counted once it is complete.
+        self.count += 1
+        self._header[3] = self.count
+
+        # Marks not made by the next tick are not taken from this one.
+        for step in xrange(1, len(marks)):
+            marks[step] = 0.0
+
+    def close(self):
+        """Write the records to the file."""
+        self.records.flush()
+        self._header.flush()
+
+
+def read_recording(path):
+    """Return the records of a recording at path as a NumPy structured
+    array in the order they were recorded.
+    """
+
+    header = np.fromfile(path, dtype=np.uint64, count=_HEADER_SIZE // 8)
+
+    if not len(header) or header[0] != _MAGIC:
+        raise ValueError('%s is not a flight recording' % path)
+
+    capacity, n_obstacles, count = (int(value) for value in header[1:4])
+
+    records = np.memmap(path, dtype=get_record_dtype(n_obstacles),
+        mode='r', offset=_HEADER_SIZE, shape=(capacity,))
+
+    if count <= capacity:
+        return np.array(records[:count])
+
+    first = count % capacity
+
+    return np.concatenate((records[first:], records[:first]))
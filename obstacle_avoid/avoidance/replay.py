@@ -0,0 +1,456 @@
+"""Handles replaying flights through the obstacle avoidance system in
+fast time without a plane connected.
+
+A flight is a trace of steps, each with the state of the plane at a time
+and optionally an update of the positions of the moving obstacles, taken
+from a recording of the flight recorder or made up by
+make_synthetic_trace(). The obstacle avoidance system is driven by a
+virtual clock set to the time of each step and plans its detours in the
+same thread, so a replay runs as fast as the avoidance code allows and
+always makes the same decisions for the same trace. The decisions can be
+written out one line per step and compared between versions of the code.
+
+A replay can itself be recorded, and replaying the recording makes the
+same decisions again. A recording of a flight gives the replay the same
+plane states and updates as the ticks had, but the flight planned its
+detours in a worker process and found its routes in the routing thread,
+so a replay of it can differ where the flight was still waiting for a
+plan or for the routes.
+"""
+
+from collections import namedtuple
+from math import atan2, pi, sin, cos, tan
+from random import Random
+from time import time
+
+import numpy as np
+
+from avoid_action import do_action
+from avoid_state import determine_state, determine_state_incremental
+from avoid_sys import AvoidanceSystem
+from benchmark import make_obstacle_field
+from planner import DetourPlanner
+from recorder import FlightRecorder
+from ..constants import ACCEL_GRAV
+from ..types import Distance, Location, LocalFrame
+from ..util import deg_to_rad, rad_to_deg
+
+# A waypoint of a mission with the attributes of a dronekit command.
+ReplayCommand = namedtuple('ReplayCommand', ('x', 'y', 'z'))
+
+# The values of a plane from a step, read by the flight recorder as it
+# reads a PlaneState.
+ReplayState = namedtuple('ReplayState', ('version', 'airspeed', 'heading',
+    'pitch', 'loc', 'mode'))
+
+
+class ReplayPlane(object):
+
+    """Represents a plane being replayed with the attributes used by the
+    obstacle avoidance system, which are set from each step of a trace.
+
+    The commands sent to the plane by the actions are not carried out
+    but are kept in commands_sent until taken by take_commands(), and the
+    values set by the latest step are kept in state.
+    """
+
+    def __init__(self, home_loc, commands, wp_radius, bank_angle):
+        """Instantiate a ReplayPlane object for a mission of commands
+        with the waypoint radius wp_radius in meters and the bank angle
+        bank_angle in radians.
+        """
+
+        self.home_loc = home_loc
+        self.commands = commands
+        self.wp_radius = wp_radius
+        self._bank_angle = bank_angle
+
+        self.airspeed = 0
+        self.heading = 0
+        self.pitch = 0
+        self.loc = home_loc
+        self.turning_radius = 0
+        self.mode = 'AUTO'
+        self.next_wp_number = 1
+        self.next_wp = None
+
+        self.state = None
+        self.avoid_sys = None
+        self.commands_sent = []
+
+    def update(self, step):
+        """Set the state of the plane from a step of a trace."""
+        self.airspeed = step['airspeed']
+        self.heading = step['heading']
+        self.pitch = step.get('pitch', 0)
+        self.loc = step['loc']
+        self.turning_radius = self.airspeed ** 2 / ACCEL_GRAV / tan(
+            self._bank_angle)
+        self.mode = step.get('mode', self.mode)
+        self.next_wp_number = step['wp_number']
+
+        self.state = ReplayState(self.state.version + 1 if self.state else 0,
+            self.airspeed, self.heading, self.pitch, self.loc, self.mode)
+
+        try:
+            self.next_wp = Location.from_command(
+                self.commands[self.next_wp_number - 1])
+        except IndexError:
+            self.next_wp = None
+
+    def to_static(self):
+        return self
+
+    def take_commands(self):
+        """Return the commands sent since the last call and forget them."""
+        commands = self.commands_sent
+        self.commands_sent = []
+
+        return commands
+
+    def go_loiter(self):
+        if not self.mode == 'LOITER':
+            self.mode = 'LOITER'
+            self.commands_sent.append(('loiter',))
+
+            if self.avoid_sys.recorder:
+                self.avoid_sys.recorder.note_mode('LOITER')
+
+    def go_auto(self):
+        if not self.mode == 'AUTO':
+            self.mode = 'AUTO'
+            self.commands_sent.append(('auto',))
+
+            if self.avoid_sys.recorder:
+                self.avoid_sys.recorder.note_mode('AUTO')
+
+        self.avoid_sys.monitor_count = 0
+
+    def goto(self, wp):
+        self.mode = 'GUIDED'
+        self.commands_sent.append(('goto', wp.lat, wp.lon, wp.alt))
+
+        if self.avoid_sys.recorder:
+            self.avoid_sys.recorder.note_goto(wp)
+
+    def turn(self, turn_angle):
+        self.mode = 'GUIDED'
+        self.commands_sent.append(('turn', turn_angle))
+
+        if self.avoid_sys.recorder:
+            self.avoid_sys.recorder.note_turn(turn_angle)
+
+        self.avoid_sys.monitor_count = 0
+
+
+class FlightReplay(object):
+
+    """Represents the obstacle avoidance system of a plane flying a
+    mission of commands among static_obs and moving_obs, driven by the
+    steps of a trace on a virtual clock.
+
+    Detours are planned in the same thread without a time budget, so the
+    planning is limited only by PLAN_MAX_EXPANSIONS. If incremental is
+    True the states are determined by determine_state_incremental() as
+    in flight, and by determine_state() otherwise.
+    """
+
+    def __init__(self, home_loc, static_obs, moving_obs, commands,
+            wp_radius=20, bank_angle=deg_to_rad(45), incremental=True,
+            record_path=None):
+        """Instantiate a FlightReplay object with the frame anchored at
+        home_loc. If record_path is given every step is recorded to a file
+        at record_path as the monitoring thread records its ticks.
+        """
+
+        self.now = 0.0
+        self.incremental = incremental
+
+        self.plane = plane = ReplayPlane(home_loc, commands, wp_radius,
+            bank_angle)
+
+        avoid_sys = AvoidanceSystem(plane, monitor=False,
+            clock=lambda: self.now)
+        avoid_sys.planner = DetourPlanner(avoid_sys.clock, float('inf'),
+            synchronous=True)
+
+        if record_path:
+            avoid_sys.recorder = FlightRecorder(record_path,
+                clock=lambda: self.now)
+
+        plane.avoid_sys = avoid_sys
+        self.avoid_sys = avoid_sys
+
+        avoid_sys.set_mission(commands)
+        avoid_sys.set_obstacles(static_obs, moving_obs)
+        avoid_sys.start()
+
+        self.frame = avoid_sys.frame
+
+        self.steps = 0
+        self.elapsed = 0.0
+
+    def step(self, step):
+        """Run the obstacle avoidance system for a step of a trace and
+        return the decision made as a dictionary of the number and time
+        of the step, the avoidance state, the index of the obstacle
+        avoided, or -1, the list of commands sent to the plane, and the
+        name of the error raised, or None.
+        """
+
+        start = time()
+
+        plane = self.plane
+        avoid_sys = self.avoid_sys
+        recorder = avoid_sys.recorder
+
+        # The update of the moving obstacles is added at the time it was
+        # received, before the tick.
+        if 'moving' in step:
+            self.now = step.get('moving_time', step['time'])
+
+            for obs, loc in zip(avoid_sys.moving_obs, step['moving']):
+                obs.loc = loc
+
+            avoid_sys.update_moving_obstacles()
+
+        self.now = step['time']
+
+        if recorder:
+            recorder.begin()
+
+        plane.update(step)
+
+        if recorder:
+            recorder.mark(0)
+
+        state = None
+        error = None
+
+        # An error is kept in the decision and the replay goes on, as the
+        # monitoring thread would.
+        try:
+            if self.incremental:
+                state = determine_state_incremental(plane)
+            else:
+                state = determine_state(plane)
+
+            if recorder:
+                recorder.mark(1)
+
+            do_action(state, plane)
+
+            if recorder:
+                recorder.mark(2)
+
+        except Exception as e:
+            error = type(e).__name__
+
+        if recorder:
+            recorder.end(plane, state, avoid_sys.track, error is not None)
+
+        avoid_obs = next((i for i, obs in enumerate(
+            avoid_sys.obs_set.obstacles) if obs is avoid_sys.avoid_obs), -1)
+
+        decision = {
+            'step': self.steps,
+            'time': self.now,
+            'state': state,
+            'avoid_obs': avoid_obs,
+            'commands': plane.take_commands(),
+            'error': error
+        }
+
+        self.steps += 1
+        self.elapsed += time() - start
+
+        return decision
+
+    def run(self, trace):
+        """Run every step of trace and return the list of decisions."""
+        return [self.step(step) for step in trace]
+
+    def close(self):
+        """Write the recording of the replay to its file if there is
+        one.
+        """
+
+        if self.avoid_sys.recorder:
+            self.avoid_sys.recorder.close()
+
+
+def trace_from_recording(records, frame):
+    """Return a trace from the NumPy structured array of records from
+    read_recording(), with each update of the moving obstacles given in
+    the first step after it was received along with its time, using
+    frame for the positions.
+
+    A recording only holds the state of the plane and the updates of
+    the moving obstacles, so the trace can only be replayed by a
+    FlightReplay given the static obstacles, the moving obstacles, and
+    the mission that were flown, with frame anchored at the same home
+    location. None of them can be rebuilt from the recording alone.
+    """
+
+    trace = []
+    last = None
+
+    for record in records:
+        # A tick that raised before taking the state of the plane has no
+        # step to replay.
+        if np.isnan(record['lat']):
+            continue
+
+        step = {
+            'time': float(record['time']),
+            'airspeed': float(record['airspeed']),
+            'heading': float(record['heading']),
+            'pitch': float(record['pitch']),
+            'loc': Location(float(record['lat']), float(record['lon']),
+                float(record['alt'])),
+            'mode': str(record['mode']),
+            'wp_number': int(record['wp_number'])
+        }
+
+        update_time = float(record['update_time'])
+
+        if not np.isnan(update_time) and update_time != last:
+            step['moving'] = [frame.from_local(Distance(float(x), float(y),
+                float(alt) - frame.anchor.alt)) for x, y, alt in
+                record['obstacles'][:record['n_obstacles']]]
+            step['moving_time'] = update_time
+            last = update_time
+
+        trace.append(step)
+
+    return trace
+
+
+def make_synthetic_trace(replay, steps=1000, dt=0.1, seed=0):
+    """Return a trace of steps dt seconds apart of the plane of replay
+    flying its mission, turning towards each waypoint at its turning
+    rate with some random wandering, and its moving obstacles moving at
+    random constant velocities.
+    """
+
+    random = Random(seed)
+
+    plane = replay.plane
+    avoid_sys = replay.avoid_sys
+    frame = replay.frame
+    mission = avoid_sys.mission
+
+    velocities = [(random.uniform(-15, 15), random.uniform(-15, 15),
+        random.uniform(-1, 1)) for _ in avoid_sys.moving_obs]
+    moving = [frame.to_local(obs.loc) for obs in avoid_sys.moving_obs]
+
+    pos = Distance(0, 0, mission[0][2])
+    heading = atan2(mission[0][0], mission[0][1])
+    wp_number = 1
+
+    trace = []
+
+    for n in xrange(steps):
+        wp = mission[wp_number - 1]
+
+        if np.hypot(wp[0] - pos.x, wp[1] - pos.y) < plane.wp_radius:
+            wp_number = wp_number % len(mission) + 1
+            wp = mission[wp_number - 1]
+
+        airspeed = random.uniform(12, 25)
+        turning_radius = airspeed ** 2 / ACCEL_GRAV / tan(plane._bank_angle)
+
+        # Turn towards the waypoint no faster than the plane can.
+        bearing = atan2(wp[0] - pos.x, wp[1] - pos.y)
+        turn = (bearing - heading + pi) % (2 * pi) - pi
+        max_turn = airspeed * dt / turning_radius
+
+        heading += max(-max_turn, min(turn, max_turn)) + random.uniform(-0.05,
+            0.05)
+
+        pos.set(pos.x + airspeed * dt * sin(heading), pos.y + airspeed * dt *
+            cos(heading), pos.z + (wp[2] - pos.z) * 0.05)
+
+        for dist, (v_x, v_y, v_z) in zip(moving, velocities):
+            dist.set(dist.x + v_x * dt, dist.y + v_y * dt, dist.z + v_z * dt)
+
+        trace.append({
+            'time': (n + 1) * dt,
+            'airspeed': airspeed,
+            'heading': heading % (2 * pi),
+            'pitch': 0,
+            'loc': frame.from_local(pos),
+            'wp_number': wp_number,
+            'moving': [frame.from_local(dist) for dist in moving]
+        })
+
+    return trace
+
+
+def make_synthetic_replay(n_static=100, n_moving=10, n_waypoints=8,
+        field_size=3000, seed=0, incremental=True, record_path=None):
+    """Return a FlightReplay of a plane flying a random mission of
+    n_waypoints waypoints through a synthetic field of n_static static
+    and n_moving moving obstacles in a square of side field_size meters,
+    recorded to a file at record_path if it is given.
+    """
+
+    random = Random(seed)
+    half = field_size / 2.0
+
+    home_loc = Location(deg_to_rad(38.1446), deg_to_rad(-76.4279), 0)
+    frame = LocalFrame(home_loc)
+
+    static_obs, moving_obs = make_obstacle_field(frame, n_static, n_moving,
+        field_size, 0, random)
+
+    commands = []
+
+    for _ in xrange(n_waypoints):
+        wp = frame.from_local(Distance(random.uniform(-half, half),
+            random.uniform(-half, half), random.uniform(60, 140)))
+        commands.append(ReplayCommand(rad_to_deg(wp.lat), rad_to_deg(wp.lon),
+            wp.alt))
+
+    return FlightReplay(home_loc, static_obs, moving_obs, commands,
+        incremental=incremental, record_path=record_path)
+
+
+def format_decision(decision):
+    """Return a decision from FlightReplay.step() as a line of text."""
+    commands = ' '.join(':'.join([command[0]] + ['%.6f' % value for value
+        in command[1:]]) for command in decision['commands'])
+
+    line = '%d %.3f %s %d %s' % (decision['step'], decision['time'],
+        decision['state'], decision['avoid_obs'], commands)
+
+    if decision['error']:
+        line += ' error:' + decision['error']
+
+    return line
+
+
+def write_decisions(decisions, path):
+    """Write the decisions from FlightReplay.run() to a file at path one
+    line per step.
+    """
+
+    with open(path, 'w') as f:
+        for decision in decisions:
+            f.write(format_decision(decision) + '\n')
+
+
+def compare_decisions(decisions_1, decisions_2):
+    """Return a list of the numbers of the steps where two lists of
+    decisions from FlightReplay.run() differ, including the steps only
+    in one of them.
+    """
+
+    lines_1 = [format_decision(decision) for decision in decisions_1]
+    lines_2 = [format_decision(decision) for decision in decisions_2]
+
+    differ = [n for n, (line_1, line_2) in enumerate(zip(lines_1, lines_2))
+        if line_1 != line_2]
+
+    return differ + range(min(len(lines_1), len(lines_2)), max(len(lines_1),
+        len(lines_2)))
@@ -0,0 +1,186 @@
+"""Handles keeping the tracks of the moving obstacles and predicting
+where they are between updates from the ground station.
+
+The positions of the moving obstacles arrive slower than the obstacle
+avoidance system runs, so each update is kept in a ring buffer and fed
+to an alpha-beta filter, which is started with the velocity between the
+first two updates of a track in its buffer. The filter's positions and
+velocities are then used to extrapolate all of the moving obstacles to
+the current time at once, for no more than TRACK_MAX_AGE seconds, after
+which a track that has stopped updating is held where it was predicted
+to be then.
+"""
+
+import numpy as np
+
+from ..constants import TRACK_LENGTH, TRACK_ALPHA, TRACK_BETA, \
+    TRACK_MAX_AGE
+
+
+class TrackStore(object):
+
+    """Represents the tracks of the moving obstacles of an ObstacleSet.
+
+    The last TRACK_LENGTH updates of every moving obstacle are kept in
+    times and positions, where positions has x, y, and z rows, and the
+    filtered positions and velocities and the time of the last update
+    are kept together in state, which is only ever replaced as a whole
+    so that a tick never mixes the fields of two updates. Updates are
+    added by add() on the thread receiving them and the moving
+    obstacles of the ObstacleSet are moved to their predicted positions
+    by predict(), which keeps the velocities they are predicted to move
+    with in pred_vel, zero for the tracks that have not been updated for
+    TRACK_MAX_AGE seconds. The time and the positions of the latest
+    update as it was received are kept together in last_update.
+    """
+
+    def __init__(self, obs_set, length=TRACK_LENGTH):
+        """Instantiate a TrackStore object for the moving obstacles of
+        the ObstacleSet obs_set keeping length updates.
+        """
+
+        self.obs_set = obs_set
+
+        n_moving = len(obs_set) - obs_set.n_static
+
+        self.times = np.zeros(length)
+        self.positions = np.zeros((3, n_moving, length))
+        self.count = 0
+
+        self.state = (self._get_positions(), np.zeros((3, n_moving)), None)
+        self.pred_vel = self.vel
+        self.last_update = (None, self.pos)
+
+        # The number of updates when the track was last started.
+        self._start = 0
+
+    @property
+    def pos(self):
+        return self.state[0]
+
+    @property
+    def vel(self):
+        return self.state[1]
+
+    @property
+    def time(self):
+        return self.state[2]
+
+    def _get_positions(self):
+        """Return the positions of the Locations of the moving obstacles
+        as an array of x, y, and z rows.
+        """
+
+        moving_obs = self.obs_set.obstacles[self.obs_set.n_static:]
+
+        if not moving_obs:
+            return np.zeros((3, 0))
+
+        x, y, _ = self.obs_set.frame.to_local_arrays(
+            [obs.loc.lat for obs in moving_obs],
+            [obs.loc.lon for obs in moving_obs], 0)
+
+        return np.array([x, y, [obs.loc.alt for obs in moving_obs]])
+
+    def add(self, time):
+        """Add the Locations of the moving obstacles as an update at
+        time in seconds and update the filter.
+        """
+
+        pos = self._get_positions()
+        head = self.count % len(self.times)
+
+        self.times[head] = time
+        self.positions[:, :, head] = pos
+        self.count += 1
+        self.last_update = (time, pos)
+
+        filter_pos, vel, last_time = self.state
+
+        if last_time is None or time - last_time > TRACK_MAX_AGE:
+            # The velocity of a track that has stopped updating is no
+            # longer known, so the track is started again.
+            filter_pos = pos
+            vel = np.zeros_like(pos)
+            self._start = self.count - 1
+
+        elif time > last_time:
+            dt = time - last_time
+
+            if self.count - self._start == 2:
+                # Start the filter with the velocity between the first two
+                # updates of the track.
+                last = self.positions[:, :, (self.count - 2) %
+                    len(self.times)]
+
+                filter_pos = pos
+                vel = (pos - last) / dt
+
+            else:
+                predicted = filter_pos + vel * dt
+                residual = pos - predicted
+
+                filter_pos = predicted + TRACK_ALPHA * residual
+                vel = vel + TRACK_BETA / dt * residual
+
+        self.state = (filter_pos, vel, time)
+        self._move_in_grid(filter_pos)
+
+    def _move_in_grid(self, pos):
+        """Keep the moving obstacles in the right cells of the grid for
+        their positions pos.
+        """
+
+        for i, (x, y) in enumerate(zip(pos[0], pos[1])):
+            self.obs_set.grid.move(self.obs_set.n_static + i, x, y)
+
+    def get_max_drift(self, time):
+        """Return the farthest in meters in the xy plane that a moving
+        obstacle could be predicted to have moved at time in seconds
+        since the last update.
+        """
+
+        _, vel, last_time = self.state
+
+        if last_time is None or not vel.shape[1]:
+            return 0
+
+        return np.hypot(vel[0], vel[1]).max() * min(max(time - last_time,
+            0), TRACK_MAX_AGE)
+
+    def get_history(self, i):
+        """Return the times and the positions as x, y, and z rows of
+        the updates kept for the ith moving obstacle from oldest to
+        newest.
+        """
+
+        length = len(self.times)
+        order = np.arange(max(self.count - length, 0), self.count) % length
+
+        return self.times[order], self.positions[:, i, order]
+
+    def predict(self, time):
+        """Move the moving obstacles in the ObstacleSet to their
+        predicted positions at time in seconds and keep the velocities
+        they are predicted to move with then in pred_vel.
+        """
+
+        pos, vel, last_time = self.state
+
+        if last_time is None:
+            return
+
+        age = time - last_time
+
+        if age > TRACK_MAX_AGE:
+            age = TRACK_MAX_AGE
+            self.pred_vel = np.zeros_like(vel)
+        else:
+            self.pred_vel = vel
+
+        pos = pos + vel * age
+        moving = slice(self.obs_set.n_static, None)
+
+        self.obs_set.x[moving] = pos[0]
+        self.obs_set.y[moving] = pos[1]
+        self.obs_set.alt[moving] = pos[2]
@@ -0,0 +1,144 @@
+"""Handles predicting the trajectory of the plane and sweeping it against
+the obstacles.
+
+The trajectory is the plane's turn onto its next waypoint followed by
+the leg to the waypoint and, optionally, the following leg of the
+mission, sampled over a time horizon. Every sample is checked against
+the altitude dependent avoidance radius of every nearby obstacle at once,
+with the moving obstacles moved along their tracks, to find the first
+time the plane would enter an avoidance radius.
+"""
+
+from math import atan, ceil
+
+import numpy as np
+
+from ..constants import ACCEL_GRAV, SWEEP_HORIZON, SWEEP_RESOLUTION
+from ..util import get_paths
+
+
+class Trajectory(object):
+
+    """Represents the predicted trajectory of a plane as arrays of the
+    times in seconds from now and the x, y, and altitude of the plane in
+    a local frame at those times.
+    """
+
+    def __init__(self, times, x, y, alt):
+        """Instantiate a Trajectory object from arrays of the times and
+        the x, y, and altitude of the plane.
+        """
+
+        self.times = times
+        self.x = x
+        self.y = y
+        self.alt = alt
+
+    @staticmethod
+    def from_plane(plane, pos, horizon=SWEEP_HORIZON,
+            resolution=SWEEP_RESOLUTION, next_leg=True):
+        """Return the Trajectory of plane at the position pos in the
+        frame of its obstacle avoidance system over horizon seconds
+        sampled every resolution seconds.
+
+        If next_leg is True and the mission is known, the leg after the
+        next waypoint is added once the plane reaches the next waypoint.
+        """
+
+        avoid_sys = plane.avoid_sys
+        frame = avoid_sys.frame
+
+        speed = max(plane.airspeed, 1)
+        alt = plane.loc.alt
+
+        wp = frame.to_local(plane.next_wp)
+        wp_alt = plane.next_wp.alt
+
+        bank_angle = atan(speed ** 2 / ACCEL_GRAV / plane.turning_radius)
+
+        times, x, y, end_times = get_paths(pos.x, pos.y, plane.heading, wp.x,
+            wp.y, bank_angle, speed, 0, resolution)
+
+        x = x[0]
+        y = y[0]
+        end_time = end_times[0]
+
+        times = times[times <= horizon]
+        x = x[:len(times)]
+        y = y[:len(times)]
+
+        # Climb or descend evenly over the path to the next waypoint.
+        alts = alt + (wp_alt - alt) * np.minimum(times / end_time, 1) \
+            if end_time else np.full(len(times), float(wp_alt))
+
+        mission = avoid_sys.mission
+        number = plane.next_wp_number
+
+        if next_leg and end_time < horizon and mission is not None and \
+                0 < number < len(mission):
+            leg_x, leg_y, leg_z = mission[number] - mission[number - 1]
+            leg_length = np.hypot(leg_x, leg_y)
+
+            leg_times = end_time + resolution * np.arange(1, int(ceil(
+                (horizon - end_time) / resolution)) + 1)
+            leg_times = leg_times[leg_times <= horizon]
+
+            if leg_length:
+                flown = np.minimum(speed * (leg_times - end_time) /
+                    leg_length, 1)
+            else:
+                flown = np.ones(len(leg_times))
+
+            times = np.concatenate((times, leg_times))
+            x = np.concatenate((x, wp.x + flown * leg_x))
+            y = np.concatenate((y, wp.y + flown * leg_y))
+            alts = np.concatenate((alts, wp_alt + flown * leg_z))
+
+        return Trajectory(times, x, y, alts)
+
+    def get_first_conflict(self, obs_set, indices, obs_vel=None):
+        """Return the time and the index in obs_set of the first obstacle
+        with indices whose avoidance radius the trajectory enters, or
+        None and None if there is none. Obstacles whose avoidance radius
+        the trajectory starts in are not included.
+
+        obs_vel is an array of x, y, and z rows of the velocities of the
+        moving obstacles of obs_set, which are moved along them over
+        time.
+        """
+
+        if not len(indices) or not len(self.times):
+            return None, None
+
+        obs_x = obs_set.x[indices][:, np.newaxis]
+        obs_y = obs_set.y[indices][:, np.newaxis]
+
+        alts = np.tile(self.alt, (len(indices), 1))
+
+        if obs_vel is not None and obs_vel.shape[1]:
+            moving = obs_set.is_moving[indices]
+            vel = np.zeros((3, len(indices)))
+            vel[:, moving] = obs_vel[:, indices[moving] - obs_set.n_static]
+
+            obs_x = obs_x + vel[0][:, np.newaxis] * self.times
+            obs_y = obs_y + vel[1][:, np.newaxis] * self.times
+
+            # Move the trajectory instead of the obstacles vertically.
+            alts = alts - vel[2][:, np.newaxis] * self.times
+
+        dists = np.hypot(obs_x - self.x, obs_y - self.y)
+        radii = obs_set.get_avoid_radii(alts, indices)
+
+        # Obstacles whose avoidance radius the plane is already in are
+        # left to the checks of the plane's current position.
+        conflicts = radii > dists
+        conflicts &= ~conflicts[:, :1]
+
+        if not conflicts.any():
+            return None, None
+
+        first_samples = np.where(conflicts.any(axis=1), conflicts.argmax(
+            axis=1), len(self.times))
+        n = first_samples.argmin()
+
+        return self.times[first_samples[n]], indices[n]
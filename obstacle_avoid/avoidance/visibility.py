@@ -0,0 +1,445 @@
+"""Handles finding routes around the static obstacles to the waypoints of
+the mission from a tangent visibility graph.
+
+The static obstacles never move, so when the obstacles or the mission
+are set the avoidance radii of the static obstacles in the altitude band
+of each waypoint are taken as circles, and every straight line tangent
+to two circles, or to a circle and a waypoint, that does not pass
+through another circle is found. Together with the arcs of the circles
+between the tangent points these make a graph in which the shortest
+path to every waypoint is found once. A route from any position is then
+the tangent lines from the position to the circles plus a lookup.
+"""
+
+from heapq import heappush, heappop
+from math import ceil, cos, floor, pi
+from time import time
+
+import numpy as np
+
+from ..constants import ROUTE_ALT_BAND, ROUTE_ARC_STEP, ROUTE_PARALLEL_MIN
+
+# How far a line may go inside a circle, in meters, and still be tangent
+# to it, to allow for rounding.
+_TOLERANCE = 1e-6
+
+# The largest angle of an arc that is flown as a single straight line
+# between the points of a route.
+_POINT_ANGLE = pi / 4
+
+
+def get_tangents(x_1, y_1, r_1, x_2, y_2, r_2):
+    """Return the tangent lines from the circle at x_1 and y_1 with the
+    radius r_1 to the circles at the arrays x_2 and y_2 with the radii
+    r_2 as arrays of the indices into x_2 and the x and y of the tangent
+    points on each circle, up to four lines to each circle.
+
+    The inner tangents of circles that overlap and the outer tangents of
+    circles inside one another do not exist and are left out, as are
+    the lines that would be found twice because a circle has a radius of
+    zero.
+    """
+
+    d_x = x_2 - x_1
+    d_y = y_2 - y_1
+    d = np.hypot(d_x, d_y)
+    d = np.where(d == 0, np.inf, d)
+
+    v_x = d_x / d
+    v_y = d_y / d
+
+    indices = []
+    points = [[], [], [], []]
+
+    for inner in (False, True):
+        c = (r_1 + r_2) / d if inner else (r_1 - r_2) / d
+        h = np.sqrt(np.maximum(1 - c ** 2, 0))
+
+        for side in (1, -1):
+            exists = np.abs(c) <= 1
+
+            if inner:
+                exists &= (r_1 > 0) & (r_2 > 0)
+            elif side < 0:
+                exists &= (r_1 > 0) | (r_2 > 0)
+
+            # The normal of the tangent line pointing away from the
+            # first circle.
+            n_x = v_x * c - side * h * v_y
+            n_y = v_y * c + side * h * v_x
+
+            sign = -1 if inner else 1
+
+            indices.append(np.flatnonzero(exists))
+            points[0].append((x_1 + r_1 * n_x)[exists])
+            points[1].append((y_1 + r_1 * n_y)[exists])
+            points[2].append((x_2 + sign * r_2 * n_x)[exists])
+            points[3].append((y_2 + sign * r_2 * n_y)[exists])
+
+    return [np.concatenate(indices)] + [np.concatenate(p) for p in points]
+
+
+def are_lines_clear(x_1, y_1, x_2, y_2, x, y, r, ignore=()):
+    """Return an array of whether each of the lines from the arrays x_1
+    and y_1 to x_2 and y_2 stays out of every circle at the arrays x and
+    y with the radii r, other than the circles with the indices in ignore
+    for each line, an array with a row for each line.
+    """
+
+    if not len(x_1):
+        return np.zeros(0, dtype=bool)
+
+    l_x = (x_2 - x_1)[:, np.newaxis]
+    l_y = (y_2 - y_1)[:, np.newaxis]
+    length_2 = l_x ** 2 + l_y ** 2
+    length_2 = np.where(length_2 == 0, 1, length_2)
+
+    rel_x = x - x_1[:, np.newaxis]
+    rel_y = y - y_1[:, np.newaxis]
+
+    fractions = np.clip((rel_x * l_x + rel_y * l_y) / length_2, 0, 1)
+    dists = np.hypot(rel_x - fractions * l_x, rel_y - fractions * l_y)
+
+    blocked = dists < r - _TOLERANCE
+
+    for column in np.atleast_2d(ignore).T if len(ignore) else ():
+        blocked[np.arange(len(x_1)), column] = False
+
+    return ~blocked.any(axis=1)
+
+
+def _get_tangent_edges(args):
+    """Return the clear tangent lines between the circle with each index
+    from start to stop and the circles with higher indices, where args
+    is the x, y, and radius arrays of the circles and start and stop.
+
+    The lines are returned as arrays of the indices of the two circles,
+    the x and y of the tangent points on each, and the lengths.
+    """
+
+    x, y, r, start, stop = args
+    edges = [[] for _ in xrange(7)]
+
+    for i in xrange(start, stop):
+        others = np.arange(i + 1, len(x))
+
+        j, x_1, y_1, x_2, y_2 = get_tangents(x[i], y[i], r[i], x[others],
+            y[others], r[others])
+        j = others[j]
+
+        clear = are_lines_clear(x_1, y_1, x_2, y_2, x, y, r,
+            np.column_stack((np.full(len(j), i), j)))
+
+        for edge, values in zip(edges, (np.full(len(j), i), j, x_1, y_1, x_2,
+                y_2, np.hypot(x_2 - x_1, y_2 - y_1))):
+            edge.append(values[clear])
+
+    return [np.concatenate(edge) if edge else np.zeros(0) for edge in edges]
+
+
+class VisibilityGraph(object):
+
+    """Represents the tangent visibility graph of a set of circles and
+    points in the xy plane of a local frame.
+
+    The nodes are tangent points on the circles, or the points
+    themselves, which are circles with a radius of zero. The edges are
+    the clear tangent lines between the nodes and the clear arcs between
+    neighbouring nodes on each circle.
+    """
+
+    def __init__(self, x, y, r, pool=None):
+        """Instantiate a VisibilityGraph object for the circles at the
+        arrays x and y with the radii r, finding the tangent lines in the
+        worker processes of the multiprocessing Pool pool if it is given
+        and there are at least ROUTE_PARALLEL_MIN circles.
+        """
+
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.r = np.asarray(r, dtype=float)
+
+        n = len(self.x)
+        args = [(self.x, self.y, self.r, start, min(start + 8, n))
+            for start in xrange(0, n, 8)]
+
+        if pool and n >= ROUTE_PARALLEL_MIN:
+            chunks = pool.map(_get_tangent_edges, args)
+        else:
+            chunks = map(_get_tangent_edges, args)
+
+        i, j, x_1, y_1, x_2, y_2, lengths = [np.concatenate([chunk[k]
+            for chunk in chunks] or [np.zeros(0)]) for k in xrange(7)]
+
+        i = i.astype(int)
+        j = j.astype(int)
+        m = len(i)
+
+        # Every tangent line gives a node at each end.
+        self.node_circle = np.concatenate((i, j))
+        self.node_x = np.concatenate((x_1, x_2))
+        self.node_y = np.concatenate((y_1, y_2))
+        self.node_angle = np.arctan2(self.node_y - self.y[self.node_circle],
+            self.node_x - self.x[self.node_circle]) % (2 * pi)
+
+        self.edges = [[] for _ in xrange(2 * m)]
+
+        for k in xrange(m):
+            self.edges[k].append((k + m, lengths[k]))
+            self.edges[k + m].append((k, lengths[k]))
+
+        # The nodes of each circle in order of their angle.
+        self.circle_nodes = [[] for _ in xrange(n)]
+        order = np.lexsort((self.node_angle, self.node_circle))
+
+        for node in order:
+            self.circle_nodes[self.node_circle[node]].append(node)
+
+        for c, nodes in enumerate(self.circle_nodes):
+            if len(nodes) < 2:
+                continue
+
+            for node_1, node_2 in zip(nodes, nodes[1:] + nodes[:1]):
+                angle = (self.node_angle[node_2] - self.node_angle[node_1]) \
+                    % (2 * pi)
+
+                if self.is_arc_clear(c, self.node_angle[node_1], angle):
+                    self.edges[node_1].append((node_2, self.r[c] * angle))
+                    self.edges[node_2].append((node_1, self.r[c] * angle))
+
+    def __len__(self):
+        return len(self.node_x)
+
+    def is_arc_clear(self, c, start, angle):
+        """Return whether the arc of the circle c counterclockwise from
+        the angle start by angle stays out of every other circle, along
+        with the straight lines that stand in for it in a route.
+        """
+
+        r = self.r[c]
+
+        if not r:
+            return True
+
+        thetas = start + np.linspace(0, angle, int(angle / ROUTE_ARC_STEP)
+            + 2)
+
+        # The lines are between the circle and the circle through the
+        # points from get_arc_points().
+        r_arc = np.array([[r], [r / cos(_POINT_ANGLE / 2)]])
+
+        arc_x = (self.x[c] + r_arc * np.cos(thetas)).ravel()
+        arc_y = (self.y[c] + r_arc * np.sin(thetas)).ravel()
+
+        dists = np.hypot(arc_x[:, np.newaxis] - self.x, arc_y[:, np.newaxis]
+            - self.y)
+        dists[:, c] = np.inf
+
+        return not (dists < self.r - _TOLERANCE).any()
+
+    def get_arc_points(self, c, start, angle):
+        """Return a list of points between which straight lines stay out
+        of the circle c along the arc counterclockwise from the angle
+        start by angle, where angle may be negative for clockwise, not
+        including the ends of the arc.
+        """
+
+        r = self.r[c]
+
+        if not r or not angle:
+            return []
+
+        steps = int(ceil(abs(angle) / _POINT_ANGLE))
+        step = float(angle) / steps
+        r_out = r / cos(step / 2)
+
+        thetas = start + step * (np.arange(steps) + 0.5)
+
+        return zip(self.x[c] + r_out * np.cos(thetas), self.y[c] + r_out *
+            np.sin(thetas))
+
+    def get_shortest_paths(self, sources):
+        """Return arrays of the length of the shortest path from each node
+        to the nearest of the nodes sources and of the next node along it,
+        where the next node is -1 for the sources and unreachable nodes.
+        """
+
+        dists = np.full(len(self), np.inf)
+        next_nodes = np.full(len(self), -1, dtype=int)
+
+        queue = []
+
+        for node in sources:
+            dists[node] = 0
+            heappush(queue, (0, node))
+
+        edges = self.edges
+
+        while queue:
+            dist, node = heappop(queue)
+
+            if dist > dists[node]:
+                continue
+
+            for other, length in edges[node]:
+                other_dist = dist + length
+
+                if other_dist < dists[other]:
+                    dists[other] = other_dist
+                    next_nodes[other] = node
+                    heappush(queue, (other_dist, other))
+
+        return dists, next_nodes
+
+
+class RouteMap(object):
+
+    """Represents the shortest routes around the static obstacles of an
+    ObstacleSet to each waypoint of a mission.
+
+    A VisibilityGraph is built for each band of ROUTE_ALT_BAND meters of
+    altitude that a waypoint is in, with the circles of the largest
+    avoidance radius of the static obstacles in the band, and the
+    shortest paths to each waypoint are found once. The time taken is
+    kept in build_time.
+    """
+
+    def __init__(self, obs_set, mission, pool=None):
+        """Instantiate a RouteMap object for the static obstacles of
+        obs_set and the waypoints at the positions in the array mission,
+        building the graphs with the multiprocessing Pool pool if it is
+        given.
+        """
+
+        start_time = time()
+
+        frame = obs_set.frame
+        static = np.arange(obs_set.n_static)
+
+        self.mission = mission
+        self.graphs = {}
+        self._paths = {}
+
+        bands = {}
+
+        for number, (_, _, z) in enumerate(mission, 1):
+            bands.setdefault(int(floor((z + frame.anchor.alt) /
+                ROUTE_ALT_BAND)), []).append(number)
+
+        for band, numbers in bands.iteritems():
+            low = band * ROUTE_ALT_BAND
+            high = low + ROUTE_ALT_BAND
+
+            # The avoidance radii are largest at the altitude in the band
+            # nearest to each obstacle.
+            radii = obs_set.get_avoid_radii(np.clip(obs_set.alt[static], low,
+                high), static)
+            avoided = static[radii > 0]
+
+            # The waypoints are added as circles with a radius of zero.
+            wp_x = mission[np.array(numbers) - 1, 0]
+            wp_y = mission[np.array(numbers) - 1, 1]
+
+            graph = VisibilityGraph(
+                np.concatenate((obs_set.x[avoided], wp_x)),
+                np.concatenate((obs_set.y[avoided], wp_y)),
+                np.concatenate((radii[radii > 0], np.zeros(len(numbers)))),
+                pool)
+
+            self.graphs[band] = graph
+
+            for k, number in enumerate(numbers):
+                circle = len(avoided) + k
+
+                self._paths[number] = (graph,) + graph.get_shortest_paths(
+                    graph.circle_nodes[circle]) + (circle,)
+
+        self.build_time = time() - start_time
+
+    def get_route(self, pos, wp_number):
+        """Return the shortest route from the position pos in the frame
+        to the waypoint number wp_number around the static obstacles as a
+        list of x and y points ending at the waypoint, or None if there
+        is no route.
+        """
+
+        if wp_number not in self._paths:
+            return None
+
+        graph, dists, next_nodes, wp_circle = self._paths[wp_number]
+
+        x, y, r = graph.x, graph.y, graph.r
+        wp_x, wp_y = x[wp_circle], y[wp_circle]
+
+        if are_lines_clear(np.array([pos.x]), np.array([pos.y]),
+                np.array([wp_x]), np.array([wp_y]), x, y, r)[0]:
+            return [(wp_x, wp_y)]
+
+        circles = np.flatnonzero(r > 0)
+
+        j, _, _, q_x, q_y = get_tangents(pos.x, pos.y, 0, x[circles],
+            y[circles], r[circles])
+        j = circles[j]
+
+        clear = are_lines_clear(np.full(len(j), pos.x), np.full(len(j),
+            pos.y), q_x, q_y, x, y, r, j[:, np.newaxis])
+
+        best = None
+
+        # Go along the circle from each tangent point to the nodes on
+        # either side of it on the circle.
+        for c, t_x, t_y in zip(j[clear], q_x[clear], q_y[clear]):
+            nodes = graph.circle_nodes[c]
+
+            if not nodes:
+                continue
+
+            angle = np.arctan2(t_y - y[c], t_x - x[c]) % (2 * pi)
+            angles = graph.node_angle[nodes]
+
+            after = np.searchsorted(angles, angle) % len(nodes)
+            before = after - 1
+
+            for node, arc in ((nodes[after], (angles[after] - angle) %
+                    (2 * pi)), (nodes[before], -((angle - angles[before]) %
+                    (2 * pi)))):
+                cost = np.hypot(t_x - pos.x, t_y - pos.y) + r[c] * abs(arc) \
+                    + dists[node]
+
+                if best and cost >= best[0]:
+                    continue
+
+                start = angle if arc > 0 else angle + arc
+
+                if graph.is_arc_clear(c, start, abs(arc)):
+                    best = (cost, c, t_x, t_y, angle, arc, node)
+
+        if not best or np.isinf(best[0]):
+            return None
+
+        _, c, t_x, t_y, angle, arc, node = best
+
+        route = [(t_x, t_y)] + graph.get_arc_points(c, angle, arc)
+
+        while node >= 0:
+            route.append((graph.node_x[node], graph.node_y[node]))
+
+            next_node = next_nodes[node]
+
+            if next_node >= 0 and graph.node_circle[next_node] == \
+                    graph.node_circle[node]:
+                # Follow the arc between the nodes the way whose length
+                # is the length of the edge.
+                c = graph.node_circle[node]
+                start = graph.node_angle[node]
+                arc = (graph.node_angle[next_node] - start) % (2 * pi)
+
+                if abs(r[c] * arc - dists[node] + dists[next_node]) > 1e-6 * \
+                        max(dists[node], 1):
+                    arc -= 2 * pi
+
+                route.extend(graph.get_arc_points(c, start, arc))
+
+            node = next_node
+
+        return route
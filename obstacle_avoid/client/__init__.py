@@ -1,3 +1,4 @@
 from incoming_client import *
 from outgoing_client import *
 from telemetry_client import *
+from null_client import *
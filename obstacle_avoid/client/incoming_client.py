@@ -74,8 +74,8 @@ class IncomingClient(BaseClient):
 
                         moving_obs.append(obs)
 
-                    self.plane.avoid_sys.static_obs = static_obs
-                    self.plane.avoid_sys.moving_obs = moving_obs
+                    self.plane.avoid_sys.set_obstacles(static_obs,
+                        moving_obs)
 
                     self.plane.avoid_sys.start()
 
@@ -96,7 +96,7 @@ class IncomingClient(BaseClient):
                         loc = Location(lat, lon, alt)
                         obs[i].loc = loc
 
-                    self.plane.avoid_sys.moving_obs = obs
+                    self.plane.avoid_sys.update_moving_obstacles()
 
                 elif type == 'k':
 
@@ -114,5 +114,21 @@ class IncomingClient(BaseClient):
 
                     self.plane.close()
 
+                elif type == 'f':
+
+                    profiler = self.plane.avoid_sys.profiler
+
+                    if not message:
+
+                        profiler.request()
+
+                    elif float(message[0]) > 0:
+
+                        profiler.request(float(message[0]))
+
+                    else:
+
+                        profiler.stop()
+
         _receiving_thread = Thread(target=receiving_thread)
         _receiving_thread.start()
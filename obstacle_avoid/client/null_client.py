@@ -0,0 +1,22 @@
+# A client that is not connected to the ground station, which can be given
+# to a Plane in place of each of its clients to run it headless. Messages
+# sent to it are dropped and nothing is ever received from it.
+class NullClient(object):
+
+    def __init__(self, plane):
+
+        self.plane = plane
+        self.closed = False
+        self.pinged = False
+
+    def send_messages(self, *args):
+
+        pass
+
+    def start(self):
+
+        pass
+
+    def close(self):
+
+        self.closed = True
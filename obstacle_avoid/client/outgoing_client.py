@@ -2,7 +2,8 @@ from threading import Thread
 from time import sleep
 
 from base_client import BaseClient
-from ..constants import IP_GROUND, OUT_PORT_1, AVOID_DIST_STAT, AVOID_DIST_MOV
+from ..constants import IP_GROUND, OUT_PORT_1, AVOID_DIST_STAT, AVOID_DIST_MOV, \
+    STATS_PERIOD
 from ..util import feet
 
 
@@ -52,6 +53,33 @@ class OutgoingClient(BaseClient):
 
                 sleep(0.05)
 
+        def stats_thread():
+
+            instruments = self.plane.avoid_sys.instruments
+
+            while not self.closed and instruments.enabled:
+
+                sleep(STATS_PERIOD)
+
+                stats = instruments.get_stats_string()
+
+                if stats:
+
+                    self.send_messages('s' + stats)
+
+        def send_profile(path, ticks, summary):
+
+            entries = ['%s %d' % (path, ticks)]
+
+            for func, n_calls, cum_time, total_time in summary:
+
+                entries.append('%s %d %.3f %.3f' % (func, n_calls,
+                    cum_time * 1000, total_time * 1000))
+
+            self.send_messages('f' + ','.join(entries))
+
+        self.plane.avoid_sys.profiler.report = send_profile
+
         def send_avoid_radii():
 
             radii_string = '%0.f %0.f' % (feet(AVOID_DIST_STAT), feet(AVOID_DIST_MOV))
@@ -72,6 +100,9 @@ class OutgoingClient(BaseClient):
             _commands_thread = Thread(target=commands_thread)
             _commands_thread.start()
 
+            _stats_thread = Thread(target=stats_thread)
+            _stats_thread.start()
+
             @self.plane.vehicle.on_attribute('mode')
             def send_mode(self_, name, value):
 
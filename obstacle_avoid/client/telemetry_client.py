@@ -22,14 +22,16 @@ class TelemetryClient(BaseClient):
             while not self.closed:
 
                 send_time = self.time
-                next_wp = self.plane.next_wp_number
-                loc = self.plane.loc
+                state = self.plane.state
+                next_wp = self.plane.get_next_wp_number(state.wp_number,
+                    state.loc)
+                loc = state.loc
                 lon = rad_to_deg(loc.lon)
                 lat = rad_to_deg(loc.lat)
                 alt = feet(loc.alt)
-                heading = rad_to_deg(self.plane.heading)
-                pitch = rad_to_deg(self.plane.pitch)
-                airspeed = knots(self.plane.airspeed)
+                heading = rad_to_deg(state.heading)
+                pitch = rad_to_deg(state.pitch)
+                airspeed = knots(state.airspeed)
 
                 telemetry = '%.4f %.0f %.7f %.7f %.3f %.3f %.3f %.2f' % (
                     send_time, next_wp, lat, lon, alt, heading, pitch, airspeed
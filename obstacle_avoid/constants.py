@@ -18,6 +18,46 @@ AVOID_DIST_STAT = 40
 AVOID_DIST_MOV = 45
 FAR_WP_DIST = 1000
 MOV_LOITER_DIST = 75
+CPA_HORIZON = 10
+TRACK_LENGTH = 32
+TRACK_ALPHA = 0.8
+TRACK_BETA = 0.4
+TRACK_MAX_AGE = 3
+GRID_CELL_SIZE = 100
+CHECK_LOOKAHEAD = 300
+ARC_SAMPLE_ANGLE = 0.25
+SWEEP_HORIZON = 15
+SWEEP_RESOLUTION = 0.5
+PLAN_HEADINGS = 16
+PLAN_TIME_BUDGET = 1
+PLAN_MAX_EXPANSIONS = 20000
+PLAN_EPSILONS = (3, 2, 1.5, 1)
+PLAN_MAX_AGE = 5
+ROUTE_ALT_BAND = 25
+ROUTE_ARC_STEP = 0.1
+ROUTE_PARALLEL_MIN = 100
+WORKER_PROCESSES = 2
+CLUSTER_HULL_POINTS = 16
+CLEARANCE_SLAB = 25
+CLEARANCE_RESOLUTION = 10
+CLEARANCE_MAX = 500
+CLEARANCE_PATH = None
+PLANE_SPEED_MAX = 50
+REACH_SLACK = 50
+CONTROL_RATE = 10
+CONTROL_WAKE_ON_UPDATE = False
+INSTRUMENT_ENABLED = True
+TICK_PRINT_ENABLED = False
+STATS_PERIOD = 5
+PROFILE_DURATION = 10
+PROFILE_TOP = 20
+PROFILE_PATH = 'tick_profile_%d.pstats'
+RECORDER_PATH = None
+RECORDER_CAPACITY = 65536
+RECORDER_OBSTACLES = 16
+FAKE_AIRSPEED = 18
+FAKE_CLIMB_RATE = 5
+FAKE_RATE = 25
 
 # Other Constants
 EARTH_RADIUS = 6378137
@@ -0,0 +1,361 @@
+"""Handles simulating a plane in process with the parts of a dronekit
+vehicle used by Plane, so that Plane can run without SITL or hardware.
+
+The plane flies at a constant airspeed and turns in a circle at its
+bank limit towards its target until it faces it and then flies straight
+to it, the same turn model as util.path_model. In AUTO it flies the
+waypoints of its mission in turn, in GUIDED it flies to the target of
+the latest simple_goto() and circles there, and in LOITER it circles
+where it is. Simulated time runs time_scale times as fast as real time,
+or as fast as possible if time_scale is None.
+"""
+
+from math import atan, atan2, cos, pi, sin
+from threading import Thread
+from time import sleep
+
+from dronekit import LocationGlobal, LocationGlobalRelative
+
+from constants import FAKE_AIRSPEED, FAKE_CLIMB_RATE, FAKE_RATE
+from types import Distance, Location, LocalFrame
+from util import deg_to_rad, rad_to_deg, get_turning_radius, monotonic
+
+
+class FakeMode(object):
+
+    """Represents a flight mode with the name attribute of a dronekit
+    VehicleMode.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+
+class FakeAttitude(object):
+
+    """Represents the attitude of a plane in radians."""
+
+    def __init__(self, pitch, yaw, roll):
+        self.pitch = pitch
+        self.yaw = yaw
+        self.roll = roll
+
+
+class FakeLocations(object):
+
+    """Represents the location of a plane with the global_relative_frame
+    attribute of dronekit Locations.
+    """
+
+    def __init__(self, global_relative_frame):
+        self.global_relative_frame = global_relative_frame
+
+
+class FakeCommand(object):
+
+    """Represents a waypoint with the attributes of a dronekit Command,
+    with x and y the latitude and longitude in degrees and z the
+    altitude in meters.
+    """
+
+    def __init__(self, x, y, z, command=16):
+        self.command = command
+        self.x = x
+        self.y = y
+        self.z = z
+
+
+class FakeCommands(object):
+
+    """Represents the mission of a FakeVehicle with the parts of a
+    dronekit CommandSequence used by Plane.
+
+    next is the number of the waypoint being flown to, where the first
+    waypoint is 1.
+    """
+
+    def __init__(self, commands):
+        self._commands = list(commands)
+        self.next = 1 if self._commands else 0
+
+    def download(self):
+        pass
+
+    def wait_ready(self, **kwargs):
+        return True
+
+    @property
+    def count(self):
+        return len(self._commands)
+
+    def __len__(self):
+        return len(self._commands)
+
+    def __getitem__(self, index):
+        return self._commands[index]
+
+
+class FakeVehicle(object):
+
+    """Represents a simulated plane with the parts of a dronekit Vehicle
+    used by Plane.
+
+    The plane starts above home_loc, a dronekit location, flying the
+    mission of FakeCommand commands in AUTO. The simulation is run by a
+    thread started by start() and stopped by close(), and step() moves
+    the plane on by dt seconds of simulated time without the thread.
+    clock() is the simulated time, to be given to the Plane flying the
+    vehicle along with time_scale.
+    Changes of mode and simple_goto() take effect at the next step, and
+    every attribute listener is called from the thread running the
+    simulation, as dronekit calls them from the thread reading its
+    messages.
+    """
+
+    def __init__(self, home_loc, commands=(), alt=100,
+            airspeed=FAKE_AIRSPEED, bank_angle=deg_to_rad(45), wp_radius=20,
+            time_scale=1, rate=FAKE_RATE):
+        """Instantiate a FakeVehicle object starting alt meters above
+        home_loc, flying at airspeed meters per second, banking at up to
+        bank_angle radians, and reaching waypoints within wp_radius
+        meters, stepping rate times per second of simulated time.
+        """
+
+        self.home_location = LocationGlobal(home_loc.lat, home_loc.lon,
+            home_loc.alt)
+        self.commands = FakeCommands(commands)
+
+        self.parameters = {
+            'LIM_ROLL_CD': rad_to_deg(bank_angle) * 100,
+            'WP_RADIUS': wp_radius * 100
+        }
+
+        self.time_scale = time_scale
+        self.dt = 1.0 / rate
+        self.time = 0.0
+
+        self._frame = LocalFrame(Location(deg_to_rad(home_loc.lat),
+            deg_to_rad(home_loc.lon), 0))
+        self._pos = Distance(0, 0, alt)
+        self._heading = 0.0
+        self._pitch = 0.0
+        self._roll = 0.0
+        self._airspeed = float(airspeed)
+        self._bank_angle = bank_angle
+        self._wp_radius = wp_radius
+
+        self._mode = FakeMode('AUTO')
+        self._target = None
+
+        # The mode and target last asked for, which are taken up by the
+        # next step as a real vehicle takes up the messages it is sent.
+        self._requested = None
+
+        self._listeners = {}
+        self._closed = False
+        self._thread = None
+
+    # The attributes read by Plane.
+
+    @property
+    def location(self):
+        loc = self._frame.from_local(self._pos)
+
+        return FakeLocations(LocationGlobalRelative(rad_to_deg(loc.lat),
+            rad_to_deg(loc.lon), loc.alt))
+
+    @property
+    def heading(self):
+        return int(round(rad_to_deg(self._heading))) % 360
+
+    @property
+    def airspeed(self):
+        return self._airspeed
+
+    @property
+    def attitude(self):
+        yaw = self._heading if self._heading <= pi else self._heading - 2 * pi
+
+        return FakeAttitude(self._pitch, yaw, self._roll)
+
+    @property
+    def mode(self):
+        return self._mode
+
+    @mode.setter
+    def mode(self, mode):
+        self._requested = (getattr(mode, 'name', mode), None)
+
+    def simple_goto(self, location):
+        loc = Location(deg_to_rad(location.lat), deg_to_rad(location.lon),
+            location.alt)
+
+        self._requested = ('GUIDED', self._frame.to_local(loc))
+
+    def wait_ready(self, *args, **kwargs):
+        return True
+
+    def clock(self):
+        """Return the simulated time in seconds."""
+        return self.time
+
+    # The attribute listeners, called as listener(vehicle, name, value).
+
+    def add_attribute_listener(self, name, listener):
+        self._listeners.setdefault(name, []).append(listener)
+
+    def remove_attribute_listener(self, name, listener):
+        self._listeners.get(name, []).remove(listener)
+
+    def on_attribute(self, name):
+        def decorator(listener):
+            self.add_attribute_listener(name, listener)
+
+            return listener
+
+        return decorator
+
+    def notify_attribute_listeners(self, name, value):
+        for listener in list(self._listeners.get(name, [])):
+            listener(self, name, value)
+
+    # The simulation.
+
+    def _take_request(self):
+        """Change to the mode and target last asked for, if any."""
+        requested = self._requested
+
+        if requested is None:
+            return
+
+        self._requested = None
+        name, target = requested
+
+        if target is not None:
+            self._target = target
+        elif name == 'LOITER':
+            # Loitering is about the position the mode was set at.
+            self._target = Distance(self._pos.x, self._pos.y, self._pos.z)
+
+        if name != self._mode.name:
+            self._mode = FakeMode(name)
+            self.notify_attribute_listeners('mode', self._mode)
+
+    def _get_target(self):
+        """Return the position in the frame being flown to and whether
+        the plane should circle once it is reached.
+        """
+
+        mode = self._mode.name
+        commands = self.commands
+
+        if mode == 'AUTO' and commands.next:
+            command = commands[commands.next - 1]
+            target = self._frame.to_local(Location(deg_to_rad(command.x),
+                deg_to_rad(command.y), command.z))
+
+            if target.subtract(self._pos).get_magnitude_xy() <= \
+                    self._wp_radius:
+                # Circle the last waypoint once it is reached.
+                if commands.next >= len(commands):
+                    return target, True
+
+                commands.next += 1
+
+                return self._get_target()
+
+            return target, False
+
+        return self._target, True
+
+    def step(self, dt=None):
+        """Move the plane on by dt seconds, or one step, of simulated
+        time and notify the attribute listeners.
+        """
+
+        dt = self.dt if dt is None else dt
+        pos = self._pos
+
+        self._take_request()
+        v = self._airspeed
+
+        target, circle = self._get_target()
+        turning_radius = get_turning_radius(v, self._bank_angle)
+        rate = v / turning_radius
+
+        turn = rate * dt
+
+        if target is not None:
+            d_x = target.x - pos.x
+            d_y = target.y - pos.y
+
+            if not (circle and d_x ** 2 + d_y ** 2 <= max(self._wp_radius,
+                    turning_radius) ** 2):
+                # Turn towards the target until facing it.
+                bearing = atan2(d_x, d_y)
+                turn = (bearing - self._heading + pi) % (2 * pi) - pi
+
+        # The part of the step flown turning and the part flown straight.
+        turn_time = min(abs(turn) / rate, dt)
+        d_heading = rate * turn_time * (1 if turn >= 0 else -1)
+
+        heading = self._heading
+        new_heading = heading + d_heading
+
+        if d_heading:
+            x = pos.x + v / (rate if turn >= 0 else -rate) * (cos(heading) -
+                cos(new_heading))
+            y = pos.y + v / (rate if turn >= 0 else -rate) * (sin(new_heading)
+                - sin(heading))
+        else:
+            x = pos.x
+            y = pos.y
+
+        straight = v * (dt - turn_time)
+
+        x += straight * sin(new_heading)
+        y += straight * cos(new_heading)
+
+        # Climb or descend towards the altitude of the target.
+        climb = 0
+
+        if target is not None:
+            climb = max(-FAKE_CLIMB_RATE * dt, min(target.z - pos.z,
+                FAKE_CLIMB_RATE * dt))
+
+        pos.set(x, y, pos.z + climb)
+
+        self._heading = new_heading % (2 * pi)
+        self._pitch = atan(climb / dt / v)
+        self._roll = self._bank_angle * d_heading / (rate * dt)
+
+        self.time += dt
+
+        self.notify_attribute_listeners('location', self.location)
+        self.notify_attribute_listeners('attitude', self.attitude)
+        self.notify_attribute_listeners('airspeed', self._airspeed)
+        self.notify_attribute_listeners('heading', self.heading)
+
+    def start(self):
+        """Start the thread running the simulation."""
+        def simulation_thread():
+            deadline = monotonic()
+
+            while not self._closed:
+                self.step()
+
+                # Without a time scale the thread only yields to the
+                # threads reading the simulated clock.
+                if self.time_scale:
+                    deadline += self.dt / self.time_scale
+                    sleep(max(deadline - monotonic(), 0))
+                else:
+                    sleep(0)
+
+        self._thread = Thread(target=simulation_thread)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def close(self):
+        """Stop the thread running the simulation."""
+        self._closed = True
@@ -5,20 +5,63 @@ from dronekit import connect, VehicleMode
 
 from avoidance import AvoidanceSystem
 from client import IncomingClient, OutgoingClient, TelemetryClient
-from constants import ACCEL_GRAV, FAR_WP_DIST
+from constants import ACCEL_GRAV, FAR_WP_DIST, CONTROL_WAKE_ON_UPDATE
 from types import Location, Distance
-from util import deg_to_rad
+from util import deg_to_rad, monotonic
+
+
+class PlaneState(object):
+
+    """Represents the state of a plane from the latest updates of its
+    vehicle, which is never changed once it is published.
+
+    Each state has the version after the state it replaced and the time
+    on the monotonic clock it was published. Use replace() to get the
+    next state with some of the values changed.
+    """
+
+    __slots__ = ('version', 'time', 'airspeed', 'heading', 'pitch', 'loc',
+        'mode', 'wp_number')
+
+    def __init__(self, version, time, airspeed, heading, pitch, loc, mode,
+            wp_number):
+        self.version = version
+        self.time = time
+        self.airspeed = airspeed
+        self.heading = heading
+        self.pitch = pitch
+        self.loc = loc
+        self.mode = mode
+        self.wp_number = wp_number
+
+    def replace(self, time, **values):
+        return PlaneState(self.version + 1, time, *[values.get(name,
+            getattr(self, name)) for name in self.__slots__[2:]])
 
 
 class Plane(object):
     
-    def __init__(self, connection_string, baud_rate=115200):
+    def __init__(self, connection_string, baud_rate=115200, vehicle=None,
+            clients=(IncomingClient, OutgoingClient, TelemetryClient),
+            clock=monotonic, time_scale=1):
         print 'Connecting Clients....'
 
-        self.avoid_sys = AvoidanceSystem(self)
-        self.in_client = IncomingClient(self)
-        self.out_client = OutgoingClient(self)
-        self.telem_client = TelemetryClient(self)
+        # The clients are the classes of the incoming, outgoing, and
+        # telemetry clients, which can each be a NullClient to run without
+        # a ground station. The times of the states and of the obstacle
+        # avoidance system are taken from clock, which can be the
+        # simulated clock of a FakeVehicle running time_scale times as
+        # fast as real time, or as fast as possible if it is None.
+        self.clock = clock
+
+        self.avoid_sys = AvoidanceSystem(self, clock=clock,
+            time_scale=time_scale)
+
+        in_client, out_client, telem_client = clients
+
+        self.in_client = in_client(self)
+        self.out_client = out_client(self)
+        self.telem_client = telem_client(self)
 
         self._commands = None
 
@@ -29,15 +72,22 @@ class Plane(object):
 
         print 'Connecting Plane....'
 
-        self.vehicle = connect(
-            connection_string, baud=baud_rate, rate=25,
-            status_printer=dronekit_printer, heartbeat_timeout=300
-        )
+        # A vehicle such as a FakeVehicle can be given instead of
+        # connecting to one.
+        if vehicle is None:
+            vehicle = connect(
+                connection_string, baud=baud_rate, rate=25,
+                status_printer=dronekit_printer, heartbeat_timeout=300
+            )
+
+        self.vehicle = vehicle
 
         print 'Waiting until plane is ready....'
 
         self.vehicle.wait_ready(timeout=300)
 
+        self._start_sampling()
+
         print 'Getting commands....'
 
         self.update_commands()
@@ -51,6 +101,48 @@ class Plane(object):
         self.out_client.start()
         self.telem_client.start()
 
+    def _start_sampling(self):
+        # Dronekit calls every attribute listener from the thread reading
+        # its messages, so the states are only built by that thread and
+        # each is published by replacing the reference in state. Readers
+        # take the reference once and never see a state change.
+        vehicle = self.vehicle
+        control_loop = self.avoid_sys.control_loop
+
+        self.state = PlaneState(0, self.clock(), vehicle.airspeed,
+            deg_to_rad(vehicle.heading), vehicle.attitude.pitch,
+            Location.from_dronekit_location(
+                vehicle.location.global_relative_frame
+            ), vehicle.mode.name, vehicle.commands.next)
+
+        def sample(vehicle_, name, value):
+            if name == 'location':
+                values = {'loc': Location.from_dronekit_location(
+                    value.global_relative_frame)}
+            elif name == 'attitude':
+                values = {'pitch': value.pitch}
+            elif name == 'heading':
+                values = {'heading': deg_to_rad(value)}
+            elif name == 'mode':
+                values = {'mode': value.name}
+            else:
+                values = {name: value}
+
+            values['wp_number'] = vehicle.commands.next
+
+            self.state = self.state.replace(self.clock(), **values)
+
+            # New positions are timed to measure the latency of the
+            # monitoring thread, and new positions and attitudes can wake
+            # it early.
+            if name == 'location':
+                control_loop.note_update(CONTROL_WAKE_ON_UPDATE)
+            elif name == 'attitude' and CONTROL_WAKE_ON_UPDATE:
+                control_loop.wake()
+
+        for name in ('location', 'attitude', 'airspeed', 'heading', 'mode'):
+            vehicle.add_attribute_listener(name, sample)
+
     def close(self):
         self.avoid_sys.close()
         self.out_client.close()
@@ -98,6 +190,7 @@ class Plane(object):
             commands.wait_ready(timeout=60)
 
             self._commands = commands
+            self.avoid_sys.set_mission(commands)
         except:
             print 'Failed to download commands... trying again.'
 
@@ -118,9 +211,8 @@ class Plane(object):
 
         return Location.from_dronekit_location(home)
 
-    @property
-    def next_wp_number(self):
-        next_wp_number = self.commands.next
+    def get_next_wp_number(self, wp_number, loc):
+        next_wp_number = wp_number
 
         if not next_wp_number:
             next_wp_number = self._prev_wp
@@ -129,14 +221,28 @@ class Plane(object):
 
         if next_wp_number < len(self.commands) and next_wp_number:
 
-            next_wp = Location.from_command(self.commands[next_wp_number - 1])
-
-            if self.loc.get_distance(next_wp).get_magnitude() \
-                    <= self.wp_radius and not next_wp_number >= \
-                    len(self.commands) + 1:
+            mission = self.avoid_sys.mission
+
+            # Use the waypoints already in the local frame if the
+            # mission has been converted.
+            if mission is not None and len(mission) == len(self.commands):
+                frame = self.avoid_sys.frame
+                wp_dist = Distance(*mission[next_wp_number - 1]).subtract(
+                    frame.to_local(loc))
+            else:
+                next_wp = Location.from_command(
+                    self.commands[next_wp_number - 1])
+                wp_dist = loc.get_distance(next_wp)
+
+            if wp_dist.get_magnitude() <= self.wp_radius and not \
+                    next_wp_number >= len(self.commands) + 1:
                 next_wp_number += 1
 
-        return next_wp_number 
+        return next_wp_number
+
+    @property
+    def next_wp_number(self):
+        return self.get_next_wp_number(self.commands.next, self.loc)
 
     @property
     def next_wp(self):
@@ -149,18 +255,33 @@ class Plane(object):
 
     def go_loiter(self):
         if not self.mode == 'LOITER':
-            self.vehcile.mode = VehicleMode('LOITER')
+            with self.avoid_sys.instruments.span('set_mode'):
+                self.vehicle.mode = VehicleMode('LOITER')
+
+            if self.avoid_sys.recorder:
+                self.avoid_sys.recorder.note_mode('LOITER')
 
     def go_auto(self):
         if not self.mode == 'AUTO':
-            self.vehicle.mode = VehicleMode('AUTO')
+            with self.avoid_sys.instruments.span('set_mode'):
+                self.vehicle.mode = VehicleMode('AUTO')
+
+            if self.avoid_sys.recorder:
+                self.avoid_sys.recorder.note_mode('AUTO')
 
         self.avoid_sys.monitor_count = 0
 
     def goto(self, wp):
-        self.vehicle.simple_goto(wp.to_dronekit_location())
+        with self.avoid_sys.instruments.span('simple_goto'):
+            self.vehicle.simple_goto(wp.to_dronekit_location())
+
+        if self.avoid_sys.recorder:
+            self.avoid_sys.recorder.note_goto(wp)
+
+    def turn(self, turn_angle):
+        if self.avoid_sys.recorder:
+            self.avoid_sys.recorder.note_turn(turn_angle)
 
-    def turn(self, angle):
         d = 2 * self.turning_radius * sin(turn_angle / 2)
 
         bearing_1 = self.heading + turn_angle / 2
@@ -183,18 +304,31 @@ class Plane(object):
 
 class PlaneStatic(Plane):
 
-    def __init__(self, plane):
+    def __init__(self, plane, state=None):
+
+        # Every value is from the same state, and the values that are not
+        # in the state are only computed once.
+        state = state or plane.state
 
-        self._airspeed = plane.airspeed
-        self._heading = plane.heading
-        self._pitch = plane.pitch
-        self._loc = plane.loc
-        self._turning_radius = plane.turning_radius
-        self._mode = plane.mode
+        self.state = state
+
+        self._airspeed = state.airspeed
+        self._heading = state.heading
+        self._pitch = state.pitch
+        self._loc = state.loc
+        self._turning_radius = state.airspeed ** 2 / ACCEL_GRAV / tan(
+            plane._bank_angle)
+        self._mode = state.mode
         self._commands = plane.commands
         self._wp_radius = plane.wp_radius
-        self._next_wp_number = plane.next_wp_number
-        self._next_wp = plane.next_wp
+        self._next_wp_number = plane.get_next_wp_number(state.wp_number,
+            state.loc)
+
+        try:
+            self._next_wp = Location.from_command(
+                self._commands[self._next_wp_number - 1])
+        except IndexError:
+            self._next_wp = None
 
         self.avoid_sys = plane.avoid_sys
         self.in_client = plane.in_client
@@ -1,3 +1,5 @@
 from location import *
 from distance import *
+from frame import *
+from spatial import *
 from obstacle import *
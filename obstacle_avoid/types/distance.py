@@ -10,15 +10,49 @@ class Distance(object):
     """Represents a distance between two points in vector form.
 
     Two distances can be added together and distances can be transformed
-    by an angle.
+    by an angle. The methods add(), subtract(), and get_transform()
+    return a new Distance while iadd(), isub(), and transform_inplace()
+    change the Distance itself so that hot loops do not allocate.
     """
 
+    __slots__ = ('x', 'y', 'z')
+
     def __init__(self, x, y, z):
         """Instantiate a Distance object with components x, y, and z."""
         self.x = x
         self.y = y
         self.z = z
 
+    def set(self, x, y, z):
+        """Set the components of the Distance object and return it."""
+        self.x = x
+        self.y = y
+        self.z = z
+
+        return self
+
+    def iadd(self, dist):
+        """Add a Distance object to the Distance object in place and
+        return it.
+        """
+
+        self.x += dist.x
+        self.y += dist.y
+        self.z += dist.z
+
+        return self
+
+    def isub(self, dist):
+        """Subtract a Distance object from the Distance object in place
+        and return it.
+        """
+
+        self.x -= dist.x
+        self.y -= dist.y
+        self.z -= dist.z
+
+        return self
+
     def add(self, dist):
         """Add two Distance objects together and return a new
         Distance.
@@ -63,6 +97,19 @@ class Distance(object):
         
         return Distance(x, y, z)
 
+    def transform_inplace(self, angle):
+        """Transform the Distance object by an angle clockwise in place
+        and return it.
+        """
+
+        cos_angle = cos(angle)
+        sin_angle = sin(angle)
+
+        self.x, self.y = (self.x * cos_angle - self.y * sin_angle,
+            self.x * sin_angle + self.y * cos_angle)
+
+        return self
+
     @staticmethod
     def get_turn_angle(plane, loc=None, heading=None):
         """Returns the angle the plane must turn. It is assumed that the
@@ -72,59 +119,7 @@ class Distance(object):
         turns right.
         """
 
-        if not loc:
-            loc = plane.loc
-
-        if not heading:
-            heading = plane.heading
-
-        # Get the distance of the next waypoint relative to the plane.
-        wp_dist = loc.get_distance(plane.next_wp, angle=heading)
-
-        i = wp_dist.x
-        j = wp_dist.y
-
-        r = plane.turning_radius
-        
-        # If the waypoint is to the left make the plane turn left.
-        if i < 0:
-            r *= -1
-            
-        # If the plane cannot make a tight enough turn, turn the other
-        # way.
-        if (i - r) ** 2 + j ** 2 < r ** 2:
-            r *= -1
-        
-        # Find a and b, the distances relative to the plane of the point
-        # where the plane no longer turns in the xy plane.
-        
-        # Try to find a
-        try:
-            a = (r * i ** 2 - r ** 2 * i + r * j ** 2 - r * j * sqrt(i ** 2 - 2
-                * r * i + j ** 2)) / float(r ** 2 - 2 * r * i + i ** 2 + j **
-                2)
-        
-        # Find a and b due to floating point errors for when the plane
-        # doesn't turn at all or when the plane turns pi radians left or
-        # right.
-        except (ZeroDivisionError, ValueError):
-            if abs(i) < abs(r):
-                a = 0
-            else:
-                a = 2 * r
-
-            b = 0
-
-        # Otherwise, find b.
-        else:
-            b = sqrt(r ** 2 - (a - r) ** 2)
-            
-            if (j < 0 and abs(i) < 2 * abs(r)) or i / float(r) < 0:
-                b *= -1
-
-        # Find how what angle the plane must turn, will be negative for
-        # left and positive for turning right.
-        return copysign((atan2(b, abs(r) / r * (r - a))) % (2 * pi), r)
+        return TurnSolution.solve(plane, loc, heading).angle
 
     @staticmethod
     def get_turn_dist(plane, loc=None, heading=None):
@@ -133,20 +128,63 @@ class Distance(object):
         a circular path and then flies directly to the next waypoint.
         """
 
-        if not loc:
-            loc = plane.loc
+        return TurnSolution.solve(plane, loc, heading).turn_dist
 
-        if not heading:
-            heading = plane.heading
+    @staticmethod
+    def from_magnitude(dist, bearing):
+        """Return a new Distance object from a magnitude in the xy plane
+        and a bearing.
+        """
+
+        return Distance(dist * sin(bearing), dist * cos(bearing), 0)
+
+
+class TurnSolution(object):
+
+    """Represents the path of a plane to its next waypoint where it is
+    assumed that the plane turns in a circular path and then flies
+    directly to the next waypoint.
+
+    The path is described by the following attributes.
+
+        angle: The angle the plane must turn, where a negative angle
+            indicates that the plane turns left and where a positive
+            angle indicates that the plane turns right.
+        turn_dist: The Distance relative to the plane, in the frame of
+            the plane's heading, of the point where the plane no longer
+            turns.
+        wp_dist: The Distance relative to the plane, in the frame of the
+            plane's heading, of the next waypoint.
+        arc_length: The distance in the xy plane flown while turning.
+        leg_length: The distance in the xy plane flown directly to the
+            next waypoint after turning.
+        arc_climb: The change in altitude while turning.
+        leg_climb: The change in altitude after turning.
+
+    The climb to the next waypoint is split between the turn and the leg
+    in proportion to their distances. Use TurnSolution.solve() to get the
+    TurnSolution of a plane. A TurnSolution may be shared between callers
+    and should not be changed.
+    """
+
+    __slots__ = ('angle', 'turn_dist', 'wp_dist', 'arc_length', 'leg_length',
+        'arc_climb', 'leg_climb')
+
+    # The key and TurnSolution of the last solve so that the path is
+    # only solved once per snapshot of a plane.
+    _last = (None, None)
 
-        # Get the distance of the next waypoint relative to the plane.
-        wp_dist = loc.get_distance(plane.next_wp, angle=heading)
+    def __init__(self, wp_dist, turning_radius):
+        """Instantiate a TurnSolution object for a waypoint at the
+        Distance wp_dist relative to the plane in the frame of its
+        heading and for a plane with turning_radius.
+        """
 
         i = wp_dist.x
         j = wp_dist.y
         k = wp_dist.z
 
-        r = plane.turning_radius
+        r = turning_radius
         
         # If the waypoint is to the left make the plane turn left.
         if i < 0:
@@ -179,7 +217,7 @@ class Distance(object):
 
         # Otherwise, find b.
         else:
-            b = sqrt(r ** 2 - (a - r) ** 2)
+            b = sqrt(max(r ** 2 - (a - r) ** 2, 0))
             
             if (j < 0 and abs(i) < 2 * abs(r)) or i / float(r) < 0:
                 b *= -1
@@ -202,14 +240,68 @@ class Distance(object):
         except ZeroDivisionError:
             c = 0
 
-        # Return the distance relative to the plane of the point where
-        # the plane no longer turns.
-        return Distance(a, b, c)
+        # The angle will be negative for left and positive for turning
+        # right.
+        self.angle = copysign(angle, r)
+        self.turn_dist = Distance(a, b, c)
+        self.wp_dist = wp_dist
+        self.arc_length = circ_dist_xy
+        self.leg_length = lin_dist_xy
+        self.arc_climb = c
+        self.leg_climb = k - c
 
     @staticmethod
-    def from_magnitude(dist, bearing):
-        """Return a new Distance object from a magnitude in the xy plane
-        and a bearing.
+    def solve(plane, loc=None, heading=None):
+        """Return the TurnSolution of plane from loc at heading to the
+        plane's next waypoint, where loc and heading default to those of
+        the plane.
+
+        The last TurnSolution is reused if the location, heading,
+        turning radius, and next waypoint have not changed.
         """
 
-        return Distance(dist * sin(bearing), dist * cos(bearing), 0)
+        if loc is None:
+            loc = plane.loc
+
+        if heading is None:
+            heading = plane.heading
+
+        wp = plane.next_wp
+        turning_radius = plane.turning_radius
+
+        key = (loc.lat, loc.lon, loc.alt, heading, turning_radius, wp.lat,
+            wp.lon, wp.alt)
+
+        last_key, solution = TurnSolution._last
+
+        if key != last_key:
+            # Get the distance of the next waypoint relative to the
+            # plane.
+            wp_dist = loc.get_distance(wp, angle=heading)
+
+            solution = TurnSolution(wp_dist, turning_radius)
+            TurnSolution._last = (key, solution)
+
+        return solution
+
+
+class ScratchBuffer(object):
+
+    """Holds preallocated Distance objects to be reused as temporary
+    values in hot loops instead of allocating new Distances.
+
+    A ScratchBuffer should only be used by one thread, and a Distance
+    from it is only valid until the same slot is used again.
+    """
+
+    __slots__ = ('_dists',)
+
+    def __init__(self, size):
+        """Instantiate a ScratchBuffer object with size Distances."""
+        self._dists = [Distance(0, 0, 0) for _ in xrange(size)]
+
+    def __getitem__(self, i):
+        return self._dists[i]
+
+    def __len__(self):
+        return len(self._dists)
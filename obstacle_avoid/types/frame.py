@@ -0,0 +1,112 @@
+"""Contains the LocalFrame class that represents a local east-north-up
+frame anchored at a GPS location so that positions can be handled in
+meters.
+"""
+
+from math import cos, sqrt
+from random import Random
+
+import numpy as np
+
+from distance import Distance
+from location import Location, get_earth_radii
+
+
+class LocalFrame(object):
+
+    """Represents a local east-north-up frame anchored at a Location.
+
+    The radii of the earth and the cosine of the latitude used for the
+    flat-earth approximation are found once for the anchor, so
+    converting a Location to meters in the frame is only a subtraction
+    and a multiplication. The x, y, and z axes point east, north, and up,
+    respectively, like the components of a Distance.
+    """
+
+    def __init__(self, anchor):
+        """Instantiate a LocalFrame object anchored at the Location
+        anchor.
+        """
+
+        self.anchor = anchor
+
+        self.r_1, self.r_2 = get_earth_radii(anchor.lat)
+        self.cos_lat = cos(anchor.lat)
+
+        self._x_scale = self.r_2 * self.cos_lat
+        self._y_scale = self.r_1
+
+    def to_local(self, loc, out=None):
+        """Return the position of loc in the frame as a Distance.
+
+        If out is given the position is written into the Distance out
+        instead of a new Distance.
+        """
+
+        x = self._x_scale * (loc.lon - self.anchor.lon)
+        y = self._y_scale * (loc.lat - self.anchor.lat)
+        z = loc.alt - self.anchor.alt
+
+        if out is None:
+            return Distance(x, y, z)
+
+        return out.set(x, y, z)
+
+    def to_local_arrays(self, lat, lon, alt):
+        """Return the positions in the frame of arrays of latitudes,
+        longitudes, and altitudes as arrays of x, y, and z.
+        """
+
+        x = self._x_scale * (np.asarray(lon, dtype=float) - self.anchor.lon)
+        y = self._y_scale * (np.asarray(lat, dtype=float) - self.anchor.lat)
+        z = np.asarray(alt, dtype=float) - self.anchor.alt
+
+        return x, y, z
+
+    def from_local(self, dist):
+        """Return the Location of the position dist in the frame."""
+        lat = dist.y / self._y_scale + self.anchor.lat
+        lon = dist.x / self._x_scale + self.anchor.lon
+        alt = dist.z + self.anchor.alt
+
+        return Location(lat, lon, alt)
+
+    def get_precision_report(self, field_size=5000, samples=2000, seed=0):
+        """Return a dictionary comparing the distances between random
+        pairs of Locations in a square field of side field_size meters
+        centered on the anchor found with the frame against those found
+        with Location.get_distance().
+
+        The errors are in meters, and the relative error is the error
+        divided by the distance between the Locations.
+        """
+
+        random = Random(seed)
+
+        half = field_size / 2.0
+        errors = []
+        relative_errors = []
+
+        for _ in xrange(samples):
+            loc_1, loc_2 = [self.from_local(Distance(random.uniform(-half,
+                half), random.uniform(-half, half), 0)) for _ in xrange(2)]
+
+            dist = loc_1.get_distance(loc_2)
+            local_dist = self.to_local(loc_2).subtract(self.to_local(loc_1))
+
+            error = local_dist.subtract(dist).get_magnitude_xy()
+            magnitude = dist.get_magnitude_xy()
+
+            errors.append(error)
+
+            if magnitude:
+                relative_errors.append(error / magnitude)
+
+        return {
+            'field_size': field_size,
+            'samples': samples,
+            'max_error': max(errors),
+            'mean_error': sum(errors) / len(errors),
+            'rms_error': sqrt(sum(e ** 2 for e in errors) / len(errors)),
+            'max_relative_error': max(relative_errors)
+        }
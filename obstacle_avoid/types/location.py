@@ -12,29 +12,51 @@ from ..constants import EARTH_RADIUS, EARTH_ECCEN
 from ..util import deg_to_rad, rad_to_deg
 
 
+def get_earth_radii(lat):
+    """Return the meridional and normal radii of the earth at lat used
+    for the flat-earth approximation.
+    """
+
+    sin_lat_2 = EARTH_ECCEN ** 2 * sin(lat) ** 2
+
+    r_1 = EARTH_RADIUS * (1 - EARTH_ECCEN ** 2) / (1 - sin_lat_2) ** 1.5
+    r_2 = EARTH_RADIUS / sqrt(1 - sin_lat_2)
+
+    return r_1, r_2
+
+
 class Location(object):
 
     """Represents a GPS location with a lattitude, longitude, and 
     altitude with respect to the ground.
     """
 
+    __slots__ = ('lat', 'lon', 'alt')
+
     def __init__(self, lat, lon, alt):
         """Instantiate a Location object at lat, lon and at alt."""
         self.lat = lat
         self.lon = lon
         self.alt = alt
 
+    def set(self, lat, lon, alt):
+        """Set the Location object to lat, lon and alt and return it."""
+        self.lat = lat
+        self.lon = lon
+        self.alt = alt
+
+        return self
+
     def _get_earth_radii(self):
         """Return the radii used for the flat-earth approximation."""
-        r_1 = (EARTH_RADIUS * (1 - EARTH_ECCEN ** 2) /
-               (1 - EARTH_ECCEN ** 2 * sin(self.lat) ** 2) ** (3 / 2))
-        r_2 = EARTH_RADIUS / sqrt(1 - EARTH_ECCEN ** 2 * sin(self.lat) ** 2)
-           
-        return r_1, r_2
+        return get_earth_radii(self.lat)
 
-    def get_distance(self, loc, angle=0):
+    def get_distance(self, loc, angle=0, out=None):
         """Get the distance between two Locations and return a Distance
         object using the flat-earth approximation.
+
+        If out is given the distance is written into the Distance out
+        instead of a new Distance.
         """
 
         e_radii = self._get_earth_radii()
@@ -43,10 +65,13 @@ class Location(object):
         y = e_radii[0] * (loc.lat - self.lat)
         z = loc.alt - self.alt
         
-        dist = Distance(x, y, z)
+        if out is None:
+            dist = Distance(x, y, z)
+        else:
+            dist = out.set(x, y, z)
         
         if angle:
-            dist = dist.get_transform(angle)
+            dist.transform_inplace(angle)
 
         return dist
 
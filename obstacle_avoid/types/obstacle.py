@@ -1,8 +1,11 @@
 from abc import ABCMeta, abstractmethod, abstractproperty
-from math import sqrt, pi
+from math import sqrt, sin, cos
 
-from distance import Distance
-from ..constants import AVOID_DIST_STAT, AVOID_DIST_MOV
+import numpy as np
+
+from distance import TurnSolution
+from spatial import SpatialGrid, AltitudeIndex
+from ..constants import AVOID_DIST_STAT, AVOID_DIST_MOV, GRID_CELL_SIZE
 
 class BaseObstacle(object):
     
@@ -80,28 +83,30 @@ class BaseObstacle(object):
             
             start_loc = plane.loc
 
-        if not heading:
+        if heading is None:
             
             heading = plane.heading
 
-        turn_dist = Distance.get_turn_dist(plane)
-        turn_angle = Distance.get_turn_angle(plane)
+        turn = TurnSolution.solve(plane, start_loc, heading)
+        turn_dist = turn.turn_dist
+
+        scratch = plane.avoid_sys.scratch
 
-        wp_dist = start_loc.get_distance(plane.next_wp, angle=heading) \
-            .subtract(turn_dist).get_transform(turn_angle)
+        wp_dist = scratch[1].set(turn.wp_dist.x, turn.wp_dist.y,
+            turn.wp_dist.z).isub(turn_dist).transform_inplace(turn.angle)
 
-        obs_dist = start_loc.get_distance(self.loc, angle=heading) \
-            .subtract(turn_dist).get_transform(turn_angle)
+        obs_dist = start_loc.get_distance(self.loc, heading, scratch[2]) \
+            .isub(turn_dist).transform_inplace(turn.angle)
 
-        if obs_dist < 0 or obs_dist > wp_dist.y:
+        if not 0 <= obs_dist.y < wp_dist.y:
 
             return False
 
-        pass_alt = plane.loc + turn_dist.z + obs_dist.y / float(wp_dist.y) \
+        pass_alt = start_loc.alt + turn_dist.z + obs_dist.y / float(wp_dist.y) \
             * wp_dist.z
         radius = self.get_avoid_radius(pass_alt)
 
-        return radius > obs_dist.x
+        return radius > abs(obs_dist.x)
 
 class StaticObstacle(BaseObstacle):
 
@@ -170,3 +175,271 @@ class MovingObstacle(BaseObstacle):
                 - self.loc.alt) ** 2)
     
         return 0
+
+
+class ObstacleSet(object):
+
+    """Represents a set of static and moving obstacles with their
+    positions and dimensions stored as NumPy arrays.
+
+    The ObstacleSet answers the same questions as the methods of
+    BaseObstacle but for all of the obstacles at once. The obstacles
+    are kept in the order of the static obstacles followed by the moving
+    obstacles so that an index into the arrays is also an index into
+    obstacles. The positions are stored in meters in a LocalFrame when
+    the set is made, and the positions of the moving obstacles should be
+    refreshed by update_moving() after their Locations change.
+
+    The obstacles are also indexed in a SpatialGrid so that
+    get_candidates() can find the obstacles near a position. Most
+    methods take an array of indices to only answer for those
+    obstacles.
+    """
+
+    STATIC = 0
+    MOVING = 1
+
+    def __init__(self, static_obs=None, moving_obs=None, frame=None):
+        """Instantiate an ObstacleSet object from lists of
+        StaticObstacle and MovingObstacle objects with their positions
+        in the LocalFrame frame.
+        """
+
+        static_obs = list(static_obs or [])
+        moving_obs = list(moving_obs or [])
+
+        self.obstacles = static_obs + moving_obs
+        self.n_static = len(static_obs)
+        self.frame = frame
+
+        self.alt = np.array([obs.loc.alt for obs in self.obstacles],
+            dtype=float)
+
+        if self.obstacles:
+            self.x, self.y, _ = frame.to_local_arrays(
+                [obs.loc.lat for obs in self.obstacles],
+                [obs.loc.lon for obs in self.obstacles], self.alt)
+        else:
+            self.x, self.y = np.zeros((2, 0))
+
+        self.radius = np.array([obs.radius for obs in self.obstacles],
+            dtype=float)
+        self.height = np.array([obs.height for obs in static_obs] +
+            [0] * len(moving_obs), dtype=float)
+
+        self.kind = np.array([ObstacleSet.STATIC] * len(static_obs) +
+            [ObstacleSet.MOVING] * len(moving_obs), dtype=np.int8)
+
+        self.is_static = self.kind == ObstacleSet.STATIC
+        self.is_moving = self.kind == ObstacleSet.MOVING
+
+        avoid_radii = np.where(self.is_static, self.radius + AVOID_DIST_STAT,
+            self.radius + AVOID_DIST_MOV)
+        self.max_avoid_radius = avoid_radii.max() if self.obstacles else 0
+
+        self.grid = SpatialGrid(GRID_CELL_SIZE)
+        self.grid.insert_all(xrange(len(self.obstacles)), self.x, self.y)
+
+        # The static obstacles never move so their vertical extents are
+        # indexed, while the moving obstacles are checked directly.
+        static_reach = self.height[:self.n_static] / 2.0 + AVOID_DIST_STAT
+        self.alt_index = AltitudeIndex(self.alt[:self.n_static] -
+            static_reach, self.alt[:self.n_static] + static_reach)
+
+    def __len__(self):
+        return len(self.obstacles)
+
+    def update_moving(self):
+        """Refresh the positions of the moving obstacles from their
+        Locations.
+        """
+
+        for i in xrange(self.n_static, len(self.obstacles)):
+            loc = self.obstacles[i].loc
+            pos = self.frame.to_local(loc)
+
+            self.x[i] = pos.x
+            self.y[i] = pos.y
+            self.alt[i] = loc.alt
+
+            self.grid.move(i, pos.x, pos.y)
+
+    def get_in_altitudes(self, low, high=None, margin=0):
+        """Return a sorted array of the indices of the obstacles that are
+        avoided somewhere in the range of altitudes from low to high, or
+        at the altitude low if high is None.
+
+        The range is widened by margin for the moving obstacles to allow
+        for how far they could climb or descend.
+        """
+
+        if high is None:
+            high = low
+
+        moving = np.arange(self.n_static, len(self.obstacles))
+
+        return np.concatenate((self.alt_index.query(low, high),
+            moving[self.are_in_altitudes(low, high, margin, moving)]))
+
+    def are_in_altitudes(self, low, high=None, margin=0, indices=None):
+        """Return an array of whether each obstacle is avoided somewhere
+        in the range of altitudes from low to high as in
+        get_in_altitudes().
+        """
+
+        if high is None:
+            high = low
+
+        if indices is None:
+            indices = np.arange(len(self.obstacles))
+
+        is_static = self.is_static[indices]
+
+        # The extents of the static obstacles are in the index.
+        static = np.minimum(indices, self.n_static - 1)
+        obs_low = self.alt_index.low[static] if self.n_static else 0
+        obs_high = self.alt_index.high[static] if self.n_static else 0
+
+        reach = self.radius[indices] + AVOID_DIST_MOV + margin
+        obs_low = np.where(is_static, obs_low, self.alt[indices] - reach)
+        obs_high = np.where(is_static, obs_high, self.alt[indices] + reach)
+
+        return (obs_low < high) & (obs_high > low)
+
+    def get_candidates(self, pos, radius, alt=None, alt_high=None, margin=0):
+        """Return a sorted array of the indices of the obstacles that
+        may be within radius of the position pos in the frame plus the
+        largest avoidance radius of the obstacles.
+
+        If alt is given only the obstacles avoided somewhere from alt to
+        alt_high, with margin for the moving obstacles, are included as
+        in get_in_altitudes().
+        """
+
+        indices = self.grid.query(pos.x, pos.y, radius + self.max_avoid_radius)
+
+        if alt is None:
+            return indices
+
+        return indices[self.are_in_altitudes(alt, alt_high, margin, indices)]
+
+    def get_distances(self, loc, angle=0, scratch=None):
+        """Return the x, y, and z components of the distances from loc
+        to every obstacle as arrays and transformed by angle as in
+        Distance.get_transform().
+
+        If scratch is given the position of loc in the frame is written
+        into the Distance scratch instead of a new Distance.
+        """
+
+        if not self.obstacles:
+            return self.x, self.y, self.alt
+
+        return self.get_local_distances(self.frame.to_local(loc, scratch),
+            loc.alt, angle)
+
+    def get_local_distances(self, pos, alt, angle=0, indices=None):
+        """Return the x, y, and z components of the distances to every
+        obstacle from the position pos in the frame at the altitude alt
+        relative to the ground as arrays and transformed by angle as in
+        Distance.get_transform().
+        """
+
+        if indices is None:
+            x = self.x - pos.x
+            y = self.y - pos.y
+            z = self.alt - alt
+        else:
+            x = self.x[indices] - pos.x
+            y = self.y[indices] - pos.y
+            z = self.alt[indices] - alt
+
+        if angle:
+            x, y = (x * cos(angle) - y * sin(angle),
+                x * sin(angle) + y * cos(angle))
+
+        return x, y, z
+
+    def _get_columns(self, indices, alt):
+        """Return the altitude, radius, height, and is_static arrays of
+        the obstacles with indices or of every obstacle if indices is
+        None, as columns if alt is an array with a row per obstacle.
+        """
+
+        if indices is None:
+            columns = self.alt, self.radius, self.height, self.is_static
+        else:
+            columns = (self.alt[indices], self.radius[indices],
+                self.height[indices], self.is_static[indices])
+
+        if np.ndim(alt) == 2:
+            return [column[:, np.newaxis] for column in columns]
+
+        return columns
+
+    def get_cross_sectional_radii(self, alt, indices=None):
+        """Return the cross-sectional radius of every obstacle at alt as
+        an array, where obstacles not at alt have a radius of zero.
+
+        alt can also be an array of altitudes for each obstacle or a two
+        dimensional array with a row of altitudes for each obstacle.
+        """
+
+        obs_alt, radius, height, is_static = self._get_columns(indices, alt)
+        d_alt = alt - obs_alt
+
+        static_radii = np.where(np.abs(d_alt) < height / 2.0, radius, 0)
+        moving_radii = np.sqrt(np.maximum(radius ** 2 - d_alt ** 2, 0))
+
+        return np.where(is_static, static_radii, moving_radii)
+
+    def get_avoid_radii(self, alt, indices=None):
+        """Return the avoidance radius of every obstacle at alt as an
+        array, where obstacles not avoided at alt have a radius of zero.
+
+        alt can also be an array of altitudes for each obstacle or a two
+        dimensional array with a row of altitudes for each obstacle.
+        """
+
+        obs_alt, radius, height, is_static = self._get_columns(indices, alt)
+
+        d_alt = np.abs(alt - obs_alt)
+        d_above = d_alt - height / 2.0
+
+        static_radii = np.where(d_above <= 0, radius + AVOID_DIST_STAT,
+            np.where(d_above < AVOID_DIST_STAT, radius + np.sqrt(
+            np.maximum(AVOID_DIST_STAT ** 2 - d_above ** 2, 0)), 0))
+
+        moving_radii = np.sqrt(np.maximum((AVOID_DIST_MOV + radius) ** 2
+            - d_alt ** 2, 0))
+
+        return np.where(is_static, static_radii, moving_radii)
+
+    def are_loc_inside(self, loc):
+        """Return an array of whether loc is inside each obstacle."""
+        x, y, _ = self.get_distances(loc)
+
+        return self.get_cross_sectional_radii(loc.alt) > np.hypot(x, y)
+
+    def are_loc_in_avoid_radius(self, loc):
+        """Return an array of whether loc is inside the avoidance radius
+        of each obstacle.
+        """
+
+        x, y, _ = self.get_distances(loc)
+
+        return self.get_avoid_radii(loc.alt) > np.hypot(x, y)
+
+    def are_in_wp(self, plane, wp_loc, indices=None):
+        """Return an array of whether each obstacle's avoidance radius
+        covers the waypoint at wp_loc.
+        """
+
+        if not self.obstacles:
+            return np.zeros(0, dtype=bool)
+
+        x, y, _ = self.get_local_distances(self.frame.to_local(wp_loc),
+            wp_loc.alt, indices=indices)
+        radii = self.get_avoid_radii(wp_loc.alt, indices)
+
+        return (radii > 0) & (radii + plane.wp_radius > np.hypot(x, y))
@@ -0,0 +1,166 @@
+"""Contains the SpatialGrid class that indexes obstacles by their
+position in a local frame and the AltitudeIndex class that indexes them
+by their vertical extent so that only the obstacles near a position
+need to be checked.
+"""
+
+from math import floor
+from threading import Lock
+
+import numpy as np
+
+
+class SpatialGrid(object):
+
+    """Represents a uniform grid of square cells in the xy plane of a
+    local frame where each cell holds the indices of the obstacles
+    whose positions are inside of it.
+
+    Obstacles are added by insert() and can be moved cheaply by move(),
+    which only changes cells when an obstacle leaves its cell. A query()
+    returns a superset of the obstacles within a distance of a position.
+    The moving obstacles are moved on the thread receiving them while
+    the monitoring thread queries, so the cells are only changed and
+    read while holding a lock.
+    """
+
+    def __init__(self, cell_size):
+        """Instantiate an empty SpatialGrid object with cells of side
+        cell_size meters.
+        """
+
+        self.cell_size = float(cell_size)
+
+        self._cells = {}
+        self._cell_of = {}
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._cell_of)
+
+    def _get_cell(self, x, y):
+        """Return the key of the cell containing x and y."""
+        return (int(floor(x / self.cell_size)), int(floor(y / self.cell_size)))
+
+    def insert(self, i, x, y):
+        """Add the obstacle with index i at x and y to the grid."""
+        cell = self._get_cell(x, y)
+
+        with self._lock:
+            self._cells.setdefault(cell, set()).add(i)
+            self._cell_of[i] = cell
+
+    def insert_all(self, indices, x, y):
+        """Add the obstacles with indices at the positions in the arrays
+        x and y to the grid.
+        """
+
+        for i, x_i, y_i in zip(indices, x, y):
+            self.insert(i, x_i, y_i)
+
+    def move(self, i, x, y):
+        """Move the obstacle with index i to x and y."""
+        cell = self._get_cell(x, y)
+
+        with self._lock:
+            old_cell = self._cell_of.get(i)
+
+            if cell == old_cell:
+                return
+
+            if old_cell is not None:
+                self._cells[old_cell].discard(i)
+
+                if not self._cells[old_cell]:
+                    del self._cells[old_cell]
+
+            self._cells.setdefault(cell, set()).add(i)
+            self._cell_of[i] = cell
+
+    def query(self, x, y, radius):
+        """Return a sorted array of the indices of the obstacles in the
+        cells that overlap the square of side 2 * radius centered at x
+        and y, which includes every obstacle within radius of x and y.
+        """
+
+        min_cx, min_cy = self._get_cell(x - radius, y - radius)
+        max_cx, max_cy = self._get_cell(x + radius, y + radius)
+
+        cells = self._cells
+        indices = []
+
+        with self._lock:
+            # Look through whichever is smaller of the cells in the square
+            # and the cells that are not empty.
+            if (max_cx - min_cx + 1) * (max_cy - min_cy + 1) < len(cells):
+                for cx in xrange(min_cx, max_cx + 1):
+                    for cy in xrange(min_cy, max_cy + 1):
+                        cell = cells.get((cx, cy))
+
+                        if cell:
+                            indices.extend(cell)
+
+            else:
+                for (cx, cy), cell in cells.iteritems():
+                    if min_cx <= cx <= max_cx and min_cy <= cy <= max_cy:
+                        indices.extend(cell)
+
+        indices = np.array(indices, dtype=int)
+        indices.sort()
+
+        return indices
+
+
+class AltitudeIndex(object):
+
+    """Represents the vertical extents of obstacles as arrays of their
+    lowest and highest altitudes sorted by each, so that the obstacles
+    whose extents overlap a range of altitudes can be found without
+    looking at every obstacle.
+
+    The extents are open intervals, so an obstacle whose extent only
+    touches the range at an end is not found.
+    """
+
+    def __init__(self, low, high):
+        """Instantiate an AltitudeIndex object for the obstacles whose
+        extents are from the arrays low to high.
+        """
+
+        self.low = np.asarray(low, dtype=float)
+        self.high = np.asarray(high, dtype=float)
+
+        self._low_order = np.argsort(self.low, kind='mergesort')
+        self._high_order = np.argsort(self.high, kind='mergesort')
+
+        self._sorted_low = self.low[self._low_order]
+        self._sorted_high = self.high[self._high_order]
+
+    def __len__(self):
+        return len(self.low)
+
+    def query(self, low, high=None):
+        """Return a sorted array of the indices of the obstacles whose
+        extents overlap the range of altitudes from low to high, or the
+        altitude low if high is None.
+        """
+
+        if high is None:
+            high = low
+
+        # The obstacles starting below the top of the range and the
+        # obstacles ending above the bottom of the range.
+        below = self._low_order[:np.searchsorted(self._sorted_low, high,
+            'left')]
+        above = self._high_order[np.searchsorted(self._sorted_high, low,
+            'right'):]
+
+        # Filter whichever is smaller by the other condition.
+        if len(below) <= len(above):
+            indices = below[self.high[below] > low]
+        else:
+            indices = above[self.low[above] < high]
+
+        indices.sort()
+
+        return indices
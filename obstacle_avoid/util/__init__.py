@@ -1 +1,5 @@
 from unit_conversions import *
+from turn_geometry import *
+from path_model import *
+from clock import *
+from instrument import *
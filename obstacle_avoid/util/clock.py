@@ -0,0 +1,67 @@
+"""Handles reading a monotonic clock.
+
+The monotonic clock never goes backwards when the system time is set,
+so it is what deadlines and intervals are measured with. Python 2 has no
+monotonic clock of its own, so clock_gettime() is called through ctypes
+where it is available and time() is used otherwise.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import sys
+from time import time
+
+__all__ = ['monotonic']
+
+
+class _Timespec(ctypes.Structure):
+    _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+
+def _get_clock_gettime():
+    """Return a function reading CLOCK_MONOTONIC in seconds, or None if
+    clock_gettime() cannot be called.
+    """
+
+    clock_id = 6 if sys.platform == 'darwin' else 1
+
+    for name in (ctypes.util.find_library('c'), ctypes.util.find_library('rt'),
+            'librt.so.1'):
+        if not name:
+            continue
+
+        try:
+            clock_gettime = ctypes.CDLL(name, use_errno=True).clock_gettime
+        except (OSError, AttributeError):
+            continue
+
+        clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(_Timespec)]
+
+        def monotonic():
+            """Return the time in seconds of a clock that never goes
+            backwards, from an arbitrary start.
+            """
+
+            timespec = _Timespec()
+
+            if clock_gettime(clock_id, ctypes.byref(timespec)):
+                errno = ctypes.get_errno()
+                raise OSError(errno, os.strerror(errno))
+
+            return timespec.tv_sec + timespec.tv_nsec * 1e-9
+
+        try:
+            monotonic()
+        except OSError:
+            continue
+
+        return monotonic
+
+    return None
+
+
+try:
+    from time import monotonic
+except ImportError:
+    monotonic = _get_clock_gettime() or time
@@ -0,0 +1,204 @@
+"""Handles timing spans of code and counting events with little enough
+overhead to leave on in flight.
+
+A span is timed on the monotonic clock and recorded in a histogram with
+fixed buckets, so recording a value only adds to a count and the
+percentiles of a long flight can be read at any time. When instruments
+are disabled every span is a shared object that does nothing and
+recording and counting return at once.
+"""
+
+import json
+from bisect import bisect_left
+
+from clock import monotonic
+
+__all__ = ['Histogram', 'Instruments']
+
+# The upper bounds in seconds of the buckets of a histogram, from 10
+# microseconds to 10 seconds in steps of 1, 2, and 5.
+HISTOGRAM_BOUNDS = tuple(m * 10 ** e for e in xrange(-5, 1) for m in (1, 2,
+    5)) + (10,)
+
+
+class Histogram(object):
+
+    """Represents the counts of values in buckets with the upper bounds
+    in bounds, with a last bucket for the values above every bound.
+    """
+
+    def __init__(self, bounds=HISTOGRAM_BOUNDS):
+        """Instantiate a Histogram object with no values."""
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value):
+        """Add value to the histogram."""
+        self.counts[bisect_left(self.bounds, value)] += 1
+
+        self.count += 1
+        self.total += value
+
+        if value > self.max:
+            self.max = value
+
+    def get_percentile(self, percent):
+        """Return the upper bound of the bucket holding the value percent
+        percent of the way through the values, which is never less than
+        the value, or the largest value if it is above every bound.
+        """
+
+        if not self.count:
+            return 0.0
+
+        rank = percent / 100.0 * self.count
+        seen = 0
+
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+
+            if seen >= rank:
+                return min(bound, self.max)
+
+        return self.max
+
+    def get_summary(self):
+        """Return a dictionary of the number of values, their mean, 50th
+        and 99th percentiles, and largest value.
+        """
+
+        return {
+            'count': self.count,
+            'mean': self.total / max(self.count, 1),
+            'p50': self.get_percentile(50),
+            'p99': self.get_percentile(99),
+            'max': self.max
+        }
+
+
+class _Span(object):
+
+    """Represents a span being timed, which records its duration in a
+    histogram when it ends.
+    """
+
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = monotonic()
+
+    def __exit__(self, *exc_info):
+        self.histogram.record(monotonic() - self.start)
+
+
+class _NullSpan(object):
+
+    """Represents a span that is not timed."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_null_span = _NullSpan()
+
+
+class Instruments(object):
+
+    """Represents the histograms of spans and values and the counters of
+    a program, which are only recorded if enabled is True.
+
+    Spans are timed by using span() in a with statement, values are
+    recorded by record(), and events are counted by count().
+    """
+
+    def __init__(self, enabled=True):
+        """Instantiate an Instruments object with nothing recorded."""
+        self.enabled = enabled
+
+        self.histograms = {}
+        self.counters = {}
+
+    def get_histogram(self, name):
+        """Return the histogram called name, adding it if needed."""
+        histogram = self.histograms.get(name)
+
+        if histogram is None:
+            histogram = self.histograms.setdefault(name, Histogram())
+
+        return histogram
+
+    def span(self, name):
+        """Return a context manager timing its body in the histogram
+        called name.
+        """
+
+        if not self.enabled:
+            return _null_span
+
+        return _Span(self.get_histogram(name))
+
+    def record(self, name, value):
+        """Record value in the histogram called name."""
+        if self.enabled:
+            self.get_histogram(name).record(value)
+
+    def count(self, name, n=1):
+        """Add n to the counter called name."""
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def get_report(self):
+        """Return a dictionary of the summaries of the histograms and
+        the values of the counters by name.
+        """
+
+        return {
+            'histograms': dict((name, histogram.get_summary()) for name,
+                histogram in self.histograms.items()),
+            'counters': dict(self.counters)
+        }
+
+    def get_stats_string(self):
+        """Return the summaries of the histograms and the counters as a
+        string of the name, count, and 50th and 99th percentiles and
+        largest value in milliseconds of each histogram followed by the
+        name and value of each counter, separated by commas.
+        """
+
+        report = self.get_report()
+        entries = []
+
+        for name, summary in sorted(report['histograms'].items()):
+            entries.append('%s %d %.3f %.3f %.3f' % (name, summary['count'],
+                summary['p50'] * 1000, summary['p99'] * 1000, summary['max'] *
+                1000))
+
+        for name, value in sorted(report['counters'].items()):
+            entries.append('%s %d' % (name, value))
+
+        return ','.join(entries)
+
+    def export(self, path):
+        """Write the report and the bucket counts of every histogram to
+        a JSON file at path.
+        """
+
+        report = self.get_report()
+        report['buckets'] = dict((name, {'bounds': histogram.bounds,
+            'counts': histogram.counts}) for name, histogram in
+            self.histograms.items())
+
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
@@ -0,0 +1,103 @@
+"""Handles generating the path of a plane that turns in a circular path
+at a constant bank angle and then flies directly to a target.
+
+The path is found in closed form from the turn geometry in turn_geometry
+and then sampled at a given time resolution, so the cost only depends on
+the number of samples and targets. Positions are in meters with x east
+and y north, and headings are in radians clockwise from north.
+"""
+
+from math import ceil, tan
+
+import numpy as np
+
+from turn_geometry import solve_turns_from_headings
+from ..constants import ACCEL_GRAV
+
+
+def get_turning_radius(v, phi):
+    """Return the turning radius of a plane flying at v meters per second
+    with the bank angle phi.
+    """
+
+    return v ** 2 / ACCEL_GRAV / tan(phi)
+
+
+def get_paths(x_init, y_init, theta_init, x_f, y_f, phi, v, t=0,
+        resolution=0.1, radius=0):
+    """Return the paths of a plane at x_init and y_init with the heading
+    theta_init flying at v meters per second with the bank angle phi to
+    each of the targets at the arrays x_f and y_f, starting at the time
+    t and stopping radius meters from each target.
+
+    Return an array of the times sampled every resolution seconds until
+    the last target is reached, arrays of x and y with a row for each
+    target, where each plane stays at the end of its path once it has
+    reached its target, and an array of the times each target is
+    reached.
+    """
+
+    if v <= 0 or resolution <= 0:
+        raise ValueError('The velocity and resolution must be positive.')
+
+    x_f = np.atleast_1d(np.asarray(x_f, dtype=float))
+    y_f = np.atleast_1d(np.asarray(y_f, dtype=float))
+
+    turning_radius = get_turning_radius(v, phi)
+
+    turns = solve_turns_from_headings(x_f - x_init, y_f - y_init, theta_init,
+        turning_radius)
+
+    # The target relative to the plane in the frame of its heading.
+    cos_theta = np.cos(theta_init)
+    sin_theta = np.sin(theta_init)
+
+    i = (x_f - x_init) * cos_theta - (y_f - y_init) * sin_theta
+    j = (x_f - x_init) * sin_theta + (y_f - y_init) * cos_theta
+
+    arc_length = turns.arc_length
+    leg_length = np.maximum(turns.leg_length - radius, 0)
+    path_length = arc_length + leg_length
+
+    n_samples = int(ceil(path_length.max() / v / resolution)) + 1
+
+    times = np.arange(n_samples) * resolution
+    dists = np.minimum(v * times, path_length[:, np.newaxis])
+
+    # The part of the path flown while turning.
+    side = np.sign(turns.angle)[:, np.newaxis]
+    thetas = np.minimum(dists, arc_length[:, np.newaxis]) / turning_radius
+
+    path_i = side * turning_radius * (1 - np.cos(thetas))
+    path_j = turning_radius * np.sin(thetas)
+
+    # The part of the path flown directly to the target.
+    leg_i = i - turns.a
+    leg_j = j - turns.b
+    leg = np.hypot(leg_i, leg_j)
+    leg = np.where(leg == 0, 1, leg)
+
+    flown = np.maximum(dists - arc_length[:, np.newaxis], 0)
+
+    path_i = path_i + flown * (leg_i / leg)[:, np.newaxis]
+    path_j = path_j + flown * (leg_j / leg)[:, np.newaxis]
+
+    # Transform the path back from the frame of the heading.
+    x = x_init + path_i * cos_theta + path_j * sin_theta
+    y = y_init - path_i * sin_theta + path_j * cos_theta
+
+    return t + times, x, y, t + path_length / v
+
+
+def get_path(x_init, y_init, theta_init, x_f, y_f, phi, v, t=0,
+        resolution=0.1, radius=0):
+    """Return the path of a plane to a single target as arrays of the
+    times, x, and y sampled every resolution seconds as in get_paths().
+    """
+
+    times, x, y, end_times = get_paths(x_init, y_init, theta_init, x_f, y_f,
+        phi, v, t, resolution, radius)
+
+    n_samples = int(ceil((end_times[0] - t) / resolution)) + 1
+
+    return times[:n_samples], x[0, :n_samples], y[0, :n_samples]
@@ -0,0 +1,87 @@
+"""Handles solving the turn geometry of a plane for many waypoints or
+headings at once.
+
+The geometry is the same as that of TurnSolution, where the plane turns
+in a circular path and then flies directly to the waypoint, but it is
+solved with NumPy over arrays of waypoints and turning radii. The cases
+where the scalar solve catches a ZeroDivisionError or ValueError are
+handled with masks instead.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+
+TurnArrays = namedtuple('TurnArrays', ['angle', 'a', 'b', 'c', 'arc_length',
+    'leg_length'])
+
+
+def solve_turns(i, j, r, k=0):
+    """Solve the turn geometry for waypoints at i, j, and k relative to
+    the plane in the frame of its heading and for turning radii r, which
+    are broadcast against each other and must not be zero.
+
+    Return a TurnArrays of arrays where angle is the angle the plane
+    must turn (negative for left and positive for right), a, b, and c
+    are the distances relative to the plane of the point where the plane
+    no longer turns, and arc_length and leg_length are the distances in
+    the xy plane flown while turning and after turning.
+    """
+
+    i, j, r, k = np.broadcast_arrays(*[np.asarray(value, dtype=float)
+        for value in (i, j, r, k)])
+
+    # If the waypoint is to the left make the plane turn left.
+    r = np.where(i < 0, -r, r)
+
+    # If the plane cannot make a tight enough turn, turn the other way.
+    r = np.where((i - r) ** 2 + j ** 2 < r ** 2, -r, r)
+
+    # The scalar solve fails for when the plane doesn't turn at all or
+    # when the plane turns pi radians left or right.
+    root = i ** 2 - 2 * r * i + j ** 2
+    denominator = r ** 2 - 2 * r * i + i ** 2 + j ** 2
+    degenerate = (root < 0) | (denominator == 0)
+
+    a = (r * i ** 2 - r ** 2 * i + r * j ** 2 - r * j * np.sqrt(np.maximum(
+        root, 0))) / np.where(degenerate, 1, denominator)
+    b = np.sqrt(np.maximum(r ** 2 - (a - r) ** 2, 0))
+
+    b = np.where(((j < 0) & (np.abs(i) < 2 * np.abs(r))) | (i / r < 0), -b, b)
+
+    a = np.where(degenerate, np.where(np.abs(i) < np.abs(r), 0, 2 * r), a)
+    b = np.where(degenerate, 0, b)
+
+    # Find how what angle the plane must turn.
+    angle = np.arctan2(b, np.sign(r) * (r - a)) % (2 * np.pi)
+
+    # Find the distances in the xy plane of the circular and linear path
+    # and split k between them.
+    arc_length = np.abs(r) * angle
+    leg_length = np.hypot(i - a, j - b)
+
+    length = arc_length + leg_length
+    c = np.where(length == 0, 0, arc_length / np.where(length == 0, 1,
+        length) * k)
+
+    return TurnArrays(np.copysign(angle, r), a, b, c, arc_length, leg_length)
+
+
+def solve_turns_from_headings(x, y, headings, r, z=0):
+    """Solve the turn geometry for a waypoint at x, y, and z relative to
+    the plane with x east and y north for each of the headings of the
+    plane and turning radii r, which are broadcast against each other.
+
+    Return a TurnArrays as with solve_turns().
+    """
+
+    headings = np.asarray(headings, dtype=float)
+
+    cos_heading = np.cos(headings)
+    sin_heading = np.sin(headings)
+
+    i = x * cos_heading - y * sin_heading
+    j = x * sin_heading + y * cos_heading
+
+    return solve_turns(i, j, r, z)
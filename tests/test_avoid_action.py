@@ -0,0 +1,76 @@
+"""Tests the actions of the obstacle avoidance system."""
+
+import unittest
+from math import pi
+
+from obstacle_avoid.avoidance.avoid_state import AvoidState
+from obstacle_avoid.avoidance.replay import FlightReplay, ReplayCommand
+from obstacle_avoid.types import Distance, Location, LocalFrame, \
+    StaticObstacle
+from obstacle_avoid.util import deg_to_rad, rad_to_deg
+
+
+def make_step(frame, time, x, y, heading, wp_number=2):
+    """Return a step of a trace of the plane at x and y in frame flying
+    level at 100 meters with heading.
+    """
+
+    return {
+        'time': time,
+        'airspeed': 18,
+        'heading': heading,
+        'loc': frame.from_local(Distance(x, y, 100)),
+        'wp_number': wp_number
+    }
+
+
+class AvoidThenMonitorTest(unittest.TestCase):
+
+    """Tests a plane turning away from a static obstacle in the way of
+    its leg and turning back once it is clear.
+    """
+
+    def setUp(self):
+        home_loc = Location(deg_to_rad(38.1446), deg_to_rad(-76.4279), 0)
+        self.frame = frame = LocalFrame(home_loc)
+
+        commands = []
+
+        for x, y in ((0, 0), (0, 2000)):
+            wp = frame.from_local(Distance(x, y, 100))
+            commands.append(ReplayCommand(rad_to_deg(wp.lat),
+                rad_to_deg(wp.lon), wp.alt))
+
+        obs = StaticObstacle(frame.from_local(Distance(0, 600, 0)), 30, 400)
+
+        self.replay = FlightReplay(home_loc, [obs], [], commands,
+            incremental=False)
+
+    def test_avoid_then_monitor(self):
+        replay = self.replay
+        frame = self.frame
+
+        for n in xrange(3):
+            decision = replay.step(make_step(frame, n * 0.1, 0, 100, 0))
+            self.assertEqual(decision['state'], AvoidState.STANDBY)
+
+        decision = replay.step(make_step(frame, 0.3, 0, 100, 0))
+
+        self.assertIsNone(decision['error'])
+        self.assertEqual(decision['state'], AvoidState.AVOID)
+        self.assertEqual(decision['avoid_obs'], 0)
+        self.assertEqual([command[0] for command in decision['commands']],
+            ['turn'])
+        self.assertEqual(replay.plane.mode, 'GUIDED')
+
+        # Past the obstacle and off to its side, heading for the waypoint.
+        decision = replay.step(make_step(frame, 20, 300, 800, -pi / 8))
+
+        self.assertIsNone(decision['error'])
+        self.assertEqual(decision['state'], AvoidState.MONITOR)
+        self.assertEqual(decision['commands'][-1], ('auto',))
+        self.assertEqual(replay.plane.mode, 'AUTO')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+"""Tests clustering static obstacles and steering to the hulls."""
+
+import unittest
+from math import sin, cos
+
+import numpy as np
+
+from obstacle_avoid.avoidance.avoid_state import AvoidState
+from obstacle_avoid.avoidance.replay import FlightReplay, ReplayCommand
+from obstacle_avoid.constants import AVOID_DIST_STAT
+from obstacle_avoid.types import Distance, Location, LocalFrame, \
+    StaticObstacle
+from obstacle_avoid.util import deg_to_rad, rad_to_deg
+
+
+class WallClusterTest(unittest.TestCase):
+
+    """Tests a wall of nine obstacles 90 meters apart across the leg of a
+    plane flying north, 600 meters north of the start of the leg, with
+    the waypoint 100 meters beyond the middle of the wall.
+    """
+
+    def setUp(self):
+        home_loc = Location(deg_to_rad(38.1446), deg_to_rad(-76.4279), 0)
+        self.frame = frame = LocalFrame(home_loc)
+
+        commands = []
+
+        for x, y in ((0, 0), (0, 700)):
+            wp = frame.from_local(Distance(x, y, 100))
+            commands.append(ReplayCommand(rad_to_deg(wp.lat),
+                rad_to_deg(wp.lon), wp.alt))
+
+        self.obstacles = [StaticObstacle(frame.from_local(Distance(x, 600,
+            0)), 30, 400) for x in xrange(-360, 361, 90)]
+
+        self.replay = FlightReplay(home_loc, self.obstacles, [], commands,
+            incremental=False)
+        self.clusters = self.replay.avoid_sys.clusters
+
+    def test_wall_is_one_cluster(self):
+        cluster = self.clusters.get_cluster(self.obstacles[0], 100)
+
+        self.assertEqual(sorted(cluster['members']), range(9))
+
+        # The hull holds the avoidance radii of the ends of the wall but
+        # not the waypoint beyond it.
+        x, y = cluster['hull']
+        radius = 30 + AVOID_DIST_STAT
+
+        self.assertLessEqual(x.min(), -360 - radius)
+        self.assertGreaterEqual(x.max(), 360 + radius)
+        self.assertLessEqual(y.min(), 600 - radius)
+        self.assertTrue(600 + radius <= y.max() < 700)
+
+    def test_no_hull_inside(self):
+        # Between two obstacles of the wall the plane cannot steer to a
+        # tangent of the hull.
+        self.assertIsNone(self.clusters.get_avoid_hull(self.obstacles[4],
+            Distance(45, 600, 100), 100))
+        self.assertIsNotNone(self.clusters.get_avoid_hull(self.obstacles[4],
+            Distance(0, 100, 100), 100))
+
+    def test_steers_to_tangent(self):
+        replay = self.replay
+        frame = self.frame
+
+        for n in xrange(4):
+            decision = replay.step({
+                'time': n * 0.1,
+                'airspeed': 18,
+                'heading': 0,
+                'loc': frame.from_local(Distance(0, 100, 100)),
+                'wp_number': 2
+            })
+
+        self.assertIsNone(decision['error'])
+        self.assertEqual(decision['state'], AvoidState.AVOID)
+        self.assertEqual(decision['commands'][0][0], 'turn')
+
+        turn_angle = decision['commands'][0][1]
+
+        # The plane turns left away from the middle of the wall, and the
+        # tangent it leaves its turning circle on passes the whole wall
+        # on its right, just touching the hull.
+        self.assertLess(turn_angle, 0)
+
+        r = replay.plane.turning_radius
+        heading = turn_angle
+
+        end_x = -r + r * cos(heading)
+        end_y = 100 - r * sin(heading)
+
+        x, y = replay.avoid_sys.avoid_hull
+        right = (x - end_x) * cos(heading) - (y - end_y) * sin(heading)
+
+        self.assertAlmostEqual(np.min(right), 0, 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
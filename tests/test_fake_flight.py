@@ -0,0 +1,130 @@
+"""Tests flying a Plane headless with a simulated vehicle."""
+
+import unittest
+from threading import Event
+from time import sleep
+
+from dronekit import LocationGlobal
+
+from obstacle_avoid.avoidance.avoid_state import AvoidState
+from obstacle_avoid.client import NullClient
+from obstacle_avoid.fake_vehicle import FakeVehicle, FakeCommand
+from obstacle_avoid.plane import Plane
+from obstacle_avoid.types import Distance, Location, LocalFrame, \
+    StaticObstacle
+from obstacle_avoid.util import deg_to_rad, rad_to_deg
+
+
+class FakeFlightTest(unittest.TestCase):
+
+    """Tests a plane flying north to two waypoints at 100 meters with a
+    static obstacle in the way of the second leg, with simulated time
+    running ten times as fast as real time.
+    """
+
+    time_scale = 10
+
+    def setUp(self):
+        home_loc = LocationGlobal(38.1446, -76.4279, 0)
+        self.frame = frame = LocalFrame(Location(deg_to_rad(home_loc.lat),
+            deg_to_rad(home_loc.lon), 0))
+
+        commands = []
+
+        for y in (300, 900):
+            wp = frame.from_local(Distance(0, y, 100))
+            commands.append(FakeCommand(rad_to_deg(wp.lat),
+                rad_to_deg(wp.lon), wp.alt))
+
+        self.last_wp = frame.from_local(Distance(0, 900, 100))
+        self.obs = StaticObstacle(frame.from_local(Distance(0, 600, 100)),
+            30, 200)
+
+        self.vehicle = FakeVehicle(home_loc, commands,
+            time_scale=self.time_scale)
+        self.plane = Plane(None, vehicle=self.vehicle, clients=(NullClient,
+            NullClient, NullClient), clock=self.vehicle.clock,
+            time_scale=self.time_scale)
+
+    def tearDown(self):
+        self.plane.close()
+
+    def test_fly_mission(self):
+        plane = self.plane
+        vehicle = self.vehicle
+        avoid_sys = plane.avoid_sys
+
+        avoid_sys.set_obstacles([self.obs], [])
+        avoid_sys.start()
+        vehicle.start()
+
+        states = set()
+        closest = float('inf')
+        reached = False
+
+        while not reached and vehicle.time < 150:
+            sleep(0.02)
+
+            loc = plane.state.loc
+            states.add(avoid_sys.state)
+
+            closest = min(closest, loc.get_distance(
+                self.obs.loc).get_magnitude_xy())
+            reached = loc.get_distance(self.last_wp).get_magnitude_xy() < \
+                vehicle.parameters['WP_RADIUS'] / 100
+
+        self.assertTrue(reached)
+        self.assertIn(AvoidState.AVOID, states)
+        self.assertGreater(closest, self.obs.get_avoid_radius(100))
+
+        # The ticks ran at the control rate of simulated time.
+        self.assertGreater(avoid_sys.control_loop.get_metrics()['ticks'],
+            5 * vehicle.time)
+        self.assertNotIn('tick_errors', avoid_sys.instruments.counters)
+
+
+class FastFakeFlightTest(FakeFlightTest):
+
+    """Tests the same flight with simulated time running as fast as
+    possible, where the ticks cannot keep up with the simulation.
+    """
+
+    time_scale = None
+
+    def test_fly_mission(self):
+        plane = self.plane
+        vehicle = self.vehicle
+        avoid_sys = plane.avoid_sys
+
+        reached = Event()
+
+        # The flight is followed at every step of the simulation, which
+        # runs faster than the test could sample it.
+        def location_listener(vehicle, name, value):
+            frame = value.global_relative_frame
+            loc = Location(deg_to_rad(frame.lat), deg_to_rad(frame.lon),
+                frame.alt)
+
+            if loc.get_distance(self.last_wp).get_magnitude_xy() < \
+                    vehicle.parameters['WP_RADIUS'] / 100 or \
+                    vehicle.time > 150:
+                vehicle.remove_attribute_listener('location',
+                    location_listener)
+                reached.set()
+
+        avoid_sys.set_obstacles([self.obs], [])
+        avoid_sys.start()
+        vehicle.add_attribute_listener('location', location_listener)
+        vehicle.start()
+
+        self.assertTrue(reached.wait(60))
+        self.assertLess(vehicle.time, 150)
+
+        # The loop went on ticking after the first tick without waiting
+        # in real time.
+        self.assertGreater(avoid_sys.control_loop.get_metrics()['ticks'], 1)
+        self.assertNotIn('tick_errors', avoid_sys.instruments.counters)
+
+
+if __name__ == '__main__':
+    unittest.main()
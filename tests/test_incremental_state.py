@@ -0,0 +1,65 @@
+"""Tests determining the avoidance state incrementally."""
+
+import unittest
+
+from obstacle_avoid.avoidance.avoid_state import determine_state, \
+    determine_state_incremental
+from obstacle_avoid.avoidance.benchmark import compare_incremental
+from obstacle_avoid.avoidance.replay import make_synthetic_replay, \
+    make_synthetic_trace
+
+
+class IncrementalStateTest(unittest.TestCase):
+
+    """Tests that determine_state_incremental() finds the same states
+    and obstacles to avoid as determine_state() at every step of random
+    traces through fields of static and moving obstacles.
+    """
+
+    def check_trace(self, seed, steps=600):
+        replay = make_synthetic_replay(15, 3, field_size=1200, seed=seed)
+        trace = make_synthetic_trace(replay, steps, seed=seed)
+
+        plane = replay.plane
+        avoid_sys = replay.avoid_sys
+        avoid_sys.standby_count = 3
+
+        for step in trace:
+            replay.now = step['time']
+            plane.update(step)
+
+            for obs, loc in zip(avoid_sys.moving_obs, step['moving']):
+                obs.loc = loc
+
+            avoid_sys.update_moving_obstacles()
+
+            avoid_sys.avoid_obs = None
+            state = determine_state(plane)
+            avoid_obs = avoid_sys.avoid_obs
+
+            avoid_sys.avoid_obs = None
+            incremental_state = determine_state_incremental(plane)
+
+            self.assertEqual((state, avoid_obs), (incremental_state,
+                avoid_sys.avoid_obs), 'differ at %.1f s of trace %d' % (
+                step['time'], seed))
+
+        # The trace is only a test of the incremental states if obstacles
+        # were skipped along it.
+        self.assertGreater(avoid_sys.margins.get_metrics()[
+            'skipped_per_tick'], 0)
+
+    def test_same_states_along_mission(self):
+        for seed in xrange(4):
+            self.check_trace(seed)
+
+    def test_same_states_wandering(self):
+        for seed in xrange(3):
+            result = compare_incremental(100, 5, 600, seed)
+
+            self.assertEqual(result['mismatches'], 0, 'trace %d' % seed)
+            self.assertGreater(result['skipped_per_step'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
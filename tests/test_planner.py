@@ -0,0 +1,217 @@
+"""Tests the detour planner."""
+
+import sys
+import unittest
+from StringIO import StringIO
+from multiprocessing import Pool
+from time import sleep
+
+from obstacle_avoid.avoidance.planner import DetourPlanner
+from obstacle_avoid.avoidance.replay import FlightReplay, ReplayCommand
+from obstacle_avoid.constants import PLAN_MAX_AGE
+from obstacle_avoid.types import Distance, Location, LocalFrame
+from obstacle_avoid.util import deg_to_rad, rad_to_deg, Instruments
+
+
+def make_problem(obs_radius=50):
+    """Return a detour problem from the origin heading north to a goal
+    500 meters north with an obstacle of obs_radius halfway.
+    """
+
+    return {
+        'start': (0, 0, 0),
+        'goal': (0, 500),
+        'speed': 18,
+        'turning_radius': 30,
+        'goal_radius': 30,
+        'obs_x': [0],
+        'obs_y': [250],
+        'obs_vx': [0],
+        'obs_vy': [0],
+        'obs_radius': [obs_radius]
+    }
+
+
+class DetourPlannerTest(unittest.TestCase):
+
+    """Tests requesting plans and keeping the plan being flown."""
+
+    def setUp(self):
+        self.now = 0.0
+        self.planner = DetourPlanner(lambda: self.now, 1, synchronous=True)
+
+    def test_plan(self):
+        self.assertTrue(self.planner.request(make_problem(), 'leg'))
+
+        plan = self.planner.get_plan('leg')
+
+        self.assertTrue(plan['waypoints'])
+        self.assertEqual(plan['waypoints'][-1], (0, 500))
+        self.assertIsNone(self.planner.get_plan('other'))
+
+    def test_failed_request(self):
+        problem = make_problem()
+        del problem['obs_radius']
+
+        self.planner.request(problem, 'leg')
+
+        self.assertFalse(self.planner.busy)
+        self.assertIsNone(self.planner.get_plan('leg'))
+        self.assertIn('KeyError', self.planner.plan['error'])
+
+        # The failed key is not planned again until the plan is stale.
+        self.assertFalse(self.planner.request(make_problem(), 'leg'))
+        self.assertTrue(self.planner.request(make_problem(), 'other'))
+
+        self.now += PLAN_MAX_AGE
+
+        self.assertTrue(self.planner.request(make_problem(), 'leg'))
+        self.assertTrue(self.planner.get_plan('leg'))
+
+    def test_failed_replan_keeps_plan(self):
+        self.planner.request(make_problem(), 'leg')
+        plan = self.planner.get_plan('leg')
+
+        self.now = 100.0
+
+        problem = make_problem()
+        del problem['obs_radius']
+
+        self.planner.request(problem, 'leg')
+
+        self.assertIs(self.planner.get_plan('leg'), plan)
+
+    def test_failed_request_in_worker(self):
+        planner = DetourPlanner(lambda: self.now, 1)
+        planner.start()
+
+        try:
+            problem = make_problem()
+            del problem['obs_radius']
+
+            self.assertTrue(planner.request(problem, 'leg'))
+
+            for _ in xrange(100):
+                if not planner.busy:
+                    break
+
+                sleep(0.05)
+
+            self.assertFalse(planner.busy)
+
+            self.now += PLAN_MAX_AGE
+
+            self.assertTrue(planner.request(make_problem(), 'leg'))
+        finally:
+            planner.close()
+
+    def test_request_after_close(self):
+        planner = DetourPlanner(lambda: self.now, 1)
+        planner.start()
+        planner.close()
+
+        self.assertFalse(planner.request(make_problem(), 'leg'))
+        self.assertFalse(planner.busy)
+
+    def test_shared_pool(self):
+        pool = Pool(1)
+        planner = DetourPlanner(lambda: self.now, 1)
+        planner.start(pool)
+
+        try:
+            self.assertTrue(planner.request(make_problem(), 'leg'))
+
+            for _ in xrange(100):
+                if not planner.busy:
+                    break
+
+                sleep(0.05)
+
+            self.assertTrue(planner.get_plan('leg'))
+
+            # Closing the planner leaves the pool it was given running.
+            planner.close()
+
+            self.assertEqual(pool.apply(abs, (-1,)), 1)
+        finally:
+            pool.terminate()
+
+    def test_failures_reported_once(self):
+        instruments = Instruments()
+        planner = DetourPlanner(lambda: self.now, 1, synchronous=True,
+            instruments=instruments)
+
+        problem = make_problem()
+        del problem['obs_radius']
+
+        stdout = sys.stdout
+        sys.stdout = output = StringIO()
+
+        try:
+            for _ in xrange(3):
+                planner.request(problem, 'leg')
+                self.now += PLAN_MAX_AGE
+        finally:
+            sys.stdout = stdout
+
+        self.assertEqual(output.getvalue().count('Detour plan'), 1)
+        self.assertEqual(instruments.counters, {'plans': 3,
+            'plan_failures': 3})
+        self.assertEqual(instruments.get_histogram('plan_time').count, 3)
+
+
+class GetDetourTest(unittest.TestCase):
+
+    """Tests following the detour plans with no static obstacles, so
+    that there is no route around them to fall back on.
+    """
+
+    def setUp(self):
+        home_loc = Location(deg_to_rad(38.1446), deg_to_rad(-76.4279), 0)
+        self.frame = frame = LocalFrame(home_loc)
+
+        commands = []
+
+        for x, y in ((0, 0), (0, 2000)):
+            wp = frame.from_local(Distance(x, y, 100))
+            commands.append(ReplayCommand(rad_to_deg(wp.lat),
+                rad_to_deg(wp.lon), wp.alt))
+
+        self.replay = FlightReplay(home_loc, [], [], commands)
+        self.replay.plane.update({
+            'airspeed': 18,
+            'heading': 0,
+            'loc': frame.from_local(Distance(0, 100, 100)),
+            'wp_number': 2
+        })
+
+    def get_detour(self):
+        plane = self.replay.plane
+        pos = self.frame.to_local(plane.loc)
+
+        return self.replay.avoid_sys.get_detour(plane, pos)
+
+    def test_stale_plan_is_flown_until_replanned(self):
+        avoid_sys = self.replay.avoid_sys
+
+        # The first call requests the plan and has no route to follow.
+        self.assertIsNone(self.get_detour())
+        self.assertIsNotNone(self.get_detour())
+
+        plan = avoid_sys.planner.plan
+
+        # The replan is still being planned when the plan goes stale.
+        self.replay.now += PLAN_MAX_AGE + 1
+        avoid_sys.planner.busy = True
+
+        self.assertIsNotNone(self.get_detour())
+        self.assertIs(avoid_sys.planner.plan, plan)
+
+        avoid_sys.planner.busy = False
+
+        self.assertIsNotNone(self.get_detour())
+        self.assertIsNot(avoid_sys.planner.plan, plan)
+
+
+if __name__ == '__main__':
+    unittest.main()
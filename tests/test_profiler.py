@@ -0,0 +1,80 @@
+"""Tests capturing profiles of the ticks on request."""
+
+import os
+import shutil
+import tempfile
+import unittest
+from threading import Event
+
+from obstacle_avoid.avoidance.profiler import TickProfiler
+
+
+class TickProfilerTest(unittest.TestCase):
+
+    """Tests captures of ticks run on a virtual clock."""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.now = 0.0
+        self.reports = []
+        self.reported = Event()
+
+        def report(path, ticks, summary):
+            self.reports.append((path, ticks))
+            self.reported.set()
+
+        self.profiler = TickProfiler(os.path.join(self.dir, 'profile_%d'),
+            report, lambda: self.now)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def tick(self):
+        self.now += 1
+
+    def run_tick(self, tick=None):
+        if self.profiler.active:
+            self.profiler.run(tick or self.tick)
+
+    def test_capture_for_duration(self):
+        self.profiler.request(3)
+
+        for _ in xrange(5):
+            self.run_tick()
+
+        self.assertTrue(self.reported.wait(10))
+        self.assertEqual(self.reports[0][1], 3)
+        self.assertTrue(os.path.exists(self.reports[0][0]))
+        self.assertFalse(self.profiler.active)
+
+    def test_request_during_last_tick(self):
+        self.profiler.request(1)
+
+        def tick():
+            self.tick()
+            self.profiler.request(2)
+
+        # The capture would end after this tick if not for the request.
+        self.run_tick(tick)
+
+        self.assertTrue(self.profiler.active)
+
+        for _ in xrange(3):
+            self.run_tick()
+
+        self.assertTrue(self.reported.wait(10))
+        self.assertEqual(self.reports[0][1], 3)
+        self.assertFalse(self.profiler.active)
+
+    def test_stop(self):
+        self.profiler.request(100)
+        self.run_tick()
+        self.profiler.stop()
+        self.run_tick()
+
+        self.assertTrue(self.reported.wait(10))
+        self.assertEqual(self.reports[0][1], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
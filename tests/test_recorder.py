@@ -0,0 +1,114 @@
+"""Tests recording the ticks of the monitoring thread."""
+
+import os
+import shutil
+import tempfile
+import unittest
+from collections import namedtuple
+
+import numpy as np
+
+from obstacle_avoid.avoidance.recorder import FlightRecorder, \
+    read_recording, COMMAND_NONE, COMMAND_TURN
+from obstacle_avoid.avoidance.track import TrackStore
+from obstacle_avoid.types import Distance, Location, LocalFrame, \
+    MovingObstacle, ObstacleSet
+from obstacle_avoid.util import deg_to_rad
+
+# The values of a PlaneState read by the recorder.
+RecordedState = namedtuple('RecordedState', ('version', 'airspeed',
+    'heading', 'pitch', 'loc', 'mode'))
+RecordedPlane = namedtuple('RecordedPlane', ('state', 'next_wp_number'))
+
+
+class FlightRecorderTest(unittest.TestCase):
+
+    """Tests a recorder with room for four ticks."""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'flight.rec')
+        self.now = 0.0
+
+        self.recorder = FlightRecorder(self.path, capacity=4, n_obstacles=2,
+            clock=lambda: self.now)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def record(self, n, error=False, track=None):
+        track = track or TrackStore(ObstacleSet())
+
+        self.recorder.begin()
+        self.now += 0.1
+
+        if error:
+            self.recorder.end(None, None, track, True)
+            return
+
+        plane = RecordedPlane(RecordedState(n, 18, 0.5, 0, Location(0.1, 0.2,
+            100), 'AUTO'), 2)
+
+        self.recorder.note_turn(0.25)
+        self.recorder.end(plane, 4, track)
+
+    def test_ticks_in_order(self):
+        for n in xrange(6):
+            self.record(n)
+
+        self.recorder.close()
+        records = read_recording(self.path)
+
+        self.assertEqual(list(records['tick']), [2, 3, 4, 5])
+        self.assertEqual(list(records['version']), [2, 3, 4, 5])
+        self.assertTrue((records['command'] == COMMAND_TURN).all())
+        self.assertFalse(records['error'].any())
+
+    def test_tick_that_raised(self):
+        self.record(0)
+        self.record(1, error=True)
+
+        self.recorder.close()
+        records = read_recording(self.path)
+
+        self.assertEqual(len(records), 2)
+        self.assertEqual(list(records['error']), [False, True])
+        self.assertEqual(records['state'][1], -1)
+        self.assertEqual(records['command'][1], COMMAND_NONE)
+        self.assertTrue(np.isnan(records['lat'][1]))
+
+    def test_updates_as_received(self):
+        frame = LocalFrame(Location(deg_to_rad(38.1446),
+            deg_to_rad(-76.4279), 0))
+        obs = MovingObstacle(frame.from_local(Distance(0, 0, 100)), 10)
+        obs_set = ObstacleSet([], [obs], frame)
+        track = TrackStore(obs_set)
+
+        self.record(0, track=track)
+
+        for time, x in ((0, 0), (1, 10), (2, 25)):
+            obs.loc = frame.from_local(Distance(x, 0, 100))
+            track.add(time)
+
+        # The tick predicts the obstacle past the update, and the filter
+        # has smoothed the update, but the update is what is recorded.
+        track.predict(2.5)
+        self.record(1, track=track)
+
+        self.recorder.close()
+        records = read_recording(self.path)
+
+        self.assertTrue(np.isnan(records['update_time'][0]))
+        self.assertEqual(records['update_time'][1], 2)
+        self.assertEqual(records['n_obstacles'][1], 1)
+
+        x, y, alt = records['obstacles'][1, 0]
+
+        self.assertAlmostEqual(x, 25, 6)
+        self.assertAlmostEqual(y, 0, 6)
+        self.assertAlmostEqual(alt, 100, 6)
+        self.assertNotAlmostEqual(obs_set.x[0], 25, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
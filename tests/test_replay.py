@@ -0,0 +1,108 @@
+"""Tests replaying flights through the obstacle avoidance system."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from obstacle_avoid.avoidance.avoid_state import AvoidState
+from obstacle_avoid.avoidance.recorder import read_recording
+from obstacle_avoid.avoidance.replay import make_synthetic_replay, \
+    make_synthetic_trace, trace_from_recording, compare_decisions, \
+    format_decision
+
+
+class SyntheticReplayTest(unittest.TestCase):
+
+    """Tests replays of synthetic traces through fields of static and
+    moving obstacles dense enough for the plane to turn away from them
+    and to fly detours, and to monitor obstacles while guided.
+    """
+
+    cases = ((15, 1200, 2), (10, 1000, 1), (10, 1000, 5))
+
+    def run_replay(self, n_static, field_size, seed, steps=400):
+        replay = make_synthetic_replay(n_static, 3, field_size=field_size,
+            seed=seed)
+
+        return replay.run(make_synthetic_trace(replay, steps, seed=seed))
+
+    def test_no_errors(self):
+        for case in self.cases:
+            decisions = self.run_replay(*case)
+
+            errors = [format_decision(decision) for decision in decisions if
+                decision['error']]
+
+            self.assertEqual(errors, [], 'errors in %s' % (case,))
+
+            # The trace is only a test of the actions if it avoids.
+            states = set(decision['state'] for decision in decisions)
+            commands = set(command[0] for decision in decisions for command
+                in decision['commands'])
+
+            self.assertIn(AvoidState.AVOID, states)
+            self.assertTrue(set(('turn', 'goto')) <= commands)
+
+    def test_same_decisions(self):
+        for case in self.cases:
+            self.assertEqual(compare_decisions(self.run_replay(*case),
+                self.run_replay(*case)), [], 'differ in %s' % (case,))
+
+
+class RecordingReplayTest(unittest.TestCase):
+
+    """Tests replaying the recording of a replay of a synthetic trace with
+    the moving obstacles updated every fifth step, halfway between two
+    steps, so that the tracks predict them between updates.
+    """
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def record_replay(self, name, trace=None):
+        path = os.path.join(self.dir, name)
+        replay = make_synthetic_replay(15, 3, field_size=1200, seed=2,
+            record_path=path)
+
+        if trace is None:
+            trace = make_synthetic_trace(replay, 400, seed=2)
+
+            for n, step in enumerate(trace):
+                if n % 5:
+                    del step['moving']
+                else:
+                    step['moving_time'] = step['time'] - 0.05
+
+        decisions = replay.run(trace)
+        replay.close()
+
+        return replay, decisions, read_recording(path)
+
+    def test_same_decisions(self):
+        replay, decisions, records = self.record_replay('flight.rec')
+        trace = trace_from_recording(records, replay.frame)
+
+        self.assertEqual(sum('moving' in step for step in trace), 80)
+
+        replay, replayed, replayed_records = self.record_replay(
+            'replay.rec', trace)
+
+        self.assertEqual(compare_decisions(decisions, replayed), [])
+        self.assertEqual(records['state'].tolist(), [decision['state'] for
+            decision in replayed])
+
+        # The tracks were given the updates as they were received, not
+        # as they were predicted, so the replay records them unchanged.
+        for name in ('update_time', 'obstacles', 'command', 'turn_angle'):
+            np.testing.assert_array_equal(records[name],
+                replayed_records[name], name)
+
+
+if __name__ == '__main__':
+    unittest.main()
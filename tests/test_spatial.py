@@ -0,0 +1,58 @@
+"""Tests indexing obstacles in a uniform grid."""
+
+import unittest
+from threading import Thread, Event
+
+from obstacle_avoid.types import SpatialGrid
+
+
+class SpatialGridTest(unittest.TestCase):
+
+    """Tests a grid of 100 meter cells where obstacles move between
+    cells on one thread while another thread queries it.
+    """
+
+    def setUp(self):
+        self.grid = SpatialGrid(100)
+
+        for i in xrange(50):
+            self.grid.insert(i, 100 * i, 0)
+
+    def test_query(self):
+        self.assertEqual(self.grid.query(0, 0, 150).tolist(), [0, 1])
+        self.assertEqual(len(self.grid.query(0, 0, 5000)), 50)
+
+    def test_move(self):
+        self.grid.move(0, 450, 0)
+
+        self.assertEqual(self.grid.query(0, 0, 50).tolist(), [])
+        self.assertEqual(self.grid.query(450, 0, 10).tolist(), [0, 4])
+
+    def test_move_while_querying(self):
+        stop = Event()
+
+        def move():
+            step = 0
+
+            while not stop.is_set():
+                step += 1
+
+                for i in xrange(50):
+                    self.grid.move(i, 100 * ((i + step) % 200), 100 * (step %
+                        3))
+
+        thread = Thread(target=move)
+        thread.start()
+
+        try:
+            for _ in xrange(5000):
+                self.assertEqual(len(self.grid.query(0, 0, 50000)), 50)
+                self.grid.query(0, 0, 5000)
+
+        finally:
+            stop.set()
+            thread.join()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+"""Tests predicting the moving obstacles from their tracks."""
+
+import unittest
+
+from obstacle_avoid.avoidance.track import TrackStore
+from obstacle_avoid.constants import TRACK_MAX_AGE
+from obstacle_avoid.types import Distance, Location, LocalFrame, \
+    MovingObstacle, ObstacleSet
+from obstacle_avoid.util import deg_to_rad
+
+
+class TrackStoreTest(unittest.TestCase):
+
+    """Tests a moving obstacle flying east at 10 meters per second."""
+
+    def setUp(self):
+        self.frame = LocalFrame(Location(deg_to_rad(38.1446),
+            deg_to_rad(-76.4279), 0))
+        self.obs = MovingObstacle(self.frame.from_local(Distance(0, 0, 100)),
+            10)
+
+        self.obs_set = ObstacleSet([], [self.obs], self.frame)
+        self.track = TrackStore(self.obs_set)
+
+    def update(self, time, x):
+        self.obs.loc = self.frame.from_local(Distance(x, 0, 100))
+        self.track.add(time)
+
+    def test_velocity_from_first_updates(self):
+        self.update(0, 0)
+        self.update(1, 10)
+
+        self.assertAlmostEqual(self.track.vel[0, 0], 10, 6)
+
+        self.track.predict(1.5)
+
+        self.assertAlmostEqual(self.obs_set.x[0], 15, 3)
+        self.assertAlmostEqual(self.track.pred_vel[0, 0], 10, 6)
+
+    def test_stale_track_is_held(self):
+        self.update(0, 0)
+        self.update(1, 10)
+
+        self.track.predict(1 + TRACK_MAX_AGE + 60)
+
+        self.assertAlmostEqual(self.obs_set.x[0], 10 + 10 * TRACK_MAX_AGE, 3)
+        self.assertEqual(self.track.pred_vel[0, 0], 0)
+        self.assertAlmostEqual(self.track.get_max_drift(1 + TRACK_MAX_AGE +
+            60), 10 * TRACK_MAX_AGE, 6)
+
+    def test_restart_after_stale(self):
+        self.update(0, 0)
+        self.update(1, 10)
+
+        # The obstacle comes back somewhere else after a long gap.
+        self.update(100, -500)
+
+        self.assertEqual(self.track.vel[0, 0], 0)
+
+        self.update(101, -510)
+
+        self.assertAlmostEqual(self.track.vel[0, 0], -10, 6)
+
+    def test_update_replaces_state(self):
+        self.update(0, 0)
+        self.update(1, 10)
+
+        # A tick still predicting from the state it read keeps seeing one
+        # whole update while the next one is added.
+        state = self.track.state
+        pos, vel, time = state[0].copy(), state[1].copy(), state[2]
+
+        self.update(2, 30)
+
+        self.assertIsNot(self.track.state, state)
+        self.assertTrue((state[0] == pos).all())
+        self.assertTrue((state[1] == vel).all())
+        self.assertEqual(state[2], time)
+        self.assertEqual(self.track.time, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
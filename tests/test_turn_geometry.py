@@ -0,0 +1,111 @@
+"""Tests the batched turn geometry solver against TurnSolution."""
+
+import unittest
+from math import pi
+from random import Random
+
+import numpy as np
+
+from obstacle_avoid.types import Distance, TurnSolution
+from obstacle_avoid.util import solve_turns, solve_turns_from_headings
+
+
+def get_angle_error(angle_1, angle_2):
+    """Return the difference between two angles wrapped to within pi."""
+    return abs((angle_1 - angle_2 + pi) % (2 * pi) - pi)
+
+
+class SolveTurnsTest(unittest.TestCase):
+
+    """Tests that solve_turns() gives the same turns as TurnSolution."""
+
+    def assert_same_turns(self, i, j, r, k):
+        """Assert that solve_turns() agrees with TurnSolution for each of
+        the waypoints at i, j, and k and turning radii r.
+        """
+
+        turns = solve_turns(i, j, r, k)
+
+        for n in xrange(len(i)):
+            turn = TurnSolution(Distance(i[n], j[n], k[n]), r[n])
+            case = (i[n], j[n], r[n], k[n])
+
+            self.assertLess(get_angle_error(turns.angle[n], turn.angle), 1e-9,
+                case)
+            self.assertAlmostEqual(turns.a[n], turn.turn_dist.x, 6, case)
+            self.assertAlmostEqual(turns.b[n], turn.turn_dist.y, 6, case)
+            self.assertAlmostEqual(turns.c[n], turn.turn_dist.z, 6, case)
+            self.assertAlmostEqual(turns.arc_length[n], turn.arc_length, 6,
+                case)
+            self.assertAlmostEqual(turns.leg_length[n], turn.leg_length, 6,
+                case)
+
+    def test_random(self):
+        random = Random(0)
+        n = 5000
+
+        i = [random.uniform(-1000, 1000) for _ in xrange(n)]
+        j = [random.uniform(-1000, 1000) for _ in xrange(n)]
+        r = [random.uniform(10, 200) for _ in xrange(n)]
+        k = [random.uniform(-50, 50) for _ in xrange(n)]
+
+        self.assert_same_turns(i, j, r, k)
+
+    def test_edge_cases(self):
+        r = 50.0
+
+        # Straight ahead, straight behind, beside the plane at one and
+        # two turning diameters, inside the turning circles, and at the
+        # plane itself.
+        cases = [(0, 500), (0, 1e-9), (0, -500), (0, -1e-9), (2 * r, 0),
+            (-2 * r, 0), (r, 0), (-r, 0), (r, 1), (-r, -1), (4 * r, 0),
+            (-4 * r, 0), (0, 0), (1e-9, 0), (-1e-9, 0)]
+
+        i = [case[0] for case in cases]
+        j = [case[1] for case in cases]
+
+        self.assert_same_turns(i, j, [r] * len(cases), [20] * len(cases))
+
+    def test_zero_and_pi_angles(self):
+        # The plane flies straight to a waypoint ahead and turns pi
+        # radians to a waypoint a turning diameter to either side.
+        turns = solve_turns([0, 100, -100], [500, 0, 0], 50)
+
+        self.assertEqual(turns.angle[0], 0)
+        self.assertAlmostEqual(turns.angle[1], pi)
+        self.assertAlmostEqual(turns.angle[2], -pi)
+        self.assertAlmostEqual(turns.leg_length[0], 500)
+        self.assertAlmostEqual(turns.arc_length[1], 50 * pi)
+
+    def test_no_warnings(self):
+        with np.errstate(all='raise'):
+            solve_turns([0, 0, 100, -100, 0], [0, -500, 0, 0, 500], 50, 10)
+
+
+class SolveTurnsFromHeadingsTest(unittest.TestCase):
+
+    """Tests that solve_turns_from_headings() gives the same turns as
+    TurnSolution for a waypoint rotated into each heading.
+    """
+
+    def test_headings(self):
+        x, y, z, r = 300.0, -200.0, 30.0, 60.0
+
+        headings = np.concatenate((np.linspace(-pi, pi, 73), [0, pi, -pi,
+            2 * pi]))
+        turns = solve_turns_from_headings(x, y, headings, r, z)
+
+        for n, heading in enumerate(headings):
+            turn = TurnSolution(Distance(x, y, z).transform_inplace(heading),
+                r)
+
+            self.assertLess(get_angle_error(turns.angle[n], turn.angle), 1e-9,
+                heading)
+            self.assertAlmostEqual(turns.a[n], turn.turn_dist.x, 6, heading)
+            self.assertAlmostEqual(turns.b[n], turn.turn_dist.y, 6, heading)
+            self.assertAlmostEqual(turns.leg_length[n], turn.leg_length, 6,
+                heading)
+
+
+if __name__ == '__main__':
+    unittest.main()